@@ -34,67 +34,9 @@ class PythonVersionChecker:
 checker = PythonVersionChecker()
 checker.current_version
 
-from .core import *
-from .core.components.rag_with_baidu_search import RAGWithBaiduSearch
-from .core import console
-from .core.components.excel2figure import Excel2Figure
-from .core.components.llms.mrc import MRC
-from .core.components.llms.oral_query_generation import OralQueryGeneration
-from .core.components.llms.qa_pair_mining import QAPairMining
-from .core.components.llms.similar_question import SimilarQuestion
-from .core.components.llms.style_writing import StyleWriting
-from .core.components.llms.style_rewrite import StyleRewrite
-from .core.components.llms.tag_extraction import TagExtraction
-from .core.components.llms.nl2pandas import Nl2pandasComponent
-from .core.components.llms.query_rewrite import QueryRewrite
-from .core.components.llms.dialog_summary import DialogSummary
-from .core.components.llms.is_complex_query import IsComplexQuery
-from .core.components.llms.query_decomposition import QueryDecomposition
-from .core.components.llms.playground import Playground
-
-from .core.components.asr.component import ASR
-from .core.components.general_ocr.component import GeneralOCR
-from .core.components.object_recognize.component import ObjectRecognition
-from .core.components.text_to_image.component import Text2Image
-from .core.components.landmark_recognize.component import LandmarkRecognition
-from .core.components.tts.component import TTS
-from .core.components.extract_table.component import ExtractTableFromDoc
-from .core.components.doc_parser.doc_parser import DocParser, ParserConfig
-from .core.components.doc_splitter.doc_splitter import DocSplitter
-from .core.components.retriever.bes.bes_retriever import BESRetriever
-from .core.components.retriever.bes.bes_retriever import BESVectorStoreIndex
-from .core.components.retriever.baidu_vdb.baiduvdb_retriever import BaiduVDBVectorStoreIndex
-from .core.components.retriever.baidu_vdb.baiduvdb_retriever import BaiduVDBRetriever
-from .core.components.retriever.baidu_vdb.baiduvdb_retriever import TableParams
-
-from .core.components.dish_recognize.component import DishRecognition
-from .core.components.translate.component import Translation
-from .core.components.animal_recognize.component import AnimalRecognition
-from .core.components.doc_crop_enhance.component import DocCropEnhance
-from .core.components.qrcode_ocr.component import QRcodeOCR
-from .core.components.table_ocr.component import TableOCR
-
-from .core.components.embeddings import Embedding
-from .core.components.matching import Matching
-
-from .core.components.gbi.nl2sql.component import NL2Sql
-from .core.components.gbi.select_table.component import SelectTable
-
-from .core.components.plant_recognize.component import PlantRecognition
-from .core.components.handwrite_ocr.component import HandwriteOCR
-from .core.components.image_understand.component import ImageUnderstand
-from .core.components.mix_card_ocr.component import MixCardOCR
-
-from appbuilder.core.message import Message
-from appbuilder.core.agent import AgentRuntime
-from appbuilder.core.user_session import UserSession
-
-from appbuilder.utils.logger_util import logger
-
-from appbuilder.core.utils import get_model_list
-
-from appbuilder.core.console.agent_builder.agent_builder import AgentBuilder
+import importlib
 
+from . import core
 from .core._exception import (
     BadRequestException,
     ForbiddenException,
@@ -102,9 +44,107 @@ from .core._exception import (
     PreconditionFailedException,
     InternalServerErrorException,
     HTTPConnectionException,
+    CircuitOpenException,
+    AdmissionRejectedException,
     AppBuilderServerException,
 )
 
+# 组件及其依赖(pandas、numpy、SQLAlchemy、proto-plus等)在首次访问appbuilder.X时才导入, 见PEP 562
+_LAZY_IMPORTS = {
+    "console": "appbuilder.core.console",
+    "RAGWithBaiduSearch": "appbuilder.core.components.rag_with_baidu_search",
+    "Excel2Figure": "appbuilder.core.components.excel2figure",
+    "MRC": "appbuilder.core.components.llms.mrc",
+    "OralQueryGeneration": "appbuilder.core.components.llms.oral_query_generation",
+    "QAPairMining": "appbuilder.core.components.llms.qa_pair_mining",
+    "SimilarQuestion": "appbuilder.core.components.llms.similar_question",
+    "StyleWriting": "appbuilder.core.components.llms.style_writing",
+    "StyleRewrite": "appbuilder.core.components.llms.style_rewrite",
+    "TagExtraction": "appbuilder.core.components.llms.tag_extraction",
+    "Nl2pandasComponent": "appbuilder.core.components.llms.nl2pandas",
+    "QueryRewrite": "appbuilder.core.components.llms.query_rewrite",
+    "DialogSummary": "appbuilder.core.components.llms.dialog_summary",
+    "IsComplexQuery": "appbuilder.core.components.llms.is_complex_query",
+    "QueryDecomposition": "appbuilder.core.components.llms.query_decomposition",
+    "Playground": "appbuilder.core.components.llms.playground",
+
+    "ASR": "appbuilder.core.components.asr.component",
+    "GeneralOCR": "appbuilder.core.components.general_ocr.component",
+    "ObjectRecognition": "appbuilder.core.components.object_recognize.component",
+    "Text2Image": "appbuilder.core.components.text_to_image.component",
+    "LandmarkRecognition": "appbuilder.core.components.landmark_recognize.component",
+    "TTS": "appbuilder.core.components.tts.component",
+    "ExtractTableFromDoc": "appbuilder.core.components.extract_table.component",
+    "DocParser": "appbuilder.core.components.doc_parser.doc_parser",
+    "ParserConfig": "appbuilder.core.components.doc_parser.doc_parser",
+    "DocSplitter": "appbuilder.core.components.doc_splitter.doc_splitter",
+    "BESRetriever": "appbuilder.core.components.retriever.bes.bes_retriever",
+    "BESVectorStoreIndex": "appbuilder.core.components.retriever.bes.bes_retriever",
+    "BaiduVDBVectorStoreIndex": "appbuilder.core.components.retriever.baidu_vdb.baiduvdb_retriever",
+    "BaiduVDBRetriever": "appbuilder.core.components.retriever.baidu_vdb.baiduvdb_retriever",
+    "TableParams": "appbuilder.core.components.retriever.baidu_vdb.baiduvdb_retriever",
+
+    "DishRecognition": "appbuilder.core.components.dish_recognize.component",
+    "Translation": "appbuilder.core.components.translate.component",
+    "AnimalRecognition": "appbuilder.core.components.animal_recognize.component",
+    "DocCropEnhance": "appbuilder.core.components.doc_crop_enhance.component",
+    "QRcodeOCR": "appbuilder.core.components.qrcode_ocr.component",
+    "TableOCR": "appbuilder.core.components.table_ocr.component",
+
+    "Embedding": "appbuilder.core.components.embeddings",
+    "Matching": "appbuilder.core.components.matching",
+
+    "NL2Sql": "appbuilder.core.components.gbi.nl2sql.component",
+    "SelectTable": "appbuilder.core.components.gbi.select_table.component",
+
+    "PlantRecognition": "appbuilder.core.components.plant_recognize.component",
+    "HandwriteOCR": "appbuilder.core.components.handwrite_ocr.component",
+    "ImageUnderstand": "appbuilder.core.components.image_understand.component",
+    "MixCardOCR": "appbuilder.core.components.mix_card_ocr.component",
+
+    "Message": "appbuilder.core.message",
+    "AgentRuntime": "appbuilder.core.agent",
+    "UserSession": "appbuilder.core.user_session",
+
+    "logger": "appbuilder.utils.logger_util",
+
+    "get_model_list": "appbuilder.core.utils",
+
+    "AgentBuilder": "appbuilder.core.console.agent_builder.agent_builder",
+
+    "HTTPPoolConfig": "appbuilder.core._client",
+    "RetryPolicy": "appbuilder.core._client",
+    "HedgePolicy": "appbuilder.core._client",
+    "RateLimiter": "appbuilder.core._rate_limiter",
+    "CircuitBreaker": "appbuilder.core._circuit_breaker",
+    "CompletionCache": "appbuilder.core._completion_cache",
+    "MemoryCacheBackend": "appbuilder.core._completion_cache",
+    "SQLiteCacheBackend": "appbuilder.core._completion_cache",
+    "DiskCacheBackend": "appbuilder.core._completion_cache",
+    "MetricsRegistry": "appbuilder.core._metrics",
+    "AdmissionConfig": "appbuilder.core._admission",
+
+    "Pipeline": "appbuilder.core.functional",
+    "ComponentStage": "appbuilder.core.functional",
+    "SegmentStage": "appbuilder.core.functional",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module = importlib.import_module(module_name)
+    value = module if name == "console" else getattr(module, name)
+    # 缓存到模块属性中, 之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
+
 __all__ = [
     'logger',
 
@@ -114,8 +154,26 @@ __all__ = [
     'PreconditionFailedException',
     'InternalServerErrorException',
     'HTTPConnectionException',
+    'CircuitOpenException',
+    'AdmissionRejectedException',
     'AppBuilderServerException',
 
+    'HTTPPoolConfig',
+    'RetryPolicy',
+    'HedgePolicy',
+    'RateLimiter',
+    'CircuitBreaker',
+    'CompletionCache',
+    'MemoryCacheBackend',
+    'SQLiteCacheBackend',
+    'DiskCacheBackend',
+    'MetricsRegistry',
+    'AdmissionConfig',
+
+    'Pipeline',
+    'ComponentStage',
+    'SegmentStage',
+
     'StyleWriting',
     'MRC',
     'Playground',
@@ -0,0 +1,261 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""admission control for AgentRuntime requests"""
+
+import math
+import time
+import asyncio
+import threading
+import collections
+from typing import Optional, Dict
+from pydantic import BaseModel, Field
+
+from appbuilder.core._client import _env_int, _env_float
+from appbuilder.core._exception import AdmissionRejectedException
+from appbuilder.core._metrics import MetricsRegistry
+
+DEFAULT_QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class AdmissionConfig(BaseModel):
+    r"""AgentRuntime的准入控制配置, 未指定的字段从环境变量中获取.
+
+        参数:
+            max_inflight(int|None): 同时处理中的请求数上限, 流式请求在输出结束前一直占用,
+                环境变量APPBUILDER_AGENT_MAX_INFLIGHT, 默认None表示不限制.
+            max_queue_size(int): 达到max_inflight后排队等待的请求数上限, 队列满时直接返回503,
+                环境变量APPBUILDER_AGENT_MAX_QUEUE_SIZE, 默认64.
+            queue_timeout(float): 请求排队的最长秒数, 请求头X-Appbuilder-Timeout更短时以请求头为准,
+                环境变量APPBUILDER_AGENT_QUEUE_TIMEOUT, 默认10.
+            max_session_inflight(int|None): 同一个session_id同时处理与排队中的请求数上限, 超过时返回429,
+                环境变量APPBUILDER_AGENT_MAX_SESSION_INFLIGHT, 默认None表示不限制.
+    """
+    max_inflight: Optional[int] = Field(
+        default_factory=lambda: _env_int("APPBUILDER_AGENT_MAX_INFLIGHT", None), gt=0)
+    max_queue_size: int = Field(default_factory=lambda: _env_int("APPBUILDER_AGENT_MAX_QUEUE_SIZE", 64), ge=0)
+    queue_timeout: float = Field(default_factory=lambda: _env_float("APPBUILDER_AGENT_QUEUE_TIMEOUT", 10), ge=0)
+    max_session_inflight: Optional[int] = Field(
+        default_factory=lambda: _env_int("APPBUILDER_AGENT_MAX_SESSION_INFLIGHT", None), gt=0)
+
+
+class _AdmissionMetrics(object):
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry if registry is not None else MetricsRegistry()
+        self.inflight = registry.gauge(
+            "appbuilder_agent_inflight_requests", "Number of AgentRuntime requests being processed.")
+        self.queue_depth = registry.gauge(
+            "appbuilder_agent_queue_depth", "Number of AgentRuntime requests waiting for admission.")
+        self.queue_wait = registry.histogram(
+            "appbuilder_agent_queue_wait_seconds", "Time AgentRuntime requests waited before admission.",
+            buckets=DEFAULT_QUEUE_WAIT_BUCKETS)
+        self.rejected = registry.counter(
+            "appbuilder_agent_rejected_total", "Number of AgentRuntime requests rejected by admission control.",
+            ("reason",))
+
+
+class _Waiter(object):
+    __slots__ = ("wake", "admitted", "enqueued_at")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.admitted = False
+        self.enqueued_at = time.monotonic()
+
+
+class Admission(object):
+    r"""一次准入的凭证, 请求处理结束后调用release, 重复调用无副作用"""
+
+    def __init__(self, controller: "AdmissionController", session_id: Optional[str], counted: bool):
+        self._controller = controller
+        self._session_id = session_id
+        self._counted = counted
+        self._admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController(object):
+    r"""限制同时处理的请求数, 超出的请求按先到先得排队, 线程安全, 同步与异步调用共享同一组名额.
+
+    排队前按当前队列长度与近期请求的平均处理耗时估算等待时间, 超过请求的截止时间时直接拒绝,
+    不让注定超时的请求占用队列; 拒绝时抛出AdmissionRejectedException, 带有建议的Retry-After秒数。
+
+        参数:
+            config(AdmissionConfig, 可选): 准入控制配置, 默认从环境变量中获取.
+    """
+    # 平均处理耗时的指数加权系数
+    _EWMA_ALPHA = 0.2
+
+    def __init__(self, config: Optional[AdmissionConfig] = None):
+        self.config = config if config is not None else AdmissionConfig()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._waiters = collections.deque()
+        self._sessions: Dict[str, int] = {}
+        self._service_time = None
+        self._metrics = _AdmissionMetrics()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> Admission:
+        r"""获取处理名额, 需要排队时阻塞当前线程.
+
+            参数:
+                session_id(str, 可选): 会话ID, 用于限制单个会话的并发数.
+                timeout(float, 可选): 请求剩余的秒数, 与queue_timeout取较小值作为排队的截止时间.
+            返回：
+                obj:`Admission`, 请求结束后调用release.
+        """
+        deadline = self._deadline(timeout)
+        event = threading.Event()
+        admission, waiter = self._enter(session_id, deadline, event.set)
+        if admission is not None:
+            return admission
+        event.wait(max(0.0, deadline - time.monotonic()))
+        return self._leave(session_id, waiter)
+
+    async def aacquire(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> Admission:
+        r"""acquire的异步版本, 排队时不阻塞事件循环, 参数与返回值同acquire"""
+        deadline = self._deadline(timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        admission, waiter = self._enter(session_id, deadline, wake)
+        if admission is not None:
+            return admission
+        try:
+            await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # 已经分配到的名额要归还
+            self._leave(session_id, waiter, cancelled=True)
+            raise
+        return self._leave(session_id, waiter)
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        wait = self.config.queue_timeout
+        if timeout is not None:
+            wait = min(wait, max(0.0, timeout))
+        return time.monotonic() + wait
+
+    def _retry_after(self, position: int) -> int:
+        if self._service_time is None or not self.config.max_inflight:
+            return 1
+        return max(1, int(math.ceil(position * self._service_time / self.config.max_inflight)))
+
+    def _reject(self, reason: str, code: int, message: str, retry_after: int):
+        self._metrics.rejected.inc(reason=reason)
+        raise AdmissionRejectedException(message, code=code, retry_after=retry_after)
+
+    def _enter(self, session_id, deadline, wake):
+        r"""立即获得名额时返回(Admission, None), 需要排队时返回(None, waiter)"""
+        config = self.config
+        with self._lock:
+            counted = session_id is not None and config.max_session_inflight is not None
+            if counted:
+                if self._sessions.get(session_id, 0) >= config.max_session_inflight:
+                    self._reject("session_limit", 429, "too many concurrent requests in session {}".format(session_id),
+                                 self._retry_after(1))
+                self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+
+            if config.max_inflight is None or (self._inflight < config.max_inflight and not self._waiters):
+                self._inflight += 1
+                self._metrics.inflight.inc()
+                self._metrics.queue_wait.observe(0.0)
+                return Admission(self, session_id, counted), None
+
+            position = len(self._waiters) + 1
+            reason = None
+            if len(self._waiters) >= config.max_queue_size:
+                reason = "queue_full"
+            elif self._service_time is not None and \
+                    time.monotonic() + position * self._service_time / config.max_inflight > deadline:
+                reason = "deadline"
+            if reason is not None:
+                self._decrease_session(session_id, counted)
+                self._reject(reason, 503, "server is overloaded, please retry later", self._retry_after(position))
+
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            self._metrics.queue_depth.inc()
+        return None, waiter
+
+    def _leave(self, session_id, waiter, cancelled=False) -> Optional[Admission]:
+        r"""结束排队, 已分配到名额时返回Admission, 否则拒绝"""
+        counted = session_id is not None and self.config.max_session_inflight is not None
+        with self._lock:
+            if not waiter.admitted:
+                self._waiters.remove(waiter)
+                self._metrics.queue_depth.dec()
+                self._decrease_session(session_id, counted)
+                if cancelled:
+                    return None
+                self._reject("timeout", 503, "server is overloaded, please retry later",
+                             self._retry_after(len(self._waiters) + 1))
+        self._metrics.queue_wait.observe(time.monotonic() - waiter.enqueued_at)
+        admission = Admission(self, session_id, counted)
+        if cancelled:
+            admission.release()
+            return None
+        return admission
+
+    def _decrease_session(self, session_id, counted):
+        if not counted:
+            return
+        count = self._sessions.get(session_id, 0) - 1
+        if count > 0:
+            self._sessions[session_id] = count
+        else:
+            self._sessions.pop(session_id, None)
+
+    def _release(self, admission: Admission):
+        duration = time.monotonic() - admission._admitted_at
+        with self._lock:
+            self._decrease_session(admission._session_id, admission._counted)
+            if self._service_time is None:
+                self._service_time = duration
+            else:
+                self._service_time += self._EWMA_ALPHA * (duration - self._service_time)
+            if self._waiters:
+                # 名额直接转交给队首的请求
+                waiter = self._waiters.popleft()
+                self._metrics.queue_depth.dec()
+                waiter.admitted = True
+                waiter.wake()
+                return
+            self._inflight -= 1
+            self._metrics.inflight.dec()
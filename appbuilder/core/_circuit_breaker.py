@@ -0,0 +1,144 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""client side circuit breaker for gateway endpoints"""
+
+import time
+import threading
+from typing import Dict, Any
+
+from appbuilder.core._exception import CircuitOpenException
+from appbuilder.core._rate_limiter import _EndpointRegistry
+
+
+class EndpointBreaker(object):
+    r"""单个网关接口的熔断器, 线程安全.
+
+    连续失败(连接失败、超时或HTTP 5xx)达到failure_threshold次后熔断, 熔断期间请求直接抛出CircuitOpenException;
+    熔断recovery_timeout秒后放行一个探测请求, 探测成功则恢复, 失败则继续熔断。
+
+        参数:
+            failure_threshold(int, 可选): 触发熔断的连续失败次数, 默认5.
+            recovery_timeout(float, 可选): 熔断后放行探测请求前等待的秒数, 默认30.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be bigger than zero")
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        r"""当前状态: closed、open或half_open"""
+        return self._state
+
+    def before_request(self, url: str = ""):
+        r"""发送请求前调用, 熔断中抛出CircuitOpenException"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_at = now
+                return
+            # 半开状态下同时只放行一个探测请求, 探测请求未返回结果时超过recovery_timeout再放行下一个
+            if self._state == self.HALF_OPEN and now - self._probe_at >= self.recovery_timeout:
+                self._probe_at = now
+                return
+            self._rejected += 1
+        raise CircuitOpenException("circuit breaker is open for {}".format(url))
+
+    def on_success(self):
+        r"""请求成功, 关闭熔断"""
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def on_failure(self):
+        r"""请求失败, 连续失败达到阈值或探测失败时熔断"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        r"""返回熔断器当前状态"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "rejected": self._rejected,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+            }
+
+
+class CircuitBreaker(_EndpointRegistry):
+    r"""按网关接口路径熔断的全局单例, 默认不开启, 只有设置过熔断器的接口才会被熔断.
+
+    接口通过请求url的路径后缀匹配, 也可以通过环境变量APPBUILDER_CIRCUIT_BREAKERS设置,
+    格式为"path=failure_threshold[:recovery_timeout],path=failure_threshold"。
+
+    Examples:
+
+        .. code-block:: python
+
+            import appbuilder
+
+            appbuilder.CircuitBreaker().set_breaker("/v2/app/conversation/runs", failure_threshold=3)
+            print(appbuilder.CircuitBreaker().stats())
+    """
+    _instance = None
+    _initialized = False
+    _env_name = "APPBUILDER_CIRCUIT_BREAKERS"
+
+    def _load_env_item(self, path: str, value: str):
+        threshold, _, recovery = value.partition(":")
+        kwargs = {"recovery_timeout": float(recovery)} if recovery else {}
+        self.set_breaker(path, failure_threshold=int(threshold), **kwargs)
+
+    def set_breaker(self, path: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> EndpointBreaker:
+        r"""设置接口的熔断器.
+
+            参数:
+                path(str): 接口路径或路径后缀.
+                failure_threshold(int, 可选): 触发熔断的连续失败次数, 默认5.
+                recovery_timeout(float, 可选): 熔断后放行探测请求前等待的秒数, 默认30.
+            返回：
+                obj:`EndpointBreaker`
+        """
+        return self._set(path, EndpointBreaker(failure_threshold, recovery_timeout))
+
+    def remove_breaker(self, path: str):
+        r"""取消接口的熔断器"""
+        self._remove(path)
+
+    @staticmethod
+    def is_failure(status_code: int) -> bool:
+        r"""判断响应是否计为失败: HTTP 5xx"""
+        return status_code >= 500
@@ -16,13 +16,347 @@
 """Base client for interact with backend server"""
 
 import os
-from typing import Optional
+import json
+import time
+import zlib
+import random
+import email.utils
+import socket
+import asyncio
+import threading
+import weakref
+import collections
+import collections
+from concurrent import futures
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, Union, Tuple, Literal
 
 import requests
+from pydantic import BaseModel, Field
 from requests.adapters import HTTPAdapter, Retry
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection
 
 from appbuilder.core._exception import *
 from appbuilder.core.constants import GATEWAY_URL
+from appbuilder.core._rate_limiter import RateLimiter
+from appbuilder.core._circuit_breaker import CircuitBreaker
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.strip() else default
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name, "")
+    return float(value) if value.strip() else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name, "")
+    return value.strip().lower() in ("1", "true", "yes", "on") if value.strip() else default
+
+
+class HTTPPoolConfig(BaseModel):
+    r"""HTTP连接池配置, 未指定的字段从环境变量中获取.
+
+        参数:
+            pool_connections(int): 缓存的host连接池个数, 环境变量APPBUILDER_HTTP_POOL_CONNECTIONS, 默认10.
+            pool_maxsize(int): 每个host连接池保留的最大连接数, 环境变量APPBUILDER_HTTP_POOL_MAXSIZE, 默认10.
+            pool_block(bool): 连接池满时是否阻塞等待空闲连接, 为False时会新建连接并在用完后丢弃,
+                环境变量APPBUILDER_HTTP_POOL_BLOCK, 默认False.
+            keepalive_idle(float|None): TCP keep-alive探测开始前的空闲秒数, 为None时不开启TCP keep-alive,
+                环境变量APPBUILDER_HTTP_KEEPALIVE_IDLE, 默认60.
+            pool_idle_timeout(float|None): 连接池空闲超过该秒数后丢弃已缓存的连接, 避免复用已被网关关闭的连接,
+                环境变量APPBUILDER_HTTP_POOL_IDLE_TIMEOUT, 默认None表示不限制.
+            connect_timeout(float|None): 请求未指定timeout时的建连超时秒数,
+                环境变量APPBUILDER_HTTP_CONNECT_TIMEOUT, 默认10.
+            read_timeout(float|None): 请求未指定timeout时两次收到数据之间的最大间隔秒数,
+                环境变量APPBUILDER_HTTP_READ_TIMEOUT, 默认120, 为None时不限制.
+            request_compression(str|None): 请求体压缩方式, 可选"gzip"、"deflate", 需要网关支持,
+                环境变量APPBUILDER_HTTP_REQUEST_COMPRESSION, 默认None表示不压缩.
+            compression_min_size(int): 请求体不小于该字节数时才压缩,
+                环境变量APPBUILDER_HTTP_COMPRESSION_MIN_SIZE, 默认1024.
+    """
+    pool_connections: int = Field(default_factory=lambda: _env_int("APPBUILDER_HTTP_POOL_CONNECTIONS", 10), gt=0)
+    pool_maxsize: int = Field(default_factory=lambda: _env_int("APPBUILDER_HTTP_POOL_MAXSIZE", 10), gt=0)
+    pool_block: bool = Field(default_factory=lambda: _env_bool("APPBUILDER_HTTP_POOL_BLOCK", False))
+    keepalive_idle: Optional[float] = Field(
+        default_factory=lambda: _env_float("APPBUILDER_HTTP_KEEPALIVE_IDLE", 60))
+    pool_idle_timeout: Optional[float] = Field(
+        default_factory=lambda: _env_float("APPBUILDER_HTTP_POOL_IDLE_TIMEOUT", None))
+    connect_timeout: Optional[float] = Field(
+        default_factory=lambda: _env_float("APPBUILDER_HTTP_CONNECT_TIMEOUT", 10))
+    read_timeout: Optional[float] = Field(
+        default_factory=lambda: _env_float("APPBUILDER_HTTP_READ_TIMEOUT", 120))
+    request_compression: Optional[Literal["gzip", "deflate"]] = Field(
+        default_factory=lambda: os.getenv("APPBUILDER_HTTP_REQUEST_COMPRESSION") or None)
+    compression_min_size: int = Field(
+        default_factory=lambda: _env_int("APPBUILDER_HTTP_COMPRESSION_MIN_SIZE", 1024), ge=0)
+
+    def default_timeout(self) -> Tuple[Optional[float], Optional[float]]:
+        r"""请求未指定timeout时使用的(建连超时, 读超时)"""
+        return self.connect_timeout, self.read_timeout
+
+
+def _keepalive_socket_options(keepalive_idle: Optional[float]):
+    r"""生成开启TCP keep-alive的socket选项"""
+    options = list(HTTPConnection.default_socket_options)
+    if keepalive_idle is None:
+        return options
+    idle = max(1, int(keepalive_idle))
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle // 4)))
+    return options
+
+
+def _compressor(encoding: str):
+    # gzip使用gzip封装, deflate按HTTP规范使用zlib封装
+    return zlib.compressobj(wbits=31 if encoding == "gzip" else 15)
+
+
+def _compress_bytes(body: bytes, encoding: str) -> bytes:
+    compressor = _compressor(encoding)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _compress_iter(body, encoding: str):
+    compressor = _compressor(encoding)
+    for chunk in body:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _compress_request(request: requests.PreparedRequest, encoding: str, min_size: int):
+    r"""按配置压缩请求体: bytes直接压缩, 可迭代的请求体边读边压缩并以chunked方式发送"""
+    body = request.body
+    if body is None or "Content-Encoding" in request.headers:
+        return
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, bytes):
+        if len(body) < min_size:
+            return
+        request.body = _compress_bytes(body, encoding)
+        request.headers["Content-Length"] = str(len(request.body))
+    elif hasattr(body, "__iter__") and not hasattr(body, "read"):
+        try:
+            if len(body) < min_size:
+                return
+        except TypeError:
+            pass
+        request.body = _compress_iter(body, encoding)
+        request.headers.pop("Content-Length", None)
+    else:
+        return
+    request.headers["Content-Encoding"] = encoding
+
+
+class _PoolAdapter(HTTPAdapter):
+    r"""支持TCP keep-alive、空闲回收、默认超时与请求体压缩的HTTPAdapter"""
+
+    def __init__(self, pool_config: HTTPPoolConfig, **kwargs):
+        self._pool_config = pool_config
+        self._last_used = time.monotonic()
+        self._idle_lock = threading.Lock()
+        super().__init__(pool_connections=pool_config.pool_connections,
+                         pool_maxsize=pool_config.pool_maxsize,
+                         pool_block=pool_config.pool_block,
+                         **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs["socket_options"] = _keepalive_socket_options(self._pool_config.keepalive_idle)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+    def send(self, request, **kwargs):
+        idle_timeout = self._pool_config.pool_idle_timeout
+        if idle_timeout is not None:
+            with self._idle_lock:
+                now = time.monotonic()
+                if now - self._last_used > idle_timeout:
+                    self.poolmanager.clear()
+                self._last_used = now
+        # 调用方未指定或显式传入timeout=None时使用默认超时, 避免网关异常时请求无限期阻塞
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self._pool_config.default_timeout()
+        if self._pool_config.request_compression:
+            _compress_request(request, self._pool_config.request_compression,
+                              self._pool_config.compression_min_size)
+        return super().send(request, **kwargs)
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        r"""返回每个host连接池的统计信息"""
+        stats = {}
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            idle = pool.pool.qsize() if pool.pool is not None else 0
+            stats["{}://{}:{}".format(pool.scheme, pool.host, pool.port)] = {
+                "num_connections": pool.num_connections,
+                "num_requests": pool.num_requests,
+                "idle_connections": idle,
+                "maxsize": self._pool_config.pool_maxsize,
+            }
+        return stats
+
+
+class RetryPolicy(object):
+    r"""单次请求的重试策略, 创建后不可修改, 可以在多个线程间安全共享.
+
+    对连接失败以及status_forcelist中的HTTP状态码进行重试, 重试间隔为带随机抖动的指数退避:
+    random.uniform(0, min(backoff_max, backoff_factor * 2 ** attempt)), 若返回了Retry-After头且
+    respect_retry_after为True, 则至少等待Retry-After指定的时间(不超过retry_after_max)。
+
+        参数:
+            total(int): 最大重试次数, 0表示不重试.
+            backoff_factor(float): 退避基数(秒).
+            backoff_max(float): 单次退避的最大时长(秒).
+            status_forcelist(tuple): 需要重试的HTTP状态码, 默认(429, 503).
+            respect_retry_after(bool): 是否遵循返回的Retry-After头.
+            retry_after_max(float): Retry-After等待时长的上限(秒).
+    """
+    __slots__ = ("total", "backoff_factor", "backoff_max", "status_forcelist",
+                 "respect_retry_after", "retry_after_max")
+
+    def __init__(self,
+                 total: int = 0,
+                 backoff_factor: float = 0.1,
+                 backoff_max: float = 10.0,
+                 status_forcelist: Tuple[int, ...] = (429, 503),
+                 respect_retry_after: bool = True,
+                 retry_after_max: float = 60.0):
+        if not isinstance(total, int) or total < 0:
+            raise InvalidRequestArgumentError("retry must be int and bigger then zero")
+        object.__setattr__(self, "total", total)
+        object.__setattr__(self, "backoff_factor", backoff_factor)
+        object.__setattr__(self, "backoff_max", backoff_max)
+        object.__setattr__(self, "status_forcelist", frozenset(status_forcelist))
+        object.__setattr__(self, "respect_retry_after", respect_retry_after)
+        object.__setattr__(self, "retry_after_max", retry_after_max)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RetryPolicy is immutable")
+
+    def __repr__(self):
+        return "RetryPolicy(total={}, backoff_factor={}, backoff_max={}, status_forcelist={})".format(
+            self.total, self.backoff_factor, self.backoff_max, sorted(self.status_forcelist))
+
+    @classmethod
+    def from_value(cls, retry: Union[int, "RetryPolicy", None]) -> "RetryPolicy":
+        r"""将组件接口中的retry参数(int或RetryPolicy)转换为RetryPolicy"""
+        if isinstance(retry, RetryPolicy):
+            return retry
+        return cls(total=retry or 0)
+
+    def should_retry_status(self, status_code: int) -> bool:
+        r"""返回该HTTP状态码是否需要重试"""
+        return status_code in self.status_forcelist
+
+    def backoff(self, attempt: int, headers: Optional[Dict[str, str]] = None) -> float:
+        r"""计算第attempt次(从0开始)重试前需要等待的秒数"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+        if self.respect_retry_after and headers:
+            retry_after = self.parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.retry_after_max))
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        r"""解析Retry-After头, 支持秒数与HTTP-date两种格式"""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_date is None:
+            return None
+        return max(0.0, retry_date.timestamp() - time.time())
+
+
+class HedgePolicy(object):
+    r"""幂等请求的对冲策略, 创建后不可修改, 可以在多个线程间安全共享.
+
+    请求发出后超过对冲延迟仍未返回时, 再发送一个相同的请求, 使用最先成功返回的结果, 用于降低长尾延迟。
+    在对冲延迟内抛出连接异常的请求不等待延迟, 立即发送对冲请求; 所有请求都失败时抛出第一个异常。
+    对冲延迟取该接口最近请求耗时的percentile分位数, 样本数不足min_samples时使用delay。
+    只适用于幂等请求, 流式请求不会对冲。
+
+        参数:
+            delay(float): 样本不足时的对冲延迟(秒), 默认0.5.
+            percentile(float): 计算对冲延迟使用的耗时分位数, 默认0.95.
+            max_hedges(int): 最多额外发送的请求数, 默认1.
+            min_samples(int): 使用分位数前需要的最少耗时样本数, 默认20.
+            min_delay(float): 对冲延迟的下限(秒), 默认0.01.
+    """
+    __slots__ = ("delay", "percentile", "max_hedges", "min_samples", "min_delay")
+
+    def __init__(self,
+                 delay: float = 0.5,
+                 percentile: float = 0.95,
+                 max_hedges: int = 1,
+                 min_samples: int = 20,
+                 min_delay: float = 0.01):
+        if not 0 < percentile <= 1:
+            raise InvalidRequestArgumentError("percentile must be in (0, 1]")
+        if max_hedges < 1:
+            raise InvalidRequestArgumentError("max_hedges must be bigger than zero")
+        object.__setattr__(self, "delay", delay)
+        object.__setattr__(self, "percentile", percentile)
+        object.__setattr__(self, "max_hedges", max_hedges)
+        object.__setattr__(self, "min_samples", min_samples)
+        object.__setattr__(self, "min_delay", min_delay)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HedgePolicy is immutable")
+
+    def __repr__(self):
+        return "HedgePolicy(delay={}, percentile={}, max_hedges={})".format(
+            self.delay, self.percentile, self.max_hedges)
+
+    @classmethod
+    def from_value(cls, hedge: Union[bool, "HedgePolicy", None]) -> Optional["HedgePolicy"]:
+        r"""将hedge参数(None、bool或HedgePolicy)转换为HedgePolicy, 不对冲时返回None"""
+        if isinstance(hedge, HedgePolicy):
+            return hedge
+        return cls() if hedge else None
+
+    def hedge_delay(self, latencies) -> float:
+        r"""根据最近的请求耗时计算对冲延迟"""
+        samples = sorted(latencies)
+        if len(samples) < self.min_samples:
+            return max(self.min_delay, self.delay)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile))
+        return max(self.min_delay, samples[index])
+
+
+_HEDGE_WINDOW = 100
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> futures.ThreadPoolExecutor:
+    r"""对冲请求使用的线程池, 与调用方线程池独立, 避免互相等待"""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = futures.ThreadPoolExecutor(
+                max_workers=_env_int("APPBUILDER_HTTP_HEDGE_WORKERS", 32), thread_name_prefix="appbuilder-hedge")
+        return _hedge_executor
 
 
 class HTTPClient:
@@ -30,33 +364,183 @@ class HTTPClient:
 
     def __init__(self,
                  secret_key: Optional[str] = None,
-                 gateway: str = ""
+                 gateway: str = "",
+                 pool_config: Optional[HTTPPoolConfig] = None,
                  ):
         r"""HTTPClient初始化方法.
 
             参数:
                 secret_key(str,可选): 用户鉴权token, 默认从环境变量中获取: os.getenv("APPBUILDER_TOKEN", "").
                 gateway(str, 可选): 后端网关服务地址，默认从环境变量中获取: os.getenv("GATEWAY_URL", "")
+                pool_config(obj:`HTTPPoolConfig`, 可选): 连接池配置，默认从环境变量中获取
             返回：
                 无
         """
-        self.secret_key = secret_key if secret_key else os.getenv("APPBUILDER_TOKEN", "")
-        if not self.secret_key:
+        self.pool_config = pool_config if pool_config is not None else HTTPPoolConfig()
+        self.secret_key, self.gateway = self.resolve_credentials(secret_key, gateway)
+        self._latencies = {}
+        self._init_session()
+
+    @staticmethod
+    def resolve_credentials(secret_key: Optional[str] = None, gateway: str = ""):
+        r"""根据参数与环境变量得到规范化后的鉴权token与网关地址.
+
+            参数:
+                secret_key(str,可选): 用户鉴权token, 默认从环境变量中获取: os.getenv("APPBUILDER_TOKEN", "").
+                gateway(str, 可选): 后端网关服务地址，默认从环境变量中获取: os.getenv("GATEWAY_URL", "")
+            返回：
+                tuple: (secret_key, gateway)
+        """
+        secret_key = secret_key if secret_key else os.getenv("APPBUILDER_TOKEN", "")
+        if not secret_key:
             raise ValueError("secret_key is empty, please pass a nonempty secret_key "
                              "or set a secret_key in environment variable")
-        if not self.secret_key.startswith("Bearer"):
-            self.secret_key = "Bearer {}".format(self.secret_key)
+        if not secret_key.startswith("Bearer"):
+            secret_key = "Bearer {}".format(secret_key)
 
         if not gateway and not os.getenv("GATEWAY_URL"):
-            self.gateway = GATEWAY_URL
+            gateway = GATEWAY_URL
         else:
-            self.gateway = gateway if gateway else os.getenv("GATEWAY_URL", "")
+            gateway = gateway if gateway else os.getenv("GATEWAY_URL", "")
 
-        if not self.gateway.startswith("http"):
-            self.gateway = "https://" + self.gateway
+        if not gateway.startswith("http"):
+            gateway = "https://" + gateway
+        return secret_key, gateway
+
+    def _init_session(self):
+        r"""初始化底层HTTP会话"""
         self.session = requests.sessions.Session()
+        # 连接池级别的重试固定为0, 请求级别的重试由post/request的retry参数(RetryPolicy)控制
         self.retry = Retry(total=0, backoff_factor=0.1)
-        self.session.mount(self.gateway, HTTPAdapter(max_retries=self.retry))
+        self.adapter = _PoolAdapter(self.pool_config, max_retries=self.retry)
+        self.session.mount(self.gateway, self.adapter)
+
+    def post(self, url: str, retry: Union[int, RetryPolicy] = 0, hedge: Union[bool, HedgePolicy, None] = None,
+             **kwargs) -> requests.Response:
+        r"""发送POST请求, 按本次请求的重试策略进行重试, 不修改共享的连接池状态.
+
+            参数:
+                url(str): 请求地址.
+                retry(int|obj:`RetryPolicy`, 可选): 重试次数或重试策略, 默认不重试.
+                hedge(bool|obj:`HedgePolicy`, 可选): 对冲策略, 只能用于幂等请求, 默认不对冲.
+                **kwargs: 透传给requests.Session.post的参数.
+            返回：
+                requests.Response
+        """
+        return self.request("POST", url, retry=retry, hedge=hedge, **kwargs)
+
+    def request(self, method: str, url: str, retry: Union[int, RetryPolicy] = 0,
+                hedge: Union[bool, HedgePolicy, None] = None, **kwargs) -> requests.Response:
+        r"""发送HTTP请求, 参数同post方法.
+
+        如果RateLimiter中设置了该接口的限流, 发送前会等待令牌; 如果CircuitBreaker中设置了该接口的熔断器,
+        熔断期间直接抛出CircuitOpenException。
+        """
+        policy = RetryPolicy.from_value(retry)
+        hedge = None if kwargs.get("stream") else HedgePolicy.from_value(hedge)
+        limiter = RateLimiter().get(url)
+        breaker = CircuitBreaker().get(url)
+        attempt = 0
+        while True:
+            try:
+                if hedge is None:
+                    response = self._send(limiter, breaker, method, url, **kwargs)
+                else:
+                    response = self._hedged_send(hedge, limiter, breaker, method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if attempt >= policy.total:
+                    raise
+                time.sleep(policy.backoff(attempt))
+                attempt += 1
+                continue
+            if attempt >= policy.total or not policy.should_retry_status(response.status_code):
+                return response
+            delay = policy.backoff(attempt, response.headers)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(self, limiter, breaker, method: str, url: str, **kwargs) -> requests.Response:
+        if breaker is not None:
+            breaker.before_request(url)
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if breaker is not None:
+                breaker.on_failure()
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release()
+        self._record_result(limiter, breaker, response.status_code,
+                            None if kwargs.get("stream") else response.content)
+        return response
+
+    @staticmethod
+    def _record_result(limiter, breaker, status_code: int, content: Optional[bytes]):
+        if limiter is not None:
+            if RateLimiter.is_throttled(status_code, content):
+                limiter.on_throttle()
+            else:
+                limiter.on_success()
+        if breaker is not None:
+            if CircuitBreaker.is_failure(status_code):
+                breaker.on_failure()
+            else:
+                breaker.on_success()
+
+    def _latency_window(self, url: str) -> collections.deque:
+        path = urlparse(url).path
+        window = self._latencies.get(path)
+        if window is None:
+            window = self._latencies.setdefault(path, collections.deque(maxlen=_HEDGE_WINDOW))
+        return window
+
+    def _timed_send(self, window: collections.deque, *args, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        response = self._send(*args, **kwargs)
+        window.append(time.monotonic() - start)
+        return response
+
+    def _hedged_send(self, hedge: HedgePolicy, limiter, breaker, method: str, url: str,
+                     **kwargs) -> requests.Response:
+        window = self._latency_window(url)
+        delay = hedge.hedge_delay(list(window))
+        executor = _get_hedge_executor()
+        pending = set()
+        errors = []
+        launched = 0
+        while True:
+            if launched <= hedge.max_hedges:
+                pending.add(executor.submit(self._timed_send, window, limiter, breaker, method, url, **kwargs))
+                launched += 1
+            timeout = delay if launched <= hedge.max_hedges else None
+            done, pending = futures.wait(pending, timeout=timeout, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 未被采用的请求结束后关闭其连接
+                    for other in pending:
+                        other.add_done_callback(_close_future_response)
+                    return future.result()
+                errors.append(future.exception())
+            # 还有对冲名额时, 失败的请求不等待对冲延迟, 在下一轮立即补发
+            if not pending and launched > hedge.max_hedges:
+                raise errors[0]
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        r"""返回连接池统计信息.
+
+            返回：
+                dict: key为"scheme://host:port", value包含num_connections(累计新建连接数)、
+                num_requests(累计请求数)、idle_connections(当前空闲可复用的连接数)、maxsize(连接池大小).
+        """
+        return self.adapter.pool_stats()
+
+    def close(self):
+        r"""关闭底层HTTP会话及其连接池"""
+        self.session.close()
 
     @staticmethod
     def check_response_header(response: requests.Response):
@@ -125,7 +609,7 @@ class HTTPClient:
     def check_param(func):
         def inner(*args, **kwargs):
             retry = kwargs.get("retry", 0)
-            if retry < 0 or not isinstance(retry, int):
+            if not isinstance(retry, RetryPolicy) and (not isinstance(retry, int) or retry < 0):
                 raise InvalidRequestArgumentError("retry must be int and bigger then zero")
             timeout = kwargs.get("timeout", None)
             if timeout and not (isinstance(timeout, float) or isinstance(timeout, tuple)):
@@ -133,3 +617,414 @@ class HTTPClient:
             return func(*args, **kwargs)
 
         return inner
+
+
+def _close_future_response(future: futures.Future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class HTTPClientRegistry(object):
+    r"""进程级共享的HTTPClient注册表, 是一个全局单例.
+
+    相同(secret_key, gateway, pool_config)的使用方共享同一个HTTPClient及其连接池。注册表对每个HTTPClient
+    做引用计数, 引用计数降为0且空闲超过idle_timeout秒(环境变量APPBUILDER_HTTP_CLIENT_IDLE_TIMEOUT, 默认300)后关闭。
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        """
+        单例模式
+        """
+        if cls._instance is None:
+            cls._instance = object.__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._entries = {}
+        # 等待处理的release, deque的append是线程安全的, 不需要加锁
+        self._pending_releases = collections.deque()
+        self.idle_timeout = _env_float("APPBUILDER_HTTP_CLIENT_IDLE_TIMEOUT", 300)
+
+    @staticmethod
+    def _key(secret_key: str, gateway: str, pool_config: HTTPPoolConfig):
+        return secret_key, gateway, tuple(sorted(pool_config.model_dump().items()))
+
+    def acquire(self,
+                secret_key: Optional[str] = None,
+                gateway: str = "",
+                pool_config: Optional[HTTPPoolConfig] = None
+                ) -> HTTPClient:
+        r"""获取共享的HTTPClient并增加引用计数, 使用完毕后需要调用release.
+
+            参数:
+                secret_key(str,可选): 用户鉴权token, 默认从环境变量中获取: os.getenv("APPBUILDER_TOKEN", "").
+                gateway(str, 可选): 后端网关服务地址，默认从环境变量中获取: os.getenv("GATEWAY_URL", "")
+                pool_config(obj:`HTTPPoolConfig`, 可选): 连接池配置，默认从环境变量中获取
+            返回：
+                obj:`HTTPClient`
+        """
+        secret_key, gateway = HTTPClient.resolve_credentials(secret_key, gateway)
+        pool_config = pool_config if pool_config is not None else HTTPPoolConfig()
+        key = self._key(secret_key, gateway, pool_config)
+        with self._lock:
+            self._apply_releases_locked()
+            self._close_idle_locked(self.idle_timeout)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"client": HTTPClient(secret_key, gateway, pool_config=pool_config),
+                         "refcount": 0, "idle_since": None}
+                self._entries[key] = entry
+            entry["refcount"] += 1
+            entry["idle_since"] = None
+            return entry["client"]
+
+    def release(self, client: HTTPClient):
+        r"""减少HTTPClient的引用计数, 引用计数为0的HTTPClient会在空闲超时后关闭.
+
+        release通常由使用方被垃圾回收时调用, 可能发生在本线程持有注册表锁的时候, 因此不等待锁:
+        锁被占用时只登记, 由下一次获取锁的操作处理。
+        """
+        self._pending_releases.append(client)
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._apply_releases_locked()
+            self._close_idle_locked(self.idle_timeout)
+        finally:
+            self._lock.release()
+
+    def _apply_releases_locked(self):
+        while self._pending_releases:
+            client = self._pending_releases.popleft()
+            entry = self._entries.get(self._key(client.secret_key, client.gateway, client.pool_config))
+            if entry is None or entry["client"] is not client or entry["refcount"] <= 0:
+                continue
+            entry["refcount"] -= 1
+            if entry["refcount"] == 0:
+                entry["idle_since"] = time.monotonic()
+
+    def close_idle(self, idle_timeout: Optional[float] = None) -> int:
+        r"""关闭引用计数为0且空闲时间超过idle_timeout秒的HTTPClient.
+
+            参数:
+                idle_timeout(float, 可选): 空闲时间阈值, 默认使用注册表的idle_timeout, 传0关闭所有空闲的HTTPClient.
+            返回：
+                int: 关闭的HTTPClient个数
+        """
+        with self._lock:
+            self._apply_releases_locked()
+            return self._close_idle_locked(self.idle_timeout if idle_timeout is None else idle_timeout)
+
+    def _close_idle_locked(self, idle_timeout: Optional[float]) -> int:
+        if idle_timeout is None:
+            return 0
+        now = time.monotonic()
+        idle_keys = [key for key, entry in self._entries.items()
+                     if entry["refcount"] == 0 and now - entry["idle_since"] >= idle_timeout]
+        for key in idle_keys:
+            self._entries.pop(key)["client"].close()
+        return len(idle_keys)
+
+    def stats(self) -> list:
+        r"""返回注册表中每个HTTPClient的网关、引用计数与连接池统计"""
+        with self._lock:
+            self._apply_releases_locked()
+            entries = list(self._entries.values())
+        return [{"gateway": entry["client"].gateway,
+                 "refcount": entry["refcount"],
+                 "pool": entry["client"].pool_stats()} for entry in entries]
+
+
+def shared_http_client(owner: Any,
+                       secret_key: Optional[str] = None,
+                       gateway: str = "",
+                       pool_config: Optional[HTTPPoolConfig] = None):
+    r"""为owner从HTTPClientRegistry获取共享的HTTPClient, owner被回收时自动释放引用.
+
+        返回：
+            tuple: (HTTPClient, release), release为可调用对象, 调用后立即释放引用(只生效一次).
+    """
+    registry = HTTPClientRegistry()
+    client = registry.acquire(secret_key, gateway, pool_config)
+    return client, weakref.finalize(owner, registry.release, client)
+
+
+class AsyncStreamResponse(object):
+    r"""AsyncHTTPClient以stream=True发送请求时的返回, 返回体不会被预先读取, 需要通过iter_chunks异步读取.
+
+    status_code、headers、url等属性与requests.Response一致, 读取结束或调用close后连接归还连接池。
+    """
+
+    def __init__(self, resp):
+        self.status_code = resp.status
+        self.reason = resp.reason
+        self.headers = CaseInsensitiveDict(resp.headers)
+        self.url = str(resp.url)
+        self._resp = resp
+
+    async def iter_chunks(self):
+        r"""按收到的数据块异步迭代返回体"""
+        try:
+            async for chunk in self._resp.content.iter_any():
+                yield chunk
+        finally:
+            self.close()
+
+    def __aiter__(self):
+        return self.iter_chunks()
+
+    async def read(self) -> bytes:
+        r"""读取完整的返回体"""
+        try:
+            return await self._resp.read()
+        finally:
+            self.close()
+
+    def close(self):
+        r"""释放连接"""
+        self._resp.release()
+
+
+class AsyncHTTPClient(HTTPClient):
+    r"""AsyncHTTPClient类,基于aiohttp实现与后端服务交互的异步公共方法.
+
+    鉴权、service_url拼接与返回值检查逻辑与HTTPClient保持一致。请求返回的结果会被完整读取并转换为
+    requests.Response, 因此check_response_header、check_response_json等方法可以直接复用;
+    stream=True时返回AsyncStreamResponse, 返回体按块异步读取。
+    """
+
+    def _init_session(self):
+        r"""aiohttp的ClientSession需要在事件循环中创建, 这里延迟到第一次请求时初始化, 每个事件循环一个.
+            连接池按pool_config设置: 总连接数pool_connections * pool_maxsize, 每个host最多pool_maxsize,
+            空闲连接在pool_idle_timeout(默认15秒)后关闭.
+        """
+        # key为事件循环, value为(ClientSession, 事件循环结束时关闭它的异步生成器)
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def session(self):
+        r"""返回绑定到当前事件循环的aiohttp.ClientSession, 事件循环结束时自动关闭"""
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("aiohttp module is not installed. Please install it using 'pip install aiohttp'.")
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            entry = self._sessions.get(loop)
+            if entry is not None and not entry[0].closed:
+                return entry[0]
+            # 未经asyncio.run等方式正常结束的事件循环, 无法再在其中关闭session, 这里只丢弃引用
+            for other in [other for other in self._sessions if other.is_closed()]:
+                del self._sessions[other]
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_config.pool_connections * self.pool_config.pool_maxsize,
+                limit_per_host=self.pool_config.pool_maxsize,
+                keepalive_timeout=self.pool_config.pool_idle_timeout or 15)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = (session, self._close_on_loop_shutdown(loop, session))
+            return session
+
+    def _close_on_loop_shutdown(self, loop, session):
+        r"""返回一个已经在loop中启动的异步生成器, 事件循环结束前(asyncio.run会调用loop.shutdown_asyncgens)
+            或生成器被回收时, 在该事件循环中关闭session及其连接
+        """
+        async def guard():
+            try:
+                yield
+            finally:
+                with self._sessions_lock:
+                    entry = self._sessions.get(loop)
+                    if entry is not None and entry[0] is session:
+                        del self._sessions[loop]
+                await session.close()
+
+        agen = guard()
+        # 在当前事件循环中执行到yield, 使其被事件循环跟踪
+        try:
+            agen.__anext__().send(None)
+        except StopIteration:
+            pass
+        return agen
+
+    def _client_timeout(self, timeout):
+        r"""将requests风格的timeout(float或(connect, read)元组)转换为aiohttp.ClientTimeout,
+            为None时使用pool_config中的默认超时
+        """
+        import aiohttp
+        if timeout is None:
+            timeout = self.pool_config.default_timeout()
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    async def request(self, method: str, url: str, timeout=None, retry: Union[int, RetryPolicy] = 0,
+                      hedge: Union[bool, HedgePolicy, None] = None, stream: bool = False,
+                      **kwargs) -> Union[requests.Response, AsyncStreamResponse]:
+        r"""异步发送HTTP请求，并读取完整的返回体.
+
+            参数:
+                method(str): HTTP方法.
+                url(str): 请求地址.
+                timeout(float|tuple, 可选): 超时时间，与requests的timeout语义一致.
+                retry(int|obj:`RetryPolicy`, 可选): 重试次数或重试策略, 默认不重试.
+                hedge(bool|obj:`HedgePolicy`, 可选): 对冲策略, 只能用于幂等请求, 默认不对冲, stream=True时不生效.
+                stream(bool, 可选): 为True时不读取返回体, 返回AsyncStreamResponse, 默认False.
+                **kwargs: 透传给aiohttp的参数，如headers、json、data、params.
+            返回：
+                requests.Response|obj:`AsyncStreamResponse`: 与同步HTTPClient相同类型的返回对象.
+        """
+        import aiohttp
+        client_timeout = self._client_timeout(timeout)
+        policy = RetryPolicy.from_value(retry)
+        hedge = None if stream else HedgePolicy.from_value(hedge)
+        limiter = RateLimiter().get(url)
+        breaker = CircuitBreaker().get(url)
+        attempt = 0
+        while True:
+            try:
+                if stream:
+                    response = await self._asend_stream(limiter, breaker, method, url, client_timeout, **kwargs)
+                elif hedge is None:
+                    response = await self._asend(limiter, breaker, method, url, client_timeout, **kwargs)
+                else:
+                    response = await self._hedged_asend(hedge, limiter, breaker, method, url, client_timeout,
+                                                        **kwargs)
+            except aiohttp.ClientConnectionError as e:
+                if attempt >= policy.total:
+                    raise HTTPConnectionException(str(e))
+                await asyncio.sleep(policy.backoff(attempt))
+                attempt += 1
+                continue
+            if attempt >= policy.total or not policy.should_retry_status(response.status_code):
+                return response
+            if stream:
+                response.close()
+            await asyncio.sleep(policy.backoff(attempt, response.headers))
+            attempt += 1
+
+    async def _asend(self, limiter, breaker, method: str, url: str, client_timeout,
+                     **kwargs) -> requests.Response:
+        import aiohttp
+        if breaker is not None:
+            breaker.before_request(url)
+        if limiter is not None:
+            await limiter.aacquire()
+        if self.pool_config.request_compression:
+            kwargs = self._compress_kwargs(kwargs)
+        try:
+            async with self.session.request(method, url, timeout=client_timeout, **kwargs) as resp:
+                content = await resp.read()
+                response = self._to_response(resp, content)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if breaker is not None:
+                breaker.on_failure()
+            raise
+        finally:
+            if limiter is not None:
+                limiter.arelease()
+        self._record_result(limiter, breaker, response.status_code, content)
+        return response
+
+    async def _asend_stream(self, limiter, breaker, method: str, url: str, client_timeout,
+                            **kwargs) -> AsyncStreamResponse:
+        r"""收到响应头后返回, 与同步的stream请求一样, 限流的并发名额在此时释放"""
+        import aiohttp
+        if breaker is not None:
+            breaker.before_request(url)
+        if limiter is not None:
+            await limiter.aacquire()
+        if self.pool_config.request_compression:
+            kwargs = self._compress_kwargs(kwargs)
+        try:
+            resp = await self.session.request(method, url, timeout=client_timeout, **kwargs)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if breaker is not None:
+                breaker.on_failure()
+            raise
+        finally:
+            if limiter is not None:
+                limiter.arelease()
+        self._record_result(limiter, breaker, resp.status, None)
+        return AsyncStreamResponse(resp)
+
+    def _compress_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        r"""按配置压缩json或bytes请求体, 其它类型的请求体保持不变"""
+        kwargs = dict(kwargs)
+        headers = CaseInsensitiveDict(kwargs.get("headers") or {})
+        if "json" in kwargs:
+            kwargs["data"] = json.dumps(kwargs.pop("json")).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        data = kwargs.get("data")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if isinstance(data, bytes) and len(data) >= self.pool_config.compression_min_size \
+                and "Content-Encoding" not in headers:
+            kwargs["data"] = _compress_bytes(data, self.pool_config.request_compression)
+            headers["Content-Encoding"] = self.pool_config.request_compression
+        kwargs["headers"] = headers
+        return kwargs
+
+    async def _timed_asend(self, window: collections.deque, *args, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        response = await self._asend(*args, **kwargs)
+        window.append(time.monotonic() - start)
+        return response
+
+    async def _hedged_asend(self, hedge: HedgePolicy, limiter, breaker, method: str, url: str, client_timeout,
+                            **kwargs) -> requests.Response:
+        window = self._latency_window(url)
+        delay = hedge.hedge_delay(list(window))
+        pending = set()
+        errors = []
+        launched = 0
+        try:
+            while True:
+                if launched <= hedge.max_hedges:
+                    pending.add(asyncio.ensure_future(
+                        self._timed_asend(window, limiter, breaker, method, url, client_timeout, **kwargs)))
+                    launched += 1
+                timeout = delay if launched <= hedge.max_hedges else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+                if not pending and launched > hedge.max_hedges:
+                    raise errors[0]
+        finally:
+            # 未被采用的请求直接取消
+            for task in pending:
+                task.cancel()
+
+    async def post(self, url: str, timeout=None, retry: Union[int, RetryPolicy] = 0,
+                   **kwargs) -> Union[requests.Response, AsyncStreamResponse]:
+        r"""异步发送POST请求, 参数同request方法"""
+        return await self.request("POST", url, timeout=timeout, retry=retry, **kwargs)
+
+    @staticmethod
+    def _to_response(resp, content: bytes) -> requests.Response:
+        r"""将aiohttp的返回转换为requests.Response"""
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.url = str(resp.url)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = content
+        return response
+
+    async def close(self):
+        r"""关闭当前事件循环中的aiohttp.ClientSession, 其它事件循环中的session在各自的事件循环结束时关闭"""
+        with self._sessions_lock:
+            entry = self._sessions.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            # 结束生成器时关闭session
+            await entry[1].aclose()
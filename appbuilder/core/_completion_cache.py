@@ -0,0 +1,311 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""response cache for deterministic LLM completions"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import collections
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any
+
+from appbuilder.utils.logger_util import logger
+
+# temperature或top_p不超过该值时, 模型总是选择概率最高的token, 视为确定性请求
+_GREEDY_EPSILON = 1e-6
+
+
+class CacheBackend(ABC):
+    r"""缓存存储后端, 保存key到序列化后字符串的映射, 实现需要线程安全"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        r"""返回key对应的值, 不存在或已过期时返回None"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        r"""保存key对应的值, ttl为过期秒数, None表示不过期"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        r"""删除key, 不存在时忽略"""
+
+    @abstractmethod
+    def clear(self):
+        r"""删除全部缓存"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    r"""进程内LRU缓存.
+
+        参数:
+            max_size(int, 可选): 最多缓存的条目数, 超出后淘汰最久未使用的条目, 默认1024.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        if max_size <= 0:
+            raise ValueError("max_size must be bigger than zero")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expire_at, value = entry
+            if expire_at is not None and expire_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expire_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expire_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    r"""基于SQLite的缓存, 可以在进程重启后复用, 也可以由同一台机器上的多个进程共享.
+
+        参数:
+            path(str, 可选): 数据库文件路径, 默认appbuilder_completion_cache.db.
+    """
+
+    def __init__(self, path: str = "appbuilder_completion_cache.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS completion_cache "
+                           "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expire_at REAL)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expire_at FROM completion_cache WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= time.time():
+                self._conn.execute("DELETE FROM completion_cache WHERE key = ?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expire_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO completion_cache (key, value, expire_at) VALUES (?, ?, ?)",
+                               (key, value, expire_at))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM completion_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completion_cache")
+
+    def purge_expired(self):
+        r"""删除所有已过期的条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM completion_cache WHERE expire_at IS NOT NULL AND expire_at <= ?",
+                               (time.time(),))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DiskCacheBackend(CacheBackend):
+    r"""每个条目保存为目录下的一个文件, 写入时先写临时文件再原子替换, 多进程共享目录是安全的.
+
+        参数:
+            directory(str, 可选): 缓存目录, 不存在时自动创建, 默认.appbuilder_completion_cache.
+    """
+
+    def __init__(self, directory: str = ".appbuilder_completion_cache"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expire_at"] is not None and entry["expire_at"] <= time.time():
+            self.delete(key)
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"expire_at": time.time() + ttl if ttl is not None else None, "value": value}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    os.unlink(os.path.join(root, name))
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+class CompletionCache(object):
+    r"""大模型组件的响应缓存, 默认不开启.
+
+    缓存key由组件名称、版本、模型、输入(query与inputs, 字符串去除首尾空白)、completion参数以及是否流式决定。
+    流式响应在被完整读取后写入缓存, 命中时按原有的数据块重放。缓存读写失败只记录日志, 不影响请求。
+    默认只缓存确定性的请求(temperature或top_p接近0, 即组件的默认参数), 采样请求每次都发送到服务端。
+
+        参数:
+            backend(CacheBackend, 可选): 存储后端, 默认MemoryCacheBackend().
+            ttl(float, 可选): 条目的有效秒数, None表示不过期, 默认24小时.
+            cache_sampling(bool, 可选): 是否同时缓存采样请求(temperature与top_p都大于0), 默认False.
+
+    Examples:
+
+        .. code-block:: python
+
+            import appbuilder
+            from appbuilder import CompletionCache, SQLiteCacheBackend
+            from appbuilder.core.components.llms.base import CompletionBaseComponent
+
+            # 对所有大模型组件开启缓存
+            CompletionBaseComponent.completion_cache = CompletionCache()
+            # 只对QueryRewrite开启缓存, 并持久化到SQLite
+            appbuilder.QueryRewrite.completion_cache = CompletionCache(SQLiteCacheBackend("cache.db"))
+            print(appbuilder.QueryRewrite.completion_cache.stats())
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: Optional[float] = 24 * 60 * 60,
+                 cache_sampling: bool = False):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.cache_sampling = cache_sampling
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._errors = 0
+
+    @staticmethod
+    def make_key(name: str, version: str, model: str, inputs: Dict[str, Any],
+                 completion_params: Dict[str, Any], stream: bool = False) -> str:
+        r"""计算缓存key"""
+        payload = json.dumps([name, version, model, _normalize(inputs), completion_params, bool(stream)],
+                             sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, completion_params: Dict[str, Any]) -> bool:
+        r"""判断使用该completion参数的请求是否可以缓存"""
+        if self.cache_sampling:
+            return True
+        temperature = completion_params.get("temperature") or 0
+        top_p = completion_params.get("top_p") or 0
+        return min(temperature, top_p) <= _GREEDY_EPSILON
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        r"""读取缓存, 未命中时返回None"""
+        try:
+            value = self.backend.get(key)
+            entry = json.loads(value) if value is not None else None
+        except Exception as e:
+            logger.warning("failed to read completion cache: {}".format(e))
+            entry = None
+            with self._lock:
+                self._errors += 1
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        r"""写入缓存"""
+        try:
+            self.backend.set(key, json.dumps(entry, ensure_ascii=False), self.ttl)
+        except Exception as e:
+            logger.warning("failed to write completion cache: {}".format(e))
+            with self._lock:
+                self._errors += 1
+            return
+        with self._lock:
+            self._writes += 1
+
+    def clear(self):
+        r"""清空缓存, 不重置统计"""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        r"""返回命中统计"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "errors": self._errors,
+                "hit_rate": self._hits / total if total else 0.0,
+            }
@@ -59,6 +59,12 @@ class HTTPConnectionException(BaseRPCException):
     pass
 
 
+class CircuitOpenException(BaseRPCException):
+    r"""CircuitOpenException represent request rejected by an open circuit breaker.
+    """
+    pass
+
+
 class ModelNotSupportedException(BaseRPCException):
     r"""ModelNotSupportedException represent model is not supported
     """
@@ -96,3 +102,15 @@ class RiskInputException(BaseRPCException):
     r"""RiskInputException
     """
     pass
+
+
+class AdmissionRejectedException(BaseRPCException):
+    r"""AdmissionRejectedException represent request rejected by AgentRuntime admission control,
+    code is the HTTP status (503 or 429) and retry_after is the suggested seconds before retrying.
+    """
+    code: int = 503
+
+    def __init__(self, message="", code=503, retry_after=1):
+        super(AdmissionRejectedException, self).__init__(message)
+        self.code = code
+        self.retry_after = retry_after
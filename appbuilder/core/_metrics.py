@@ -0,0 +1,422 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""in-process metrics registry with prometheus text exposition"""
+
+import bisect
+import threading
+from typing import Dict, Any, Optional, Sequence, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384)
+DEFAULT_RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    items = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError("metric {} expects labels {}, got {}".format(
+                self.name, list(self.labelnames), sorted(labels)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _header(self):
+        return ["# HELP {} {}".format(self.name, _escape(self.documentation)),
+                "# TYPE {} {}".format(self.name, self.type)]
+
+
+class Counter(_Metric):
+    r"""单调递增的计数器, 按标签分别计数"""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("counter can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def expose(self):
+        lines = self._header()
+        for key, value in sorted(self.snapshot().items()):
+            lines.append("{}{} {}".format(self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+
+class Gauge(_Metric):
+    r"""可增可减的瞬时值, 按标签分别记录"""
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def expose(self):
+        lines = self._header()
+        for key, value in sorted(self.snapshot().items()):
+            lines.append("{}{} {}".format(self.name, _format_labels(self.labelnames, key), _format_value(value)))
+        return lines
+
+
+class Histogram(_Metric):
+    r"""直方图, 记录观测值落在各个上界中的次数以及总和"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def get(self, **labels) -> Dict[str, Any]:
+        r"""返回{"count", "sum", "buckets": {上界: 累计次数}}"""
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return self._summary(entry)
+
+    def _summary(self, entry) -> Dict[str, Any]:
+        counts, total, count = entry if entry is not None else ([0] * (len(self.buckets) + 1), 0.0, 0)
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets[bound] = cumulative
+        return {"count": count, "sum": total, "buckets": buckets}
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+        with self._lock:
+            return {key: self._summary(entry) for key, entry in self._values.items()}
+
+    def expose(self):
+        lines = self._header()
+        for key, summary in sorted(self.snapshot().items()):
+            for bound, count in summary["buckets"].items():
+                labels = _format_labels(self.labelnames, key, 'le="{}"'.format(_format_value(bound)))
+                lines.append("{}_bucket{} {}".format(self.name, labels, count))
+            labels = _format_labels(self.labelnames, key)
+            lines.append("{}_sum{} {}".format(self.name, labels, _format_value(summary["sum"])))
+            lines.append("{}_count{} {}".format(self.name, labels, summary["count"]))
+        return lines
+
+
+class MetricsRegistry(object):
+    r"""进程级的指标注册表, 是一个全局单例.
+
+    大模型组件的每次completion调用都会记录请求数、错误数、缓存命中数、合并请求数、首token耗时、总耗时、
+    输入输出token数与每秒生成token数, 标签为组件名称component与模型model。可以通过snapshot以字典形式读取,
+    也可以通过export_prometheus导出Prometheus文本格式, 或者调用start_http_server提供/metrics接口。
+
+    Examples:
+
+        .. code-block:: python
+
+            import appbuilder
+
+            registry = appbuilder.MetricsRegistry()
+            registry.start_http_server(port=9100)
+            print(registry.snapshot()["appbuilder_llm_requests_total"])
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        """
+        单例模式
+        """
+        if cls._instance is None:
+            cls._instance = object.__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError("metric {} already registered with a different type or labels".format(
+                        metric.name))
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        r"""注册或获取计数器, 同名指标只会注册一次"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        r"""注册或获取瞬时值指标, 同名指标只会注册一次"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        r"""注册或获取直方图, 同名指标只会注册一次"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        r"""返回所有指标的当前值, 格式为{指标名: {标签值元组: 值}}"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def reset(self):
+        r"""清空所有指标的值, 不取消注册"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def export_prometheus(self) -> str:
+        r"""导出Prometheus文本格式"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int = 9100, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        r"""在后台线程中启动只提供GET /metrics的HTTP服务.
+
+            参数:
+                port(int, 可选): 监听端口, 为0时随机选择, 默认9100.
+                host(str, 可选): 监听地址, 默认0.0.0.0.
+            返回：
+                obj:`ThreadingHTTPServer`, 调用shutdown()停止.
+        """
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = registry.export_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="appbuilder-metrics", daemon=True).start()
+        return server
+
+
+class LLMMetrics(object):
+    r"""大模型组件使用的指标集合, 注册在MetricsRegistry中"""
+    _labels = ("component", "model")
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry if registry is not None else MetricsRegistry()
+        self.requests = registry.counter(
+            "appbuilder_llm_requests_total", "Number of LLM completion calls.", self._labels + ("stream",))
+        self.errors = registry.counter(
+            "appbuilder_llm_errors_total", "Number of failed LLM completion calls by error code.",
+            self._labels + ("code",))
+        self.cache_hits = registry.counter(
+            "appbuilder_llm_cache_hits_total", "Number of LLM completion calls served from the completion cache.",
+            self._labels)
+        self.coalesced = registry.counter(
+            "appbuilder_llm_coalesced_total", "Number of LLM completion calls that joined an identical in-flight call.",
+            self._labels)
+        self.ttft = registry.histogram(
+            "appbuilder_llm_time_to_first_token_seconds", "Time from sending the request to the first answer chunk.",
+            self._labels)
+        self.latency = registry.histogram(
+            "appbuilder_llm_request_duration_seconds", "Time from sending the request to the last answer chunk.",
+            self._labels)
+        self.prompt_tokens = registry.counter(
+            "appbuilder_llm_prompt_tokens_total", "Number of prompt tokens consumed.", self._labels)
+        self.completion_tokens = registry.counter(
+            "appbuilder_llm_completion_tokens_total", "Number of completion tokens generated.", self._labels)
+        self.completion_tokens_per_call = registry.histogram(
+            "appbuilder_llm_completion_tokens", "Completion tokens generated per call.", self._labels,
+            DEFAULT_TOKEN_BUCKETS)
+        self.tokens_per_second = registry.histogram(
+            "appbuilder_llm_tokens_per_second", "Completion tokens generated per second of request duration.",
+            self._labels, DEFAULT_RATE_BUCKETS)
+
+    def record_request(self, component: str, model: str, stream: bool):
+        self.requests.inc(component=component, model=model, stream=str(bool(stream)).lower())
+
+    def record_cache_hit(self, component: str, model: str):
+        self.cache_hits.inc(component=component, model=model)
+
+    def record_coalesced(self, component: str, model: str):
+        self.coalesced.inc(component=component, model=model)
+
+    def record_error(self, component: str, model: str, error: BaseException):
+        code = getattr(error, "code", None)
+        self.errors.inc(component=component, model=model,
+                        code=str(code) if code not in (None, "") else type(error).__name__)
+
+    def record_success(self, component: str, model: str, ttft: float, duration: float,
+                       token_usage: Optional[Dict[str, Any]]):
+        self.ttft.observe(ttft, component=component, model=model)
+        self.latency.observe(duration, component=component, model=model)
+        token_usage = token_usage or {}
+        prompt_tokens = token_usage.get("prompt_tokens") or 0
+        completion_tokens = token_usage.get("completion_tokens") or 0
+        if prompt_tokens:
+            self.prompt_tokens.inc(prompt_tokens, component=component, model=model)
+        if completion_tokens:
+            self.completion_tokens.inc(completion_tokens, component=component, model=model)
+            self.completion_tokens_per_call.observe(completion_tokens, component=component, model=model)
+            if duration > 0:
+                self.tokens_per_second.observe(completion_tokens / duration, component=component, model=model)
+
+
+_llm_metrics = None
+_llm_metrics_lock = threading.Lock()
+
+
+def llm_metrics() -> LLMMetrics:
+    r"""返回大模型组件共用的LLMMetrics"""
+    global _llm_metrics
+    if _llm_metrics is None:
+        with _llm_metrics_lock:
+            if _llm_metrics is None:
+                _llm_metrics = LLMMetrics()
+    return _llm_metrics
+
+
+class AgentMetrics(object):
+    r"""AgentRuntime服务化后/chat接口使用的指标集合, 注册在MetricsRegistry中"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry if registry is not None else MetricsRegistry()
+        self.requests = registry.counter(
+            "appbuilder_agent_requests_total", "Number of AgentRuntime chat requests.", ("stream",))
+        self.errors = registry.counter(
+            "appbuilder_agent_errors_total", "Number of failed AgentRuntime chat requests by error code.", ("code",))
+        self.ttft = registry.histogram(
+            "appbuilder_agent_time_to_first_chunk_seconds",
+            "Time from receiving a streaming chat request to sending the first chunk.")
+        self.latency = registry.histogram(
+            "appbuilder_agent_request_duration_seconds",
+            "Time from receiving a chat request to sending the whole answer.", ("stream",))
+        self.active_streams = registry.gauge(
+            "appbuilder_agent_active_streams", "Number of streaming chat responses being sent.")
+        self.session_write = registry.histogram(
+            "appbuilder_agent_session_write_seconds", "Time spent saving UserSession messages after a chat request.",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+    def record_request(self, stream: bool):
+        self.requests.inc(stream=str(bool(stream)).lower())
+
+    def record_error(self, error: BaseException):
+        code = getattr(error, "code", None)
+        self.errors.inc(code=str(code) if code not in (None, "") else type(error).__name__)
+
+    def record_first_chunk(self, ttft: float):
+        self.ttft.observe(ttft)
+
+    def record_success(self, stream: bool, duration: float):
+        self.latency.observe(duration, stream=str(bool(stream)).lower())
+
+    def record_session_write(self, duration: float):
+        self.session_write.observe(duration)
+
+
+_agent_metrics = None
+
+
+def agent_metrics() -> AgentMetrics:
+    r"""返回AgentRuntime共用的AgentMetrics"""
+    global _agent_metrics
+    if _agent_metrics is None:
+        with _llm_metrics_lock:
+            if _agent_metrics is None:
+                _agent_metrics = AgentMetrics()
+    return _agent_metrics
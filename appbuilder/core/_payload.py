@@ -0,0 +1,166 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""streaming request bodies for large payloads"""
+
+import os
+import json
+import uuid
+import base64
+import threading
+from typing import Union, BinaryIO, Dict, Any, Iterator, List
+from urllib.parse import quote_plus, urlencode
+
+# 每次读取的原始字节数, 需为3的倍数, 保证分块编码的base64可以直接拼接
+_CHUNK_SIZE = 3 * 64 * 1024
+
+
+class Base64Stream(object):
+    r"""按块对bytes或二进制文件做base64编码, 不在内存中生成完整的编码结果.
+
+    可以重复迭代, 多次迭代(重试、对冲请求)之间互不影响; 文件从创建时的位置读到文件末尾.
+
+        参数:
+            source(bytes|BinaryIO): 原始内容或以二进制模式打开的文件.
+            chunk_size(int, 可选): 每次读取的原始字节数, 会被调整为3的倍数.
+    """
+
+    def __init__(self, source: Union[bytes, BinaryIO], chunk_size: int = _CHUNK_SIZE):
+        self._source = source
+        self._chunk_size = max(3, chunk_size - chunk_size % 3)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._view = memoryview(source)
+            self._start = 0
+            self._size = len(self._view)
+        else:
+            self._view = None
+            self._start = source.tell()
+            self._size = os.fstat(source.fileno()).st_size - self._start
+            self._lock = threading.Lock()
+
+    def __len__(self):
+        return (self._size + 2) // 3 * 4
+
+    def raw_chunks(self) -> Iterator[bytes]:
+        r"""按块返回原始内容"""
+        offset = 0
+        while offset < self._size:
+            size = min(self._chunk_size, self._size - offset)
+            if self._view is not None:
+                chunk = self._view[offset:offset + size]
+            else:
+                with self._lock:
+                    self._source.seek(self._start + offset)
+                    chunk = self._source.read(size)
+                if not chunk:
+                    break
+            offset += len(chunk)
+            yield chunk
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.raw_chunks():
+            yield base64.b64encode(chunk)
+
+
+class _QuotedBase64(object):
+    r"""对Base64Stream的输出做application/x-www-form-urlencoded编码.
+
+    转义后的长度取决于编码结果中"+"、"/"的个数, 预先计算需要多读一遍完整内容,
+    因此不提供__len__, 包含它的请求体以chunked方式发送.
+    """
+
+    def __init__(self, stream: Base64Stream):
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[bytes]:
+        # base64中只有"+"、"/"、"="需要转义, 结果与quote_plus相同
+        for chunk in self._stream:
+            yield chunk.replace(b"+", b"%2B").replace(b"/", b"%2F").replace(b"=", b"%3D")
+
+
+class StreamingBody(object):
+    r"""由bytes片段与Base64Stream等可迭代对象拼接成的请求体, 可以重复迭代, 长度未知时以chunked方式发送.
+
+    requests会按块发送可迭代的请求体. 注意不能实现read方法, 否则http.client会将其当作文件读取.
+    """
+
+    def __init__(self, parts: List[Any]):
+        self._parts = [part.encode() if isinstance(part, str) else part for part in parts]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self._parts:
+            if isinstance(part, bytes):
+                if part:
+                    yield part
+            else:
+                yield from part
+
+
+class SizedStreamingBody(StreamingBody):
+    r"""各片段长度已知的StreamingBody, requests根据__len__设置Content-Length"""
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
+
+
+def json_body(obj: Any) -> SizedStreamingBody:
+    r"""将obj编码为JSON请求体, obj中的Base64Stream会作为JSON字符串按块写入.
+
+        参数:
+            obj(dict|list): 待编码的对象, 可以嵌套Base64Stream.
+        返回：
+            obj:`SizedStreamingBody`
+    """
+    streams = {}
+
+    def _replace(value):
+        if isinstance(value, Base64Stream):
+            marker = "__appbuilder_stream_{}__".format(uuid.uuid4().hex)
+            streams[marker] = value
+            return marker
+        if isinstance(value, dict):
+            return {k: _replace(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_replace(v) for v in value]
+        return value
+
+    text = json.dumps(_replace(obj))
+    parts = []
+    for marker, stream in streams.items():
+        head, text = text.split('"{}"'.format(marker), 1)
+        parts.extend([head + '"', stream, '"'])
+    parts.append(text)
+    return SizedStreamingBody(parts)
+
+
+def form_body(fields: Dict[str, Any]) -> StreamingBody:
+    r"""将fields编码为application/x-www-form-urlencoded请求体, 其中的Base64Stream按块编码写入.
+
+        参数:
+            fields(dict): 表单字段, 普通字段的编码方式与requests一致.
+        返回：
+            obj:`StreamingBody`: 包含Base64Stream时长度未知, 以chunked方式发送, 避免为计算长度多编码一遍.
+    """
+    parts = []
+    chunked = False
+    for key, value in fields.items():
+        if parts:
+            parts.append("&")
+        if isinstance(value, Base64Stream):
+            parts.extend([quote_plus(key) + "=", _QuotedBase64(value)])
+            chunked = True
+        else:
+            parts.append(urlencode({key: value}, doseq=True))
+    return StreamingBody(parts) if chunked else SizedStreamingBody(parts)
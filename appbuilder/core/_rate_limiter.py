@@ -0,0 +1,302 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""client side rate limiter for gateway endpoints"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+import collections
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+
+from appbuilder.utils.logger_util import logger
+
+# 接口路径到匹配结果的缓存最多保存的路径数, 路径中带有资源ID时不同路径的数量没有上限
+_PATH_CACHE_SIZE = 1024
+
+# 网关返回的QPS超限错误码: 18为AIP服务QPS超限, 336501/336502为千帆模型RPM/TPM超限
+QPS_LIMIT_ERROR_CODES = frozenset([18, 336501, 336502])
+
+
+class EndpointLimiter(object):
+    r"""单个网关接口的限流器, 线程安全.
+
+    由令牌桶控制请求速率, 速率按AIMD调整: 每次成功请求速率增加increase_step(不超过max_qps),
+    每次被网关限流速率乘以decrease_factor(不低于min_qps)。可选的max_concurrency限制同时进行中的请求数。
+
+        参数:
+            max_qps(float): 速率上限, 一般设置为网关配额.
+            burst(float, 可选): 令牌桶容量, 默认等于max_qps且不小于1.
+            min_qps(float, 可选): 速率下限, 默认max_qps的1/10.
+            max_concurrency(int, 可选): 同时进行中的请求数上限, 默认不限制.
+            adaptive(bool, 可选): 是否在被限流时自动降低速率, 默认True.
+            decrease_factor(float, 可选): 被限流时速率的缩减系数, 默认0.5.
+            increase_step(float, 可选): 每次成功请求速率的增加量, 默认max_qps的1/20.
+    """
+
+    def __init__(self,
+                 max_qps: float,
+                 burst: Optional[float] = None,
+                 min_qps: Optional[float] = None,
+                 max_concurrency: Optional[int] = None,
+                 adaptive: bool = True,
+                 decrease_factor: float = 0.5,
+                 increase_step: Optional[float] = None):
+        if max_qps <= 0:
+            raise ValueError("max_qps must be bigger than zero")
+        self.max_qps = float(max_qps)
+        self.min_qps = float(min_qps) if min_qps is not None else self.max_qps / 10
+        self.burst = float(burst) if burst is not None else max(1.0, self.max_qps)
+        self.max_concurrency = max_concurrency
+        self.adaptive = adaptive
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else self.max_qps / 20
+
+        self._lock = threading.Lock()
+        self._rate = self.max_qps
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._in_flight = 0
+        self._requests = 0
+        self._throttled = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def reserve(self) -> float:
+        r"""预约一个令牌, 返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+            self._requests += 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def acquire(self):
+        r"""阻塞直到可以发送请求"""
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        with self._lock:
+            self._in_flight += 1
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self):
+        r"""请求结束后释放并发名额"""
+        with self._lock:
+            self._in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def aacquire(self):
+        r"""acquire的异步版本, 等待期间不阻塞事件循环"""
+        semaphore = self._async_semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+        with self._lock:
+            self._in_flight += 1
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def arelease(self):
+        r"""aacquire对应的释放方法"""
+        with self._lock:
+            self._in_flight -= 1
+        semaphore = self._async_semaphore()
+        if semaphore is not None:
+            semaphore.release()
+
+    def _async_semaphore(self):
+        # asyncio.Semaphore绑定事件循环, 每个事件循环使用独立的并发名额
+        if not self.max_concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._async_semaphores[loop] = semaphore
+            return semaphore
+
+    def on_success(self):
+        r"""请求成功, 速率加性增长"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._rate = min(self.max_qps, self._rate + self.increase_step)
+
+    def on_throttle(self):
+        r"""请求被网关限流, 速率乘性下降, 并清空令牌桶"""
+        with self._lock:
+            self._throttled += 1
+            if self.adaptive:
+                self._rate = max(self.min_qps, self._rate * self.decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        r"""返回限流器当前状态"""
+        with self._lock:
+            return {
+                "qps": self._rate,
+                "max_qps": self.max_qps,
+                "min_qps": self.min_qps,
+                "tokens": self._tokens,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests": self._requests,
+                "throttled": self._throttled,
+            }
+
+
+class _EndpointRegistry(object):
+    r"""按网关接口路径后缀匹配的全局单例注册表, 子类需定义_instance、_initialized与_env_name"""
+    _instance = None
+    _initialized = False
+    _env_name = ""
+
+    def __new__(cls, *args, **kwargs):
+        """
+        单例模式
+        """
+        if cls._instance is None:
+            cls._instance = object.__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._path_cache = collections.OrderedDict()
+        for item in os.getenv(self._env_name, "").split(","):
+            if not item.strip():
+                continue
+            try:
+                path, value = item.strip().rsplit("=", 1)
+                self._load_env_item(path, value)
+            except ValueError:
+                logger.warning("invalid {} item: {}".format(self._env_name, item))
+
+    def _load_env_item(self, path: str, value: str):
+        raise NotImplementedError
+
+    def _set(self, path: str, entry, replace: bool = True):
+        with self._lock:
+            key = path.rstrip("/")
+            if not replace and key in self._entries:
+                return self._entries[key]
+            self._entries[key] = entry
+            self._path_cache.clear()
+        return entry
+
+    def _remove(self, path: str):
+        with self._lock:
+            self._entries.pop(path.rstrip("/"), None)
+            self._path_cache.clear()
+
+    def get(self, url: str):
+        r"""返回url对应的对象, 没有设置时返回None"""
+        if not self._entries:
+            return None
+        path = urlparse(url).path.rstrip("/")
+        with self._lock:
+            cache = self._path_cache
+            if path in cache:
+                cache.move_to_end(path)
+                return cache[path]
+            matched = None
+            for key, entry in self._entries.items():
+                if path.endswith(key) and (matched is None or len(key) > len(matched[0])):
+                    matched = (key, entry)
+            entry = matched[1] if matched else None
+            cache[path] = entry
+            if len(cache) > _PATH_CACHE_SIZE:
+                cache.popitem(last=False)
+        return entry
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        r"""返回每个接口的状态"""
+        with self._lock:
+            entries = dict(self._entries)
+        return {path: entry.stats() for path, entry in entries.items()}
+
+
+class RateLimiter(_EndpointRegistry):
+    r"""按网关接口路径限流的全局单例, HTTPClient与AsyncHTTPClient在发送请求前会通过它申请令牌.
+
+    只有设置过限流的接口才会被限制, 接口通过请求url的路径后缀匹配, 例如"/v1/bce/aip/ocr/v1/accurate_basic"。
+    也可以通过环境变量APPBUILDER_RATE_LIMITS设置, 格式为"path=qps[:max_concurrency],path=qps"。
+
+    Examples:
+
+        .. code-block:: python
+
+            import appbuilder
+
+            appbuilder.RateLimiter().set_limit("/v1/bce/aip/ocr/v1/accurate_basic", max_qps=10)
+            print(appbuilder.RateLimiter().stats())
+    """
+    _instance = None
+    _initialized = False
+    _env_name = "APPBUILDER_RATE_LIMITS"
+
+    def _load_env_item(self, path: str, value: str):
+        qps, _, concurrency = value.partition(":")
+        self.set_limit(path, float(qps), max_concurrency=int(concurrency) if concurrency else None)
+
+    def set_limit(self, path: str, max_qps: float, **kwargs) -> EndpointLimiter:
+        r"""设置接口的限流, 参数同EndpointLimiter.
+
+            参数:
+                path(str): 接口路径或路径后缀.
+                max_qps(float): 速率上限.
+            返回：
+                obj:`EndpointLimiter`
+        """
+        return self._set(path, EndpointLimiter(max_qps, **kwargs))
+
+    def set_default_limit(self, path: str, max_qps: float, **kwargs) -> EndpointLimiter:
+        r"""接口未设置限流时设置默认限流, 已设置时返回已有的限流器, 参数同set_limit"""
+        return self._set(path, EndpointLimiter(max_qps, **kwargs), replace=False)
+
+    def remove_limit(self, path: str):
+        r"""取消接口的限流"""
+        self._remove(path)
+
+    @staticmethod
+    def is_throttled(status_code: int, content: Optional[bytes]) -> bool:
+        r"""判断响应是否为网关限流: HTTP 429, 或返回体中带有QPS超限错误码"""
+        if status_code == 429:
+            return True
+        # 限流错误的返回体很小, 避免对正常的大返回体做json解析
+        if not content or len(content) > 4096 or (b'"error_code"' not in content and b'"code"' not in content):
+            return False
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return False
+        if not isinstance(data, dict):
+            return False
+        code = data.get("error_code", data.get("code"))
+        return code in QPS_LIMIT_ERROR_CODES
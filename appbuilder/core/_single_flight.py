@@ -0,0 +1,330 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""coalesce identical concurrent calls into one in-flight call"""
+
+import asyncio
+import weakref
+import threading
+import collections
+from typing import Any, Callable, Awaitable, Tuple, Hashable
+
+
+class StreamAbandonedError(RuntimeError):
+    r"""订阅时源生成器已经因为所有订阅者放弃读取而被关闭, 缓存的数据块不完整, 需要重新发起调用"""
+    pass
+
+
+class _Call(object):
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self, event):
+        self.event = event
+        self.value = None
+        self.error = None
+
+
+class SingleFlight(object):
+    r"""相同key的并发调用只执行一次, 其他调用等待并共享结果或异常, 线程安全.
+
+    默认在调用返回后即可发起下一次调用; hold为True时key会一直保留到调用方执行forget, 用于流式结果在读取完之前
+    继续被后来的调用共享。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], hold: bool = False) -> Tuple[Any, bool]:
+        r"""执行或等待key对应的调用.
+
+            参数:
+                key(Hashable): 调用的key.
+                fn(Callable): 没有正在进行的调用时执行.
+                hold(bool, 可选): 调用成功后是否保留key直到forget, 默认False.
+            返回：
+                tuple: (结果, 是否由当前调用执行).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(threading.Event())
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, False
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            self._remove(key, call)
+            raise
+        finally:
+            call.event.set()
+        if not hold:
+            self._remove(key, call)
+        return call.value, True
+
+    def forget(self, key: Hashable, value: Any):
+        r"""释放hold的key, 只有key对应的结果仍是value时才释放"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.value is value:
+                del self._calls[key]
+
+    def _remove(self, key: Hashable, call: _Call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class AsyncSingleFlight(object):
+    r"""SingleFlight的异步版本, 只合并同一个事件循环内的调用"""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    def _loop_calls(self) -> dict:
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        return calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], hold: bool = False) -> Tuple[Any, bool]:
+        r"""执行或等待key对应的调用, 参数与返回值同SingleFlight.do"""
+        calls = self._loop_calls()
+        call = calls.get(key)
+        if call is not None:
+            await call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, False
+
+        call = calls[key] = _Call(asyncio.Event())
+        try:
+            call.value = await fn()
+        except BaseException as e:
+            call.error = e
+            if calls.get(key) is call:
+                del calls[key]
+            raise
+        finally:
+            call.event.set()
+        if not hold and calls.get(key) is call:
+            del calls[key]
+        return call.value, True
+
+    def forget(self, key: Hashable, value: Any):
+        r"""释放hold的key, 只有key对应的结果仍是value时才释放"""
+        for calls in list(self._calls.values()):
+            call = calls.get(key)
+            if call is not None and call.value is value:
+                del calls[key]
+
+
+class StreamBroadcast(object):
+    r"""把一个生成器的输出广播给多个订阅者, 每个订阅者都从第一个元素开始读取, 线程安全.
+
+    数据由读取最快的订阅者从源生成器中拉取并缓存, 拉取时不持有锁, 其他订阅者等待拉取结果。源生成器结束或出错后
+    调用on_done; 所有订阅者都被回收而源生成器仍未读完时, 在单独的线程中关闭源生成器, 同样调用on_done,
+    之后再订阅时抛出StreamAbandonedError。
+
+        参数:
+            source(Generator): 源生成器.
+            on_done(Callable, 可选): 源生成器结束、出错或被放弃时调用一次.
+    """
+
+    def __init__(self, source, on_done: Callable[[], None] = None):
+        self._source = source
+        self._on_done = on_done
+        self._cond = threading.Condition(threading.Lock())
+        self._items = []
+        self._done = False
+        self._error = None
+        self._pulling = False
+        self._abandoned = False
+        self._subscribers = 0
+        # 被回收的订阅者, deque的append是线程安全的, 不需要加锁
+        self._released = collections.deque()
+
+    def subscribe(self):
+        r"""返回一个新的订阅生成器, 源生成器已被放弃时抛出StreamAbandonedError"""
+        with self._cond:
+            if self._abandoned:
+                raise StreamAbandonedError("source stream was closed after all subscribers left")
+            self._subscribers += 1
+        gen = self._iterate()
+        weakref.finalize(gen, self._release)
+        return gen
+
+    def _iterate(self):
+        index = 0
+        while True:
+            if index < len(self._items):
+                item = self._items[index]
+                index += 1
+                yield item
+                continue
+            with self._cond:
+                while index == len(self._items) and not self._done and self._pulling:
+                    self._cond.wait()
+                if index < len(self._items):
+                    continue
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                self._pulling = True
+            self._pull()
+
+    def _pull(self):
+        # 读取源生成器时不持有锁: 读取可能长时间阻塞, 期间的垃圾回收也可能在本线程中执行订阅者的_release
+        done = False
+        try:
+            item = next(self._source)
+        except StopIteration:
+            done = True
+        except Exception as e:
+            done = True
+            self._error = e
+        with self._cond:
+            if done:
+                self._done = True
+            else:
+                self._items.append(item)
+            self._pulling = False
+            self._cond.notify_all()
+        if done:
+            self._finish()
+
+    def _finish(self):
+        if self._on_done is not None:
+            on_done, self._on_done = self._on_done, None
+            on_done()
+
+    def _release(self):
+        # 由垃圾回收调用, 可能发生在任意线程持有任意锁时, 因此只记录一次释放, 不等待锁;
+        # 最后一个订阅者被回收时在单独的线程中检查并关闭源生成器
+        self._released.append(None)
+        if len(self._released) >= self._subscribers:
+            threading.Thread(target=self._abandon, name="appbuilder-stream-abandon", daemon=True).start()
+
+    def _abandon(self):
+        with self._cond:
+            if len(self._released) < self._subscribers or self._done:
+                return
+            self._abandoned = True
+            self._done = True
+        self._finish()
+        close = getattr(self._source, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class AsyncStreamBroadcast(object):
+    r"""StreamBroadcast的异步版本, 源为异步生成器, 需要在事件循环中创建, 订阅者在同一个事件循环中读取.
+
+    所有订阅者都被回收而源生成器仍未读完时, 在该事件循环中关闭源生成器。
+    """
+
+    def __init__(self, source, on_done: Callable[[], None] = None):
+        self._source = source
+        self._on_done = on_done
+        self._loop = asyncio.get_running_loop()
+        self._lock = None
+        self._items = []
+        self._done = False
+        self._error = None
+        self._abandoned = False
+        self._subscribers = 0
+        self._close_task = None
+
+    def subscribe(self):
+        r"""返回一个新的订阅异步生成器, 源生成器已被放弃时抛出StreamAbandonedError"""
+        if self._abandoned:
+            raise StreamAbandonedError("source stream was closed after all subscribers left")
+        self._subscribers += 1
+        gen = self._iterate()
+        weakref.finalize(gen, self._release)
+        return gen
+
+    async def _iterate(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        index = 0
+        while True:
+            if index < len(self._items):
+                item = self._items[index]
+                index += 1
+                yield item
+                continue
+            async with self._lock:
+                if index == len(self._items) and not self._done:
+                    await self._pull()
+            if index < len(self._items):
+                continue
+            if self._error is not None:
+                raise self._error
+            return
+
+    async def _pull(self):
+        try:
+            self._items.append(await self._source.__anext__())
+        except StopAsyncIteration:
+            self._finish()
+        except Exception as e:
+            self._error = e
+            self._finish()
+
+    def _finish(self):
+        self._done = True
+        if self._on_done is not None:
+            on_done, self._on_done = self._on_done, None
+            on_done()
+
+    def _release(self):
+        # 订阅者可能在任意线程中被回收, 状态的修改与源生成器的关闭都交给所属的事件循环执行
+        try:
+            self._loop.call_soon_threadsafe(self._abandon)
+        except RuntimeError:
+            # 事件循环已经关闭, 源生成器随之失效
+            pass
+
+    def _abandon(self):
+        self._subscribers -= 1
+        if self._subscribers > 0 or self._done:
+            return
+        self._abandoned = True
+        self._finish()
+        aclose = getattr(self._source, "aclose", None)
+        if aclose is not None:
+            self._close_task = self._loop.create_task(self._aclose_source(aclose))
+
+    @staticmethod
+    async def _aclose_source(aclose):
+        try:
+            await aclose()
+        except Exception:
+            pass
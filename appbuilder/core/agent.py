@@ -12,21 +12,109 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import sys
-import copy
 import os 
 import logging
 import uuid
 import json
 import inspect
+import time
+import asyncio
+import functools
+import contextlib
+import contextvars
 from pydantic import BaseModel, model_validator, Extra
 from typing import Optional, Dict, List, Any, Union
 import sqlalchemy
+from pydantic_core import to_jsonable_python
 
 import appbuilder
 from appbuilder.core.context import init_context
 from appbuilder.core.user_session import UserSession
-from appbuilder.core.component import Component
+from appbuilder.core.component import Component, _RequestCredential, _CredentialScope
 from appbuilder.core.message import Message
+from appbuilder.core._exception import AdmissionRejectedException
+from appbuilder.core._admission import AdmissionConfig, AdmissionController
+from appbuilder.core._metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE, agent_metrics
+
+
+def _request_timeout(headers) -> Optional[float]:
+    """
+    从请求头 X-Appbuilder-Timeout 中获取请求剩余的秒数，未设置或格式错误时返回 None
+    """
+    try:
+        return float(headers["X-Appbuilder-Timeout"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _SSEEncoder(object):
+    """
+    流式输出的 SSE 帧编码器。外层结构在每次请求中只序列化一次，每个数据块只需序列化 content 与 Message 的其他字段，
+    其他字段(如 extra、token_usage)在迭代过程中可能变化，每个数据块都按当时的值编码，未变化时复用上一次的序列化结果，
+    结果与逐块序列化整个 Message 相同。
+
+    Args:
+        session_id (str): 会话 ID
+        stream_message (Message): 流式输出的 Message
+    """
+
+    def __init__(self, session_id: str, stream_message: Message):
+        prefix = 'data: {"code": 0, "message": "", "result": {"session_id": ' + \
+            json.dumps(session_id, ensure_ascii=False) + ', "is_completion": '
+        self._prefixes = {
+            False: prefix + 'false, "answer_message": {',
+            True: prefix + 'true, "answer_message": {',
+        }
+        self._message = stream_message
+        self._last_fields = None
+        self._fields = ""
+
+    def answer_message(self, content: Any) -> str:
+        """
+        按 Message 其他字段的当前值编码一个数据块的 answer_message，在收到数据块时调用
+
+        Args:
+            content (Any): 数据块内容
+
+        Returns:
+            str: 不含外层花括号的 answer_message
+        """
+        fields = self._message.model_dump(mode="json", exclude={"content"}, exclude_none=True)
+        if fields != self._last_fields:
+            self._last_fields = fields
+            self._fields = json.dumps(fields, ensure_ascii=False)[1:-1]
+        parts = []
+        if content is not None:
+            parts.append('"content": ' + json.dumps(content, ensure_ascii=False, default=to_jsonable_python))
+        if self._fields:
+            parts.append(self._fields)
+        return ", ".join(parts)
+
+    def frame(self, answer_message: str, is_completion: bool = False) -> str:
+        """
+        拼接 SSE 帧
+
+        Args:
+            answer_message (str): answer_message 方法的返回值
+            is_completion (bool): 是否是最后一个数据块
+
+        Returns:
+            str: SSE 帧
+        """
+        return self._prefixes[is_completion] + answer_message + "}}}\n\n"
+
+    def encode(self, content: Any, is_completion: bool = False) -> str:
+        """
+        按 Message 其他字段的当前值编码一个数据块
+
+        Args:
+            content (Any): 数据块内容
+            is_completion (bool): 是否是最后一个数据块
+
+        Returns:
+            str: SSE 帧
+        """
+        return self.frame(self.answer_message(content), is_completion)
 
 
 class AgentRuntime(BaseModel):
@@ -35,10 +123,13 @@ class AgentRuntime(BaseModel):
     但 AgentRuntime 可以快速帮助开发者服务化组件服务，并且提供API、对话框等部署方式。
     此外，结合 Component 和 Message 自带的运行和调试接口，可以方便开发者快速获得一个调试 Agent 的服务。
   
-    AgentRuntime 接受两个参数:
+    AgentRuntime 接受以下参数:
         component (Component): 可运行的 Component, 需要实现 run(message, stream, **args) 方法  
         user_session_config (sqlalchemy.engine.URL|str|None): Session 输出存储配置字符串。默认使用 sqlite:///user_session.db
             遵循 sqlalchemy 后端定义，参考文档：https://docs.sqlalchemy.org/en/20/core/engines.html#backend-specific-urls
+        admission_config (AdmissionConfig|None): 服务化后 /chat 接口的准入控制配置，限制同时处理的请求数、排队长度、
+            排队时长与单个会话的并发数，超出时返回 503 或 429 并带有 Retry-After 响应头。默认从环境变量中获取，不限制并发。
+            请求头 X-Appbuilder-Timeout 可以指定请求剩余的秒数，排队不会超过该时长
 
     Examples:
 
@@ -165,6 +256,8 @@ class AgentRuntime(BaseModel):
     component: Component
     user_session_config: Optional[Union[sqlalchemy.engine.URL, str]] = None
     user_session: Optional[UserSession] = None
+    admission_config: Optional[AdmissionConfig] = None
+    admission_controller: Optional[AdmissionController] = None
 
     class Config:
         """
@@ -184,9 +277,10 @@ class AgentRuntime(BaseModel):
         Returns:
             None
         """
-        # 初始化 UserSession
+        # 初始化 UserSession 与准入控制
         values.update({
-            "user_session": UserSession(values.get("user_session_config"))
+            "user_session": UserSession(values.get("user_session_config")),
+            "admission_controller": AdmissionController(values.get("admission_config")),
         })
         return values
 
@@ -203,10 +297,104 @@ class AgentRuntime(BaseModel):
             Message
         """
         return self.component.run(message=message, stream=stream, **args)
+
+    async def achat(self, message: Message, stream: bool=False, **args) -> Message:
+        """
+        chat 的异步版本，create_asgi_app 通过它执行对话。
+        组件通过 arun 在事件循环中执行；子类重写了 chat 时在线程池中执行 chat，保持两种服务的行为一致。
+
+        Args:
+            message (Message): 该次对话用户输入的 Message
+            stream (bool): 是否流式请求
+            **args: 其他参数，会被透传到 component
+
+        Returns:
+            Message
+        """
+        if type(self).chat is not AgentRuntime.chat:
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            func = functools.partial(ctx.run, self.chat, message, stream, **args)
+            return await loop.run_in_executor(None, func)
+        return await self.component.arun(message=message, stream=stream, **args)
+
+    def _credential_scope(self, headers) -> _CredentialScope:
+        """
+        根据 component 是否 lazy_certification，分成两种情况：
+        1. lazy_certification 为 True，初始化时未被认证，每次请求都需要带入 AppbuilderToken，
+           鉴权信息只在当前请求的上下文中生效，不修改共享的 component，并发请求的 AppbuilderToken 互不影响
+        2. lazy_certification 为 False，初始化时已经认证，请求时不需要带入 AppbuilderToken，并且带入也无效
+
+        Args:
+            headers (Mapping): 请求头
+
+        Returns:
+            _CredentialScope: 请求结束时需要调用 reset
+
+        Raises:
+            ValueError: 缺少或者无效的 AppbuilderToken
+        """
+        if not self.component.lazy_certification:
+            return _CredentialScope()
+        if "X-Appbuilder-Token" not in headers:
+            raise ValueError("X-Appbuilder-Token is required in Headers")
+        try:
+            return _CredentialScope(_RequestCredential(secret_key=headers["X-Appbuilder-Token"]))
+        except (ValueError, appbuilder.core._exception.BaseRPCException) as e:
+            logging.error(f"failed to verify. err={e}", exc_info=True)
+            raise ValueError("X-Appbuilder-Token invalid")
+
+    def _post_append(self) -> None:
+        """
+        保存本轮 Session 数据，并记录写入耗时
+        """
+        start = time.monotonic()
+        try:
+            self.user_session._post_append()
+        finally:
+            agent_metrics().record_session_write(time.monotonic() - start)
+
+    def health(self) -> Dict:
+        """
+        存活检查，进程可以处理请求时返回
+
+        Returns:
+            Dict
+        """
+        return {"status": "ok"}
+
+    def readiness(self) -> Dict:
+        """
+        就绪检查，返回是否可以接收新请求以及当前的负载，可用于负载均衡与自动扩缩容。
+        Session 数据库无法连接或者排队已满时未就绪。
+
+        Returns:
+            Dict: {"ready": bool, "reason": str, "inflight": int, "queue_depth": int, "active_streams": int}
+        """
+        controller = self.admission_controller
+        config = controller.config
+        result = {
+            "ready": True,
+            "reason": "",
+            "inflight": controller.inflight,
+            "queue_depth": controller.queue_depth,
+            "active_streams": int(agent_metrics().active_streams.get()),
+        }
+        if config.max_inflight is not None and controller.inflight >= config.max_inflight and \
+                controller.queue_depth >= config.max_queue_size:
+            result.update(ready=False, reason="admission queue is full")
+            return result
+        try:
+            self.user_session.ping()
+        except Exception as e:
+            logging.error(f"user session database is unavailable. err={e}")
+            result.update(ready=False, reason="user session database is unavailable")
+        return result
         
     def create_flask_app(self, url_rule="/chat"):
         """ 
         创建 Flask 应用，主要用于 Gunicorn 这样的 WSGI 服务器来运行服务。
+        除对话接口外，还提供 Prometheus 格式的 /metrics 接口，以及存活检查 /healthz 与就绪检查 /readyz 接口。
         
         Args:
             None
@@ -225,10 +413,18 @@ class AgentRuntime(BaseModel):
         app = Flask(__name__)
         app.json.ensure_ascii = False
 
+        metrics = agent_metrics()
+
         @app.errorhandler(BadRequest)
         def handle_bad_request(e):
+            metrics.record_error(e)
             return {"code": 400, "message": f'{e}', "result": None}, 400
             
+        @app.errorhandler(AdmissionRejectedException)
+        def handle_admission_rejected(e):
+            metrics.record_error(e)
+            return {"code": e.code, "message": str(e), "result": None}, e.code, {"Retry-After": str(e.retry_after)}
+
         @app.errorhandler(Exception)
         def handle_bad_request(e):
             if hasattr(e, "code"):
@@ -237,24 +433,24 @@ class AgentRuntime(BaseModel):
                 return {"code": 500, "message": "Internal Server Error", "result": None}, 200
 
         def warp():
-            # 根据component是否lazy_certification，分成两种情况：
-            # 1. lazy_certification为True，初始化时未被认证，每次请求都需要带入AppbuilderToken
-            # 2. lazy_certification为False，初始化时已经认证，请求时不需要带入AppbuilderToken，并且带入也无效
-            if self.component.lazy_certification:
-                if "X-Appbuilder-Token" not in request.headers:
-                    raise BadRequest("X-Appbuilder-Token is required in Headers")
-                try:
-                    app_builder_token = request.headers["X-Appbuilder-Token"]
-                    self.component.set_secret_key_and_gateway(secret_key=app_builder_token)
-                except appbuilder.core._exception.BaseRPCException as e:
-                    logging.error(f"failed to verify. err={e}", exc_info=True)
-                    raise BadRequest("X-Appbuilder-Token invalid")
-                except Exception as e:
-                    logging.error(f"failed to verify. err={e}", exc_info=True)
-                    raise e
+            start = time.monotonic()
+            try:
+                credential = self._credential_scope(request.headers)
+            except ValueError as e:
+                raise BadRequest(str(e))
+            # 请求结束时恢复鉴权信息，避免泄漏到同一个工作线程处理的下一个请求；流式输出在关闭响应时恢复
+            try:
+                response = handle_chat(start)
+            except BaseException:
+                credential.reset()
+                raise
+            if isinstance(response, Response):
+                response.call_on_close(credential.reset)
             else:
-                pass
+                credential.reset()
+            return response
 
+        def handle_chat(start):
             data = request.get_json()
             if "message" not in data:
                 raise BadRequest("message is required")
@@ -275,62 +471,293 @@ class AgentRuntime(BaseModel):
 
             init_context(session_id=session_id, request_id=request_id)
             logging.info(f"[request_id={request_id}, session_id={session_id}] message={message}, stream={stream}, data={data}")
+            metrics.record_request(stream)
+            admission = self.admission_controller.acquire(session_id, timeout=_request_timeout(request.headers))
             try:
                 answer = self.chat(message, stream, **data)
                 if stream:
                     def gen_sse_resp(stream_message):
                         with app.app_context():
+                            metrics.active_streams.inc()
                             try:
+                                encoder = _SSEEncoder(session_id, stream_message)
                                 content_iterator = iter(stream_message.content)
-                                prev_content = next(content_iterator)
-                                prev_result = copy.deepcopy(stream_message)
-                                prev_result.content = prev_content
+                                # 收到数据块时即按 Message 当时的字段编码，下一个数据块到达后才能确定是否是最后一帧
+                                prev_answer = encoder.answer_message(next(content_iterator))
+                                count = 1
                                 for sub_content in content_iterator:
-                                    logging.info(f"[request_id={request_id}, session_id={session_id}] streaming_result={prev_result}")
-                                    yield "data: " + json.dumps({
-                                            "code": 0, "message": "", 
-                                            "result": {
-                                                "session_id": session_id, 
-                                                "is_completion": False, 
-                                                "answer_message": json.loads(prev_result.json(exclude_none=True))
-                                            }
-                                        }, ensure_ascii=False) + "\n\n"
-                                    prev_result = copy.deepcopy(stream_message)
-                                    prev_result.content = sub_content
-                                logging.info(f"[request_id={request_id}, session_id={session_id}] streaming_result={prev_result}")
-                                yield "data: " + json.dumps({
-                                        "code": 0, "message": "", 
-                                        "result": {
-                                            "session_id": session_id, 
-                                            "is_completion": True, 
-                                            "answer_message": json.loads(prev_result.json(exclude_none=True))
-                                        }
-                                    }, ensure_ascii=False) + "\n\n"
-                                self.user_session._post_append()
+                                    if count == 1:
+                                        metrics.record_first_chunk(time.monotonic() - start)
+                                    yield encoder.frame(prev_answer)
+                                    prev_answer = encoder.answer_message(sub_content)
+                                    count += 1
+                                if count == 1:
+                                    metrics.record_first_chunk(time.monotonic() - start)
+                                yield encoder.frame(prev_answer, is_completion=True)
+                                logging.info(f"[request_id={request_id}, session_id={session_id}] streaming finished, chunks={count}")
+                                self._post_append()
+                                metrics.record_success(True, time.monotonic() - start)
                             except Exception as e:
+                                metrics.record_error(e)
                                 code = 500 if not hasattr(e, "code") else e.code
                                 err_resp = {"code": code, "message": str(e), "result": None}
                                 logging.error(f"[request_id={request_id}, session_id={session_id}] err={e}", exc_info=True)
                                 yield "data: " + json.dumps(err_resp, ensure_ascii=False) + "\n\n"
-                    return Response(
+                            finally:
+                                metrics.active_streams.dec()
+                                admission.release()
+                    response = Response(
                         gen_sse_resp(answer), 200, 
                         {'Content-Type': 'text/event-stream; charset=utf-8'},
                     )
+                    # 客户端在输出开始前断开时生成器不会执行，关闭响应时同样归还名额
+                    response.call_on_close(admission.release)
+                    return response
                 else:
-                    blocking_result = json.loads(copy.deepcopy(answer).json(exclude_none=True))
+                    blocking_result = answer.model_dump(mode="json", exclude_none=True)
                     logging.info(f"[request_id={request_id}, session_id={session_id}] blocking_result={blocking_result}")
-                    self.user_session._post_append()
+                    self._post_append()
+                    admission.release()
+                    metrics.record_success(False, time.monotonic() - start)
                     return {
                         "code": 0, "message": "", 
                         "result": {"session_id": session_id, "answer_message": blocking_result}
                     }
             except Exception as e:
+                admission.release()
+                metrics.record_error(e)
                 logging.error(f"[request_id={request_id}, session_id={session_id}] err={e}", exc_info=True)
                 raise e
 
+        def export_metrics():
+            return Response(MetricsRegistry().export_prometheus(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+        def healthz():
+            return {"code": 0, "message": "", "result": self.health()}
+
+        def readyz():
+            result = self.readiness()
+            return {"code": 0, "message": "", "result": result}, 200 if result["ready"] else 503
+
         app.add_url_rule(url_rule, 'chat', warp, methods=['POST'])
+        app.add_url_rule("/metrics", 'metrics', export_metrics, methods=['GET'])
+        app.add_url_rule("/healthz", 'healthz', healthz, methods=['GET'])
+        app.add_url_rule("/readyz", 'readyz', readyz, methods=['GET'])
         return app
 
+    def create_asgi_app(self, url_rule="/chat"):
+        """
+        创建 Starlette 应用，主要用于 Uvicorn 这样的 ASGI 服务器来运行服务，接口协议与 create_flask_app 相同。
+        组件通过 arun 在事件循环中执行，流式输出不占用工作线程，适合大量并发的 SSE 连接。
+        同样提供 /metrics、/healthz 与 /readyz 接口。
+        多进程部署时在模块中创建应用，例如 `app = agent.create_asgi_app()`，
+        再通过 `uvicorn module:app --workers 4` 启动。
+
+        Args:
+            url_rule (str): 对话接口路径
+
+        Returns:
+            Starlette
+        """
+        # lazy import starlette
+        try:
+            from starlette.applications import Starlette
+            from starlette.responses import JSONResponse, StreamingResponse, Response
+            from starlette.routing import Route
+        except ImportError:
+            raise ImportError("starlette module is not installed. Please install it using 'pip install "
+                              "starlette uvicorn'.")
+
+        class BadRequest(Exception):
+            # 与 werkzeug 的 BadRequest 相同，错误指标按 code 记录
+            code = 400
+
+            def __str__(self):
+                return f"400 Bad Request: {self.args[0]}"
+
+        class SSEResponse(StreamingResponse):
+            # 客户端在输出开始前断开、或者输出没有被读取完时，流式生成器的 finally 不一定执行，
+            # 响应结束时关闭生成器并依次调用 on_close（归还名额等），作用与 Flask 应用中的 call_on_close 相同
+            def __init__(self, content, on_close):
+                super().__init__(content, 200, media_type="text/event-stream; charset=utf-8")
+                self.on_close = list(on_close)
+
+            async def __call__(self, scope, receive, send):
+                try:
+                    await super().__call__(scope, receive, send)
+                finally:
+                    try:
+                        await self.body_iterator.aclose()
+                    finally:
+                        for callback in self.on_close:
+                            callback()
+
+        metrics = agent_metrics()
+
+        def error_response(e):
+            metrics.record_error(e)
+            if isinstance(e, BadRequest):
+                return JSONResponse({"code": 400, "message": f'{e}', "result": None}, 400)
+            if isinstance(e, AdmissionRejectedException):
+                return JSONResponse({"code": e.code, "message": str(e), "result": None}, e.code,
+                                    {"Retry-After": str(e.retry_after)})
+            if hasattr(e, "code"):
+                return JSONResponse({"code": e.code, "message": str(e), "result": None}, 200)
+            return JSONResponse({"code": 500, "message": "Internal Server Error", "result": None}, 200)
+
+        def sse_event(data):
+            return "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+        async def run_sync(func, *args):
+            # 同步调用在线程池中执行, 并带上当前请求的上下文
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(None, functools.partial(ctx.run, func, *args))
+
+        async def aiter_content(content):
+            if hasattr(content, "__aiter__"):
+                async for sub_content in content:
+                    yield sub_content
+                return
+            iterator = iter(content)
+            sentinel = object()
+            while True:
+                sub_content = await run_sync(next, iterator, sentinel)
+                if sub_content is sentinel:
+                    return
+                yield sub_content
+
+        async def parse_request(request):
+            try:
+                data = await request.json()
+            except ValueError:
+                raise BadRequest("Failed to decode JSON object")
+            if not isinstance(data, dict) or "message" not in data:
+                raise BadRequest("message is required")
+            message = Message(data.pop('message'))
+            session_id = data.pop("session_id", None)
+            if session_id is None:
+                session_id = str(uuid.uuid4())
+            elif not isinstance(session_id, str):
+                raise BadRequest("session_id must be str type")
+            stream = data.pop("stream", False)
+            if not isinstance(stream, bool):
+                raise BadRequest("stream must be bool type")
+            return message, session_id, stream, data
+
+        async def chat(request):
+            start = time.monotonic()
+            try:
+                credential = self._credential_scope(request.headers)
+            except ValueError as e:
+                return error_response(BadRequest(str(e)))
+            # 鉴权信息随请求的上下文传递给 achat、线程池中的同步调用与流式输出，请求结束时恢复；流式输出在响应结束时恢复
+            try:
+                response = await handle_chat(request, start)
+            except BaseException:
+                credential.reset()
+                raise
+            if isinstance(response, SSEResponse):
+                response.on_close.append(credential.reset)
+            else:
+                credential.reset()
+            return response
+
+        async def handle_chat(request, start):
+            try:
+                message, session_id, stream, data = await parse_request(request)
+            except Exception as e:
+                logging.error(f"failed to parse request. err={e}", exc_info=True)
+                return error_response(e)
+            request_id = str(uuid.uuid4())
+
+            init_context(session_id=session_id, request_id=request_id)
+            logging.info(f"[request_id={request_id}, session_id={session_id}] message={message}, stream={stream}, data={data}")
+            metrics.record_request(stream)
+            try:
+                admission = await self.admission_controller.aacquire(
+                    session_id, timeout=_request_timeout(request.headers))
+            except AdmissionRejectedException as e:
+                logging.warning(f"[request_id={request_id}, session_id={session_id}] rejected. err={e}")
+                return error_response(e)
+            try:
+                answer = await self.achat(message, stream, **data)
+            except Exception as e:
+                admission.release()
+                logging.error(f"[request_id={request_id}, session_id={session_id}] err={e}", exc_info=True)
+                return error_response(e)
+
+            if not stream:
+                blocking_result = answer.model_dump(mode="json", exclude_none=True)
+                logging.info(f"[request_id={request_id}, session_id={session_id}] blocking_result={blocking_result}")
+                try:
+                    await run_sync(self._post_append)
+                except Exception as e:
+                    return error_response(e)
+                finally:
+                    admission.release()
+                metrics.record_success(False, time.monotonic() - start)
+                return JSONResponse({
+                    "code": 0, "message": "",
+                    "result": {"session_id": session_id, "answer_message": blocking_result}
+                })
+
+            async def gen_sse_resp(stream_message):
+                metrics.active_streams.inc()
+                try:
+                    encoder = _SSEEncoder(session_id, stream_message)
+                    prev_answer = None
+                    count = 0
+                    async for sub_content in aiter_content(stream_message.content):
+                        if prev_answer is not None:
+                            if count == 1:
+                                metrics.record_first_chunk(time.monotonic() - start)
+                            yield encoder.frame(prev_answer)
+                        prev_answer = encoder.answer_message(sub_content)
+                        count += 1
+                    if prev_answer is None:
+                        raise RuntimeError("stream output is empty")
+                    if count == 1:
+                        metrics.record_first_chunk(time.monotonic() - start)
+                    yield encoder.frame(prev_answer, is_completion=True)
+                    logging.info(f"[request_id={request_id}, session_id={session_id}] streaming finished, chunks={count}")
+                    await run_sync(self._post_append)
+                    metrics.record_success(True, time.monotonic() - start)
+                except Exception as e:
+                    metrics.record_error(e)
+                    code = 500 if not hasattr(e, "code") else e.code
+                    logging.error(f"[request_id={request_id}, session_id={session_id}] err={e}", exc_info=True)
+                    yield sse_event({"code": code, "message": str(e), "result": None})
+                finally:
+                    metrics.active_streams.dec()
+                    admission.release()
+
+            return SSEResponse(gen_sse_resp(answer), [admission.release])
+
+        async def export_metrics(request):
+            return Response(MetricsRegistry().export_prometheus(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+        async def healthz(request):
+            return JSONResponse({"code": 0, "message": "", "result": self.health()})
+
+        async def readyz(request):
+            result = await run_sync(self.readiness)
+            return JSONResponse({"code": 0, "message": "", "result": result}, 200 if result["ready"] else 503)
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            # 退出前关闭 arun 在服务事件循环中使用的 aiohttp session
+            await self.component.aclose()
+            await _RequestCredential.aclose_all()
+
+        return Starlette(routes=[
+            Route(url_rule, chat, methods=["POST"]),
+            Route("/metrics", export_metrics, methods=["GET"]),
+            Route("/healthz", healthz, methods=["GET"]),
+            Route("/readyz", readyz, methods=["GET"]),
+        ], lifespan=lifespan)
+
     def serve(self, host='0.0.0.0', debug=True, port=8092, url_rule="/chat"):
         """ 
         将 component 服务化，提供 Flask http API 接口
@@ -345,7 +772,29 @@ class AgentRuntime(BaseModel):
         """
         app = self.create_flask_app(url_rule=url_rule)
         app.run(host=host, debug=debug, port=port)
-        
+
+    def serve_asgi(self, host='0.0.0.0', port=8092, url_rule="/chat", **uvicorn_args):
+        """
+        将 component 服务化，通过 Uvicorn 提供 ASGI http API 接口，接口协议与 serve 相同
+
+        Args:
+            host (str): 服务 host
+            port (int): 服务 port
+            url_rule (str): 对话接口路径
+            **uvicorn_args: 其他参数，会被透传到 uvicorn.run
+
+        Returns:
+            None
+        """
+        # lazy import uvicorn
+        try:
+            import uvicorn
+        except ImportError:
+            raise ImportError("uvicorn module is not installed. Please install it using 'pip install "
+                              "starlette uvicorn'.")
+        app = self.create_asgi_app(url_rule=url_rule)
+        uvicorn.run(app, host=host, port=port, **uvicorn_args)
+
     def chainlit_demo(self, host='0.0.0.0', port=8091):
         """
         将 component 服务化，提供 chainlit demo 页面
@@ -380,7 +829,7 @@ class AgentRuntime(BaseModel):
                 if token := part or "":
                     await msg.stream_token(token)
             await msg.update()
-            self.user_session._post_append()
+            self._post_append()
 
         # start chainlit service
         if os.getenv('APPBUILDER_RUN_CHAINLIT') == '1':
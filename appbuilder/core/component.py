@@ -14,16 +14,97 @@
 
 """Component模块包括组件基类，用户自定义组件需要继承Component类，并至少实现run方法"""
 import json
+import asyncio
+import threading
+import contextvars
+import functools
+import collections
 
 from enum import Enum
 
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
-from appbuilder.core.utils import ttl_lru_cache
-from appbuilder.core._client import HTTPClient
+from appbuilder.core._client import HTTPClient, AsyncHTTPClient, HTTPPoolConfig, HedgePolicy, shared_http_client
 from appbuilder.core.message import Message
 
 
+# 按请求认证时当前上下文(线程或协程)使用的鉴权信息, 只对lazy_certification的组件生效
+_request_credential = contextvars.ContextVar("appbuilder_request_credential", default=None)
+
+
+def _pool_key(pool_config: Optional[HTTPPoolConfig]):
+    return None if pool_config is None else tuple(sorted(pool_config.model_dump().items()))
+
+
+class _RequestCredential(object):
+    r"""一次请求的鉴权信息, 在当前上下文中代替lazy_certification组件自身的鉴权信息.
+
+    不修改组件实例, 因此并发的请求可以带着各自的AppbuilderToken调用同一个组件。同步请求使用HTTPClientRegistry中
+    共享的HTTPClient, 本对象被回收时释放引用; 异步请求使用按鉴权信息缓存的AsyncHTTPClient, 复用连接池。
+
+        参数:
+            secret_key(str): 用户鉴权token.
+            gateway(str, 可选): 后端网关服务地址, 默认从环境变量中获取.
+    """
+    # 最多缓存的AsyncHTTPClient数, 被淘汰的客户端的session在所属的事件循环中自动关闭
+    max_async_clients = 32
+    _async_clients = collections.OrderedDict()
+    _async_clients_lock = threading.Lock()
+
+    def __init__(self, secret_key: str, gateway: str = ""):
+        self.secret_key, self.gateway = HTTPClient.resolve_credentials(secret_key, gateway)
+        self._lock = threading.Lock()
+        self._http_clients = {}
+
+    def http_client(self, pool_config: Optional[HTTPPoolConfig] = None) -> HTTPClient:
+        key = _pool_key(pool_config)
+        with self._lock:
+            client = self._http_clients.get(key)
+            if client is None:
+                client, _ = shared_http_client(self, self.secret_key, self.gateway, pool_config=pool_config)
+                self._http_clients[key] = client
+            return client
+
+    def async_http_client(self, pool_config: Optional[HTTPPoolConfig] = None) -> AsyncHTTPClient:
+        cls = _RequestCredential
+        key = (self.secret_key, self.gateway, _pool_key(pool_config))
+        with cls._async_clients_lock:
+            client = cls._async_clients.get(key)
+            if client is None:
+                client = cls._async_clients[key] = AsyncHTTPClient(self.secret_key, self.gateway,
+                                                                   pool_config=pool_config)
+                while len(cls._async_clients) > cls.max_async_clients:
+                    cls._async_clients.popitem(last=False)
+            cls._async_clients.move_to_end(key)
+            return client
+
+    @classmethod
+    async def aclose_all(cls):
+        r"""关闭缓存的AsyncHTTPClient在当前事件循环中的session"""
+        with cls._async_clients_lock:
+            clients = list(cls._async_clients.values())
+        for client in clients:
+            await client.close()
+
+
+class _CredentialScope(object):
+    r"""在当前上下文中使用一次请求的鉴权信息, 直到reset.
+
+    流式输出在处理函数返回之后才读取完, 因此由输出结束时的回调reset; reset只生效一次, 可以重复调用。
+
+        参数:
+            credential(_RequestCredential, 可选): 鉴权信息, 为None时不做任何处理.
+    """
+
+    def __init__(self, credential: Optional[_RequestCredential] = None):
+        self._token = _request_credential.set(credential) if credential is not None else None
+
+    def reset(self):
+        token, self._token = self._token, None
+        if token is not None:
+            _request_credential.reset(token)
+
+
 class ComponentArguments(BaseModel):
     r""""ComponentArguments define Component meta fields"""
     name: str = ""
@@ -56,6 +137,9 @@ class Component:
     r"""Component基类, 其它实现的Component子类需要继承该基类，并至少实现run方法."""
 
     manifests = []
+    pool_config: Optional[HTTPPoolConfig] = None
+    # 幂等接口的对冲策略, 默认不对冲, 仅由调用幂等接口的组件传给http_client.post
+    hedge_policy: Optional[HedgePolicy] = None
 
     def __init__(
         self,
@@ -63,6 +147,7 @@ class Component:
         secret_key: Optional[str] = None,
         gateway: str = "",
         lazy_certification: bool = False,
+        pool_config: Optional[HTTPPoolConfig] = None,
     ):
         r"""Component初始化方法.
 
@@ -71,29 +156,59 @@ class Component:
                 secret_key(str,可选): 用户鉴权token, 默认从环境变量中获取: os.getenv("APPBUILDER_TOKEN", "").
                 gateway(str, 可选): 后端网关服务地址，默认从环境变量中获取: os.getenv("GATEWAY_URL", "")
                 lazy_certification (bool, 可选): 延迟认证，为True时在第一次运行时认证. Defaults to False.
+                pool_config (obj: `HTTPPoolConfig`, 可选): HTTP连接池配置，默认使用类属性pool_config，
+                    均未设置时从环境变量中获取.
             返回：
                 无
         """
         self.meta = meta
+        if pool_config is not None:
+            self.pool_config = pool_config
         self.secret_key = secret_key
         self.gateway = gateway
         self._http_client = None
+        self._release_http_client = None
+        self._async_http_client = None
         self.lazy_certification = lazy_certification
         if not self.lazy_certification:
             self.set_secret_key_and_gateway(self.secret_key, self.gateway)
  
-    @ttl_lru_cache(seconds_to_live=1 * 60 * 60) # 1h 
     def set_secret_key_and_gateway(self, secret_key: Optional[str] = None, gateway: str = ""):
         self.secret_key = secret_key
         self.gateway = gateway
-        self._http_client = HTTPClient(self.secret_key, self.gateway)
+        self._acquire_http_client()
+        self._async_http_client = None
+
+    def _acquire_http_client(self):
+        r"""从进程级的HTTPClientRegistry获取共享的HTTPClient，并释放之前持有的HTTPClient"""
+        client, release = shared_http_client(self, self.secret_key, self.gateway, pool_config=self.pool_config)
+        if getattr(self, "_release_http_client", None) is not None:
+            self._release_http_client()
+        self._http_client = client
+        self._release_http_client = release
 
     @property
     def http_client(self):
+        credential = self._request_credential()
+        if credential is not None:
+            return credential.http_client(self.pool_config)
         if self._http_client is None:
-            self._http_client = HTTPClient(self.secret_key, self.gateway)
+            self._acquire_http_client()
         return self._http_client
 
+    @property
+    def async_http_client(self):
+        credential = self._request_credential()
+        if credential is not None:
+            return credential.async_http_client(self.pool_config)
+        if self._async_http_client is None:
+            self._async_http_client = AsyncHTTPClient(self.secret_key, self.gateway, pool_config=self.pool_config)
+        return self._async_http_client
+
+    def _request_credential(self) -> Optional[_RequestCredential]:
+        r"""lazy_certification的组件在按请求认证的上下文中使用请求的鉴权信息"""
+        return _request_credential.get() if self.lazy_certification else None
+
     def __call__(self, *inputs, **kwargs):
         r"""implement __call__ method"""
         return self.run(*inputs, **kwargs)
@@ -113,13 +228,50 @@ class Component:
         r"""pass"""
         return None
 
-    async def arun(self, *args, **kwargs) -> Optional[Message]:
-        r"""pass"""
-        return None
+    async def arun(self, *inputs, **kwargs) -> Optional[Message]:
+        r"""
+        Asynchronous version of run.
+        The default implementation runs `run` in the event loop's executor with the
+        caller's context, subclasses may override it with a native async implementation.
 
-    async def abatch(self, *args, **kwargs) -> List[Message]:
-        r"""pass"""
-        return None
+        Parameters:
+            *inputs(tuple): unpacked tuple arguments
+            **kwargs(dict): unpacked dict arguments
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        func = functools.partial(ctx.run, self.run, *inputs, **kwargs)
+        return await loop.run_in_executor(None, func)
+
+    async def abatch(self, inputs: List[Any], max_concurrency: Optional[int] = None, **kwargs) -> List[Message]:
+        r"""
+        Run `arun` concurrently over a list of inputs, results keep the order of inputs.
+
+        Parameters:
+            inputs(List[Any]): inputs, each one is passed to `arun` as the first argument
+            max_concurrency(int, optional): max number of concurrent calls, unlimited by default
+            **kwargs(dict): unpacked dict arguments passed to every `arun` call
+        """
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency must be bigger than zero")
+        if max_concurrency is None:
+            return list(await asyncio.gather(*[self.arun(inp, **kwargs) for inp in inputs]))
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _run(inp):
+            async with semaphore:
+                return await self.arun(inp, **kwargs)
+
+        return list(await asyncio.gather(*[_run(inp) for inp in inputs]))
+
+    async def aclose(self) -> None:
+        r"""
+        Close the aiohttp session used by `arun` in the running event loop.
+        Sessions are also closed when their event loop finishes, call it to release connections earlier.
+        """
+        if self._async_http_client is not None:
+            await self._async_http_client.close()
 
     def _trace(self, **data) -> None:
         r"""pass"""
@@ -137,10 +137,8 @@ class ASR(Component):
             'dev_pid': request.dev_pid,
             'cuid': request.cuid
         }
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
-        response = self.http_client.session.post(self.http_client.service_url("/v1/bce/aip_speech/asrpro"),
-                                                 params=params, headers=headers, data=request.speech, timeout=timeout)
+        response = self.http_client.post(self.http_client.service_url("/v1/bce/aip_speech/asrpro"),
+                                         params=params, headers=headers, data=request.speech, retry=retry, timeout=timeout)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -18,13 +18,12 @@
 文档解析
 """
 import os
-import json
-import base64
 from typing import Dict, Any
 from appbuilder.core._exception import AppBuilderServerException
 from appbuilder.core.component import Component, Message
 from appbuilder.utils.logger_util import logger
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._payload import Base64Stream, json_body
 from appbuilder.core.components.doc_parser.base import ParserConfig, ParseResult
 
 
@@ -116,12 +115,13 @@ class DocParser(Component):
 
         with open(file_path, "rb") as f:
             param = self.config.dict(by_alias=True)
-            param["data"] = base64.b64encode(f.read()).decode()
+            # 文件内容边读边编码写入请求体, 避免在内存中保留完整的base64与JSON副本
+            param["data"] = Base64Stream(f)
             param["name"] = os.path.basename(file_path)
-            payload = json.dumps({"file_list": [param]})
+            payload = json_body({"file_list": [param]})
             headers = self.http_client.auth_header()
             headers["Content-Type"] = "application/json"
-            response = self.http_client.session.post(url=self.http_client.service_url(self.base_url), headers=headers, data=payload)
+            response = self.http_client.post(url=self.http_client.service_url(self.base_url), headers=headers, data=payload)
             self.http_client.check_response_header(response)
             self.http_client.check_response_json(response.json())
             response = response.json()
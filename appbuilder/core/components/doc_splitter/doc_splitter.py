@@ -185,8 +185,8 @@ class ChunkSplitter(Component):
                                         "overlap": self.overlap, "separators": self.separators,
                                         "join_symbol": self.join_symbol}
 
-        response = self.http_client.session.post(url=self.http_client.service_url(prefix=self.base_url, sub_path=""),
-                                                 headers=headers, json=chunk_splitter_remote_params, stream=False)
+        response = self.http_client.post(url=self.http_client.service_url(prefix=self.base_url, sub_path=""),
+                                         headers=headers, json=chunk_splitter_remote_params, stream=False)
         self.http_client.check_response_header(response)
         self.http_client.check_response_json(response.json())
         doc_chunk_splitter_res = response.json()
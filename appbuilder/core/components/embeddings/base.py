@@ -17,6 +17,7 @@ base
 # limitations under the License.
 
 
+import asyncio
 from abc import abstractmethod
 from typing import List, Union
 
@@ -54,8 +55,7 @@ class EmbeddingBaseComponent(Component):
             embeddings: List[float]
         """
 
-        # embedding don't need be async, just return it
-        return self.run(text)
+        return await super().arun(text)
 
     @abstractmethod
     def batch(self, texts: Union[Message[List[str]], List[str]]) -> Message[List[List[float]]]:
@@ -66,7 +66,7 @@ class EmbeddingBaseComponent(Component):
             embeddings: List[List[float]]
         """
 
-    def abatch(self, texts: Union[Message[List[str]], List[str]]) -> Message[List[List[float]]]:
+    async def abatch(self, texts: Union[Message[List[str]], List[str]]) -> Message[List[List[float]]]:
         """
         Args:
             message: List[str]
@@ -74,5 +74,5 @@ class EmbeddingBaseComponent(Component):
             embeddings: List[List[float]]
         """
 
-        # embedding don't need be async, just return it
-        return self.batch(texts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.batch, texts)
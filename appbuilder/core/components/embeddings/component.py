@@ -16,6 +16,7 @@
 ernie bot embedding
 """
 
+import asyncio
 from typing import Union, List
 
 from appbuilder.core.message import Message
@@ -93,16 +94,34 @@ class Embedding(EmbeddingBaseComponent):
         """
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        resp = self.http_client.session.post(
+        resp = self.http_client.post(
             url=self.http_client.service_url(self.base_url),
             headers=headers,
             json=payload,
+            hedge=self.hedge_policy,
         )
         self.http_client.check_response_header(resp)
         self._check_response_json(resp.json())
 
         return resp.json()
 
+    async def _arequest(self, payload: dict) -> dict:
+        """
+        async request to gateway
+        """
+        headers = self.async_http_client.auth_header()
+        headers["Content-Type"] = "application/json"
+        resp = await self.async_http_client.post(
+            url=self.async_http_client.service_url(self.base_url),
+            headers=headers,
+            json=payload,
+            hedge=self.hedge_policy,
+        )
+        self.async_http_client.check_response_header(resp)
+        self._check_response_json(resp.json())
+
+        return resp.json()
+
     def _batchify(self, texts: List[str], batch_size: int = 16) -> List[List[str]]:
         """
         batchify input text list
@@ -129,6 +148,20 @@ class Embedding(EmbeddingBaseComponent):
 
         return results
 
+    async def _abatch(self, texts: List[str]) -> Message[List[List[float]]]:
+        """
+        async batch run implement, batches are requested concurrently
+        """
+
+        batches = self._batchify(texts)
+        responses = await asyncio.gather(*[self._arequest({"input": batch}) for batch in batches])
+        results = []
+        for result in responses:
+            results.extend(result['data'])
+        results = Message([result['embedding'] for result in results])
+
+        return results
+
     def run(self, text: Union[Message[str], str]) -> Message[List[float]]:
         """
         run
@@ -146,3 +179,21 @@ class Embedding(EmbeddingBaseComponent):
         _texts = texts if isinstance(texts, list) else texts.content
 
         return self._batch(_texts)
+
+    async def arun(self, text: Union[Message[str], str]) -> Message[List[float]]:
+        """
+        async run
+        """
+
+        _text = text if isinstance(text, str) else text.content
+
+        return Message((await self._abatch([_text])).content[0])
+
+    async def abatch(self, texts: Union[Message[List[str]], List[str]]) -> Message[List[List[float]]]:
+        """
+        async batch run
+        """
+
+        _texts = texts if isinstance(texts, list) else texts.content
+
+        return await self._abatch(_texts)
@@ -25,7 +25,7 @@ import pandas as pd
 from appbuilder.core._exception import AppBuilderServerException, ModelNotSupportedException
 from appbuilder.core.component import Component, ComponentArguments
 from appbuilder.core.message import Message
-from appbuilder.core.utils import ModelInfo, ttl_lru_cache
+from appbuilder.core.utils import ModelInfo, ModelCatalog
 
 
 class Excel2FigureArgs(ComponentArguments):
@@ -40,7 +40,6 @@ class Excel2Figure(Component):
     meta = Excel2FigureArgs
     model_type: str = "chat"
     excluded_models: List[str] = ["Yi-34B-Chat", "ChatLaw"]
-    model_info: ModelInfo = None
     manifests = [
         {
             "name": "excel_to_figure",
@@ -74,26 +73,23 @@ class Excel2Figure(Component):
             self._check_model_and_get_model_url(self.model, self.model_type)
         self.server_sub_path = "/v1/ai_engine/copilot_engine/v1/api/agent/excel2figure"
 
-    @ttl_lru_cache(seconds_to_live=1 * 60 * 60) # 1h 
-    def set_secret_key_and_gateway(self, secret_key: Optional[str] = None, gateway: str = ""):
-        super(Excel2Figure, self).set_secret_key_and_gateway(
-                secret_key=secret_key, gateway=gateway)
-        self.__class__.model_info = ModelInfo(client=self.http_client)
+    @property
+    def model_info(self) -> ModelInfo:
+        r"""当前凭证对应的模型信息, 由进程级的ModelCatalog共享"""
+        return ModelCatalog().get(self.http_client)
 
-    @ttl_lru_cache(seconds_to_live=1 * 60 * 60) # 1h 
     def _check_model_and_get_model_url(self, model, model_type):
         if model and model in self.excluded_models:
             raise ModelNotSupportedException(f"Model {model} not supported")
         if not model:
             raise ValueError("model must be provided")
-        if self.__class__.model_info is None:
-            self.set_secret_key_and_gateway()
-        m_type = self.model_info.get_model_type(model)
+        model_info = self.model_info
+        m_type = model_info.get_model_type(model)
         if m_type != model_type:
             raise ModelNotSupportedException(
                 f"Model {model} with type [{m_type}] not supported, only support {model_type} type")
 
-        model_url = self.model_info.get_model_url(model)
+        model_url = model_info.get_model_url(model)
         return model_url
 
     def run(self, message: Message) -> Message:
@@ -177,7 +173,7 @@ class Excel2Figure(Component):
             }
 
         server_url = self.http_client.service_url(prefix="", sub_path=self.server_sub_path)
-        response = self.http_client.session.post(
+        response = self.http_client.post(
                 url=server_url, headers=headers, json=payload)
         self.http_client.check_response_header(response)
         data = response.json()
@@ -126,7 +126,7 @@ class ExtractTableFromDoc(Component):
         # logger.info("request url: {}, headers: {}".format(url, headers))
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        resp = self.http_client.session.post(url=url, data=json.dumps(params), headers=headers)
+        resp = self.http_client.post(url=url, data=json.dumps(params), headers=headers)
 
         self.http_client.check_response_header(resp)
         resp = resp.json()
@@ -136,9 +136,6 @@ class NL2Sql(Component):
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
 
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
-
         payload = {"query": query,
                    "table_schemas": table_schemas,
                    "session": [session_record.dict() for session_record in session],
@@ -148,8 +145,8 @@ class NL2Sql(Component):
                    "prompt_template": prompt_template}
 
         server_url = self.http_client.service_url(prefix="", sub_path=self.server_sub_path)
-        response = self.http_client.session.post(url=server_url, headers=headers,
-                                                 json=payload, timeout=timeout)
+        response = self.http_client.post(url=server_url, headers=headers,
+                                         json=payload, retry=retry, timeout=timeout)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -11,12 +11,12 @@
 # limitations under the License.
 
 r"""general ocr component."""
-import base64
 import json
 import os.path
 
 from appbuilder.core import utils
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._payload import Base64Stream, form_body
 
 
 from appbuilder.core._exception import AppBuilderServerException, InvalidRequestArgumentError
@@ -96,35 +96,37 @@ class GeneralOCR(Component):
         """
         inp = GeneralOCRInMsg(**message.content)
         request = GeneralOCRRequest()
-        if inp.raw_image:
-            request.image = base64.b64encode(inp.raw_image)
         if inp.url:
             request.url = inp.url
         request.detect_direction = "true"
         request.language_type = "auto_detect"
-        result = self._recognize(request, timeout, retry)
+        result = self._recognize(request, timeout, retry, raw_image=inp.raw_image)
         result_dict = proto.Message.to_dict(result)
         out = GeneralOCROutMsg(**result_dict)
         return Message(content=out.model_dump())
 
     def _recognize(self, request: GeneralOCRRequest, timeout: float = None,
-                  retry: int = 0) -> GeneralOCRResponse:
+                  retry: int = 0, raw_image: bytes = b"") -> GeneralOCRResponse:
         r"""调用底层接口进行通用文字识别
                    参数:
                        request (obj: `GeneralOCRRequest`) : 通用文字识别输入参数
+                       raw_image (bytes, 可选) : 图片原始内容, 设置后忽略request.image
 
                    返回：
                        response (obj: `GeneralOCRResponse`): 通用文字识别返回结果
                """
-        if not request.image and not request.url and not request.pdf_file and not request.ofd_file:
+        if not request.image and not raw_image and not request.url and not request.pdf_file and not request.ofd_file:
             raise ValueError("one of image or url or must pdf_file or ofd_file be set")
         data = GeneralOCRRequest.to_dict(request)
-        if self.http_client.retry.total != retry:
-            self.http_client.retry.total = retry
+        if raw_image:
+            # 图片按块编码写入请求体, 避免在内存中生成多份完整的base64与urlencode副本
+            data["image"] = Base64Stream(raw_image)
+            data = form_body(data)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/x-www-form-urlencoded'
         url = self.http_client.service_url("/v1/bce/aip/ocr/v1/accurate_basic")
-        response = self.http_client.session.post(url, headers=headers, data=data, timeout=timeout)
+        response = self.http_client.post(url, headers=headers, data=data, retry=retry, timeout=timeout,
+                                         hedge=self.hedge_policy)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
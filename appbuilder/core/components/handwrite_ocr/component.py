@@ -11,13 +11,13 @@
 # limitations under the License.
 
 r"""手写文字识别组件"""
-import base64
 import json
 from appbuilder.core._exception import AppBuilderServerException, InvalidRequestArgumentError
 from appbuilder.core.component import Component
 from appbuilder.core.components.handwrite_ocr.model import *
 from appbuilder.core.message import Message
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._payload import Base64Stream, form_body
 from appbuilder.core import utils
 
 class HandwriteOCR(Component):
@@ -79,13 +79,11 @@ class HandwriteOCR(Component):
         request = HandwriteOCRRequest()
         if inp.url:
             request.url = inp.url
-        if inp.raw_image:
-            request.image = base64.b64encode(inp.raw_image)
         request.recognize_granularity = "big"
         request.probability = "false"
         request.detect_direction = "true"
         request.detect_alteration = "true"
-        response = self._recognize(request, timeout, retry)
+        response = self._recognize(request, timeout, retry, raw_image=inp.raw_image)
         out = HandwriteOCROutMsg()
         out.direction = response.direction
         [out.contents.append(
@@ -138,23 +136,28 @@ class HandwriteOCR(Component):
         else:
             return result
 
-    def _recognize(self, request: HandwriteOCRRequest, timeout: float = None, retry: int = 0) -> HandwriteOCRResponse:
+    def _recognize(self, request: HandwriteOCRRequest, timeout: float = None, retry: int = 0,
+                   raw_image: bytes = b"") -> HandwriteOCRResponse:
         r"""调用底层接口进行通用文字识别
                     参数:
                        request (obj: `HandwriteOCRRequest`) : 通用文字识别输入参数
+                       raw_image (bytes, 可选) : 图片原始内容, 设置后忽略request.image
 
                    返回：
                        response (obj: `HandwriteOCRResponse`): 通用文字识别返回结果
                """
-        if not request.image and not request.url:
+        if not request.image and not raw_image and not request.url:
             raise ValueError("one of image or url must be set")
         data = HandwriteOCRRequest.to_dict(request)
-        if self.http_client.retry.total != retry:
-            self.http_client.retry.total = retry
+        if raw_image:
+            # 图片按块编码写入请求体, 避免在内存中生成多份完整的base64与urlencode副本
+            data["image"] = Base64Stream(raw_image)
+            data = form_body(data)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/x-www-form-urlencoded'
         url = self.http_client.service_url("/v1/bce/aip/ocr/v1/handwriting")
-        response = self.http_client.session.post(url, headers=headers, data=data, timeout=timeout)
+        response = self.http_client.post(url, headers=headers, data=data, retry=retry, timeout=timeout,
+                                         hedge=self.hedge_policy)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -19,10 +19,16 @@ import time
 from appbuilder.core.component import Component
 from appbuilder.core.message import Message
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._rate_limiter import RateLimiter
 from appbuilder.core._exception import AppBuilderServerException
 from appbuilder.core.components.image_understand.model import *
 from typing import Generator, Union
 
+# 查询结果接口限制1QPS, 同一任务的两次查询至少间隔_MIN_POLL_INTERVAL秒;
+# 多个任务并发轮询时再由RateLimiter控制整体的请求速率, 用户设置过该接口的限流时以用户设置为准
+_MIN_POLL_INTERVAL = 1.1
+RateLimiter().set_default_limit("/v1/bce/aip/image-classify/v1/image-understanding/get-result", max_qps=0.9)
+
 
 class ImageUnderstand(Component):
     r"""
@@ -118,13 +124,11 @@ class ImageUnderstand(Component):
         """
         if not request.image and not request.url:
             raise ValueError("one of image or url must be set")
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
         data = ImageUnderstandRequest.to_dict(request)
         headers = self.http_client.auth_header()
         headers['Content-Type'] = 'application/json'
         url = self.http_client.service_url("/v1/bce/aip/image-classify/v1/image-understanding/request")
-        response = self.http_client.session.post(url, json=data, timeout=timeout, headers=headers)
+        response = self.http_client.post(url, json=data, retry=retry, timeout=timeout, headers=headers)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -136,7 +140,8 @@ class ImageUnderstand(Component):
             raise AppBuilderServerException(request_id=request_id, service_err_message="empty task_id")
         url = self.http_client.service_url("/v1/bce/aip/image-classify/v1/image-understanding/get-result")
         while True:
-            response = self.http_client.session.post(url, json={"task_id": task_id}, timeout=timeout, headers=headers)
+            poll_start = time.monotonic()
+            response = self.http_client.post(url, json={"task_id": task_id}, retry=retry, timeout=timeout, headers=headers)
             self.http_client.check_response_header(response)
             data = response.json()
             self.http_client.check_response_json(data)
@@ -146,10 +151,8 @@ class ImageUnderstand(Component):
             response = ImageUnderstandResponse(data)
             if response.result.ret_code == 0:
                 return ImageUnderstandResponse(data)
-            # 还在处理中
-            if response.result.ret_code == 1:
-                # 避免触发限流（>1QPS），等待1.1秒
-                time.sleep(1.1)
+            # 还在处理中, 限流等待的时间计入间隔, 不足最小间隔时补足
+            time.sleep(max(0.0, poll_start + _MIN_POLL_INTERVAL - time.monotonic()))
 
     def tool_eval(self, name: str, streaming: bool,
                   origin_query: str, **kwargs) -> Union[Generator[str, None, None], str]:
@@ -77,12 +77,10 @@ class LandmarkRecognition(Component):
         if not request.image and not request.url:
             raise ValueError("one of image or url must be set")
         data = LandmarkRecognitionRequest.to_dict(request)
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/x-www-form-urlencoded'
         url = self.http_client.service_url("/v1/bce/aip/image-classify/v1/landmark")
-        response = self.http_client.session.post(url, data=data, timeout=timeout, headers=headers)
+        response = self.http_client.post(url, data=data, retry=retry, timeout=timeout, headers=headers)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
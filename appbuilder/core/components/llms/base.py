@@ -14,6 +14,13 @@
 import itertools
 import json
 import uuid
+import time
+import random
+import asyncio
+import functools
+import contextvars
+from concurrent import futures
+from contextvars import ContextVar
 from enum import Enum
 import logging
 import requests
@@ -26,12 +33,18 @@ from pydantic.types import confloat
 from appbuilder.core.component import Component
 from appbuilder.core.message import Message, _T
 from appbuilder.utils.logger_util import logger
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable
 
 from appbuilder.core.component import ComponentArguments
-from appbuilder.core.utils import ModelInfo, ttl_lru_cache
-from appbuilder.utils.sse_util import SSEClient
+from appbuilder.core.utils import ModelInfo, ModelCatalog
+from appbuilder.utils.sse_util import SSEClient, AsyncSSEClient
 from appbuilder.core._exception import AppBuilderServerException, ModelNotSupportedException
+from appbuilder.core._completion_cache import CompletionCache
+from appbuilder.core._metrics import llm_metrics
+from appbuilder.core._single_flight import SingleFlight, AsyncSingleFlight, StreamBroadcast, AsyncStreamBroadcast, \
+    StreamAbandonedError
+from appbuilder.core._client import AsyncStreamResponse
+from appbuilder.core._rate_limiter import RateLimiter, QPS_LIMIT_ERROR_CODES
 
 
 class LLMMessage(Message):
@@ -54,6 +67,11 @@ class LLMMessage(Message):
         return new_instance
 
 
+# 进程内正在进行的completion请求, 开启request_coalescing时相同的并发请求共享同一个
+_completion_flights = SingleFlight()
+_acompletion_flights = AsyncSingleFlight()
+
+
 class CompletionRequest(object):
     r"""ShortSpeechRecognitionRequest."""
     params = None
@@ -80,6 +98,7 @@ class CompletionResponse(object):
     log_id = ""
     extra = None
     token_usage = {}
+    data = None
 
     def __init__(self, response, stream: bool = False):
         """初始化客户端状态。"""
@@ -89,7 +108,16 @@ class CompletionResponse(object):
         self.extra = {}
         self.token_usage = {}
 
-        if stream:
+        if stream and isinstance(response, AsyncStreamResponse):
+            # 异步流式数据处理
+            async def astream_data():
+                async for event in AsyncSSEClient(response).events():
+                    answer = self.parse_stream_data(event)
+                    if answer is not None:
+                        yield answer
+
+            self.result = astream_data()
+        elif stream:
             # 流式数据处理
             def stream_data():
                 sse_client = SSEClient(response)
@@ -119,15 +147,53 @@ class CompletionResponse(object):
                 if "code" in data and "message" in data and "status" in data:
                     raise AppBuilderServerException(self.log_id, data["code"], data["message"])
 
-                self.result = data.get("answer", None)
-                trace_log_list = data.get("trace_log", None)
-                if trace_log_list is not None:
-                    for trace_log in trace_log_list:
-                        key = trace_log["tool"]
-                        result_list = trace_log["result"]
-                        result_list = ResultProcessor.process(key, result_list)
-                        self.extra[key] = result_list
-                self.token_usage = data.get("usage", {})
+                self.parse_data(data)
+
+    @classmethod
+    def from_cache(cls, entry: Dict[str, Any], stream: bool = False, asynchronous: bool = False):
+        """由CompletionCache中的条目构造响应, 流式响应按缓存的数据块重放, asynchronous为True时重放为异步生成器"""
+        response = cls.__new__(cls)
+        response.error_no = 0
+        response.error_msg = ""
+        response.log_id = entry.get("log_id")
+        response.extra = {}
+        response.token_usage = {}
+        if stream and asynchronous:
+            async def replay():
+                for event in entry["events"]:
+                    yield event
+
+            response.result = replay()
+        elif stream:
+            response.result = (event for event in entry["events"])
+        else:
+            response.parse_data(entry["data"])
+        return response
+
+    @classmethod
+    def from_stream(cls, log_id: str, events):
+        """由数据块的(异步)迭代器构造流式响应"""
+        response = cls.__new__(cls)
+        response.error_no = 0
+        response.error_msg = ""
+        response.log_id = log_id
+        response.extra = {}
+        response.token_usage = {}
+        response.result = events
+        return response
+
+    def parse_data(self, data):
+        """解析非流式响应数据"""
+        self.data = data
+        self.result = data.get("answer", None)
+        trace_log_list = data.get("trace_log", None)
+        if trace_log_list is not None:
+            for trace_log in trace_log_list:
+                key = trace_log["tool"]
+                result_list = trace_log["result"]
+                result_list = ResultProcessor.process(key, result_list)
+                self.extra[key] = result_list
+        self.token_usage = data.get("usage", {})
 
     def parse_stream_data(self, event):
         """解析流式数据块并提取answer字段"""
@@ -178,41 +244,60 @@ class CompletionResponse(object):
         """
         对模型输出的 Message 对象进行包装。
         当 Message 是流式数据时，数据被迭代完后，将重新更新 content 为 blocking 的字符串。
+        异步流式数据被包装为异步迭代器, 更新extra、token_usage与content的方式相同。
         """
 
-        class IterableWrapper:
+        class _StreamWrapper:
             def __init__(self, stream_content):
                 self._content = stream_content
                 self._concat = ""
                 self._token_usage = {}
 
+            def _handle(self, result_json):
+                char = result_json.get("answer", "")
+                result_list = result_json.get("result")
+                key = result_json.get("tool")
+                if result_list is not None:
+                    result_list = ResultProcessor.process(key, result_list)
+                    message.extra = {key: result_list}  # Update the original extra
+                else:
+                    message.extra = {}
+                if "usage" in result_json:
+                    self._token_usage = result_json.get("usage")
+                    message.token_usage = self._token_usage
+                self._concat += char
+                return char
+
+        class IterableWrapper(_StreamWrapper):
             def __iter__(self):
                 return self
 
             def __next__(self):
                 try:
                     result_json = next(self._content)
-                    char = result_json.get("answer", "")
-                    result_list = result_json.get("result")
-                    key = result_json.get("tool")
-                    if result_list is not None:
-                        result_list = ResultProcessor.process(key, result_list)
-                        message.extra = {key: result_list}  # Update the original extra
-                    else:
-                        message.extra = {}
-                    if "usage" in result_json:
-                        self._token_usage = result_json.get("usage")
-                        message.token_usage = self._token_usage
-                    self._concat += char
-                    return char
                 except StopIteration:
                     message.content = self._concat  # Update the original content
                     raise
+                return self._handle(result_json)
+
+        class AsyncIterableWrapper(_StreamWrapper):
+            def __aiter__(self):
+                return self
+
+            async def __anext__(self):
+                try:
+                    result_json = await self._content.__anext__()
+                except StopAsyncIteration:
+                    message.content = self._concat  # Update the original content
+                    raise
+                return self._handle(result_json)
 
-        from collections.abc import Generator
+        from collections.abc import Generator, AsyncGenerator
         if isinstance(message.content, Generator):
             # Replace the original content with the custom iterable
             message.content = IterableWrapper(message.content)
+        elif isinstance(message.content, AsyncGenerator):
+            message.content = AsyncIterableWrapper(message.content)
         return message
 
 class ResultProcessor:
@@ -237,6 +322,28 @@ class ResultProcessor:
             raise TypeError(f"不支持的tools: {key}")
 
 
+class BatchResult(list):
+    r"""CompletionBaseComponent.batch的返回结果, 按输入顺序排列, 调用失败的位置为对应的异常.
+
+        属性:
+            token_usage(dict): 所有成功调用的token用量之和.
+            errors(dict): 调用失败的输入下标到异常的映射.
+    """
+
+    def __init__(self, results: List[Any], token_usage: Dict[str, Any], errors: Dict[int, Exception]):
+        super(BatchResult, self).__init__(results)
+        self.token_usage = token_usage
+        self.errors = errors
+
+
+def _is_throttled_error(e: AppBuilderServerException) -> bool:
+    try:
+        code = int(e.code)
+    except (TypeError, ValueError):
+        return False
+    return code == 429 or code in QPS_LIMIT_ERROR_CODES
+
+
 class CompletionBaseComponent(Component):
     name: str
     version: str
@@ -244,7 +351,11 @@ class CompletionBaseComponent(Component):
     model_name: str = ""
     model_type: str = "chat"
     excluded_models: List[str] = ["Yi-34B-Chat", "ChatLaw"]
-    model_info: ModelInfo = None
+    # 响应缓存, 默认不开启, 可以对单个组件类、实例或CompletionBaseComponent设置
+    completion_cache: Optional[CompletionCache] = None
+    # 合并并发的相同请求, 默认不开启, 开启后相同的并发调用共享一次网关请求, 流式调用共享同一份数据块
+    request_coalescing: bool = False
+    # 请求中model_config的模板, 只读, 实际请求的配置由get_model_config构造
     model_config: Dict[str, Any] = {
         "model": {
             "provider": "baidu",
@@ -282,26 +393,23 @@ class CompletionBaseComponent(Component):
         if not lazy_certification:
             self._check_model_and_get_model_url(self.model_name, self.model_type)
 
-    @ttl_lru_cache(seconds_to_live=1 * 60 * 60) # 1h 
-    def set_secret_key_and_gateway(self, secret_key: Optional[str] = None, gateway: str = ""):
-        super(CompletionBaseComponent, self).set_secret_key_and_gateway(
-                secret_key=secret_key, gateway=gateway)
-        self.__class__.model_info = ModelInfo(client=self.http_client)
+    @property
+    def model_info(self) -> ModelInfo:
+        r"""当前凭证对应的模型信息, 由进程级的ModelCatalog共享"""
+        return ModelCatalog().get(self.http_client)
 
-    @ttl_lru_cache(seconds_to_live=1 * 60 * 60) # 1h 
     def _check_model_and_get_model_url(self, model, model_type):
         if model and model in self.excluded_models:
             raise ModelNotSupportedException(f"Model {model} not supported")
         if not model:
             raise ValueError("model_name must be provided")
-        if self.__class__.model_info is None:
-            self.set_secret_key_and_gateway()
-        m_type = self.model_info.get_model_type(model)
+        model_info = self.model_info
+        m_type = model_info.get_model_type(model)
         if m_type != model_type:
             raise ModelNotSupportedException(
                 f"Model {model} with type [{m_type}] not supported, only support {model_type} type")
 
-        model_url = self.model_info.get_model_url(model)
+        model_url = model_info.get_model_url(model)
         return model_url
 
     def gene_request(self, query, inputs, response_mode, message_id, model_config):
@@ -333,7 +441,24 @@ class CompletionBaseComponent(Component):
         Returns:
             obj:`Message`: Output message after running model.
         """
+        request = self._build_request(*args, **kwargs)
+        response = self.completion(self.version, self.base_url, request)
+
+        if response.error_no != 0:
+            raise AppBuilderServerException(service_err_code=response.error_no, service_err_message=response.error_msg)
+
+        return response.to_message()
+
+    def _build_request(self, *args, **kwargs) -> CompletionRequest:
+        """
+        校验输入并构造completion请求, run与arun共用.
 
+        子类在run中需要预处理输入时, 在参数与run相同的_build_request中预处理, 再调用父类的_build_request,
+        这样arun不需要执行同步的run也能复用子类的输入校验与prompt构造。
+
+        Returns:
+            obj:`CompletionRequest`
+        """
         specific_params = {k: v for k, v in kwargs.items() if k in self.meta.model_fields}
         model_config_params = {k: v for k, v in kwargs.items() if k in ModelArgsConfig.model_fields}
 
@@ -345,8 +470,121 @@ class CompletionBaseComponent(Component):
 
         query, inputs, response_mode, user_id = self.get_compeliton_params(specific_inputs, model_config_inputs)
         model_config = self.get_model_config(model_config_inputs)
-        request = self.gene_request(query, inputs, response_mode, user_id, model_config)
-        response = self.completion(self.version, self.base_url, request)
+        return self.gene_request(query, inputs, response_mode, user_id, model_config)
+
+    def _builds_request(self) -> bool:
+        # 子类重写了run而没有提供对应的_build_request时, 无法在不执行run的情况下构造请求
+        for cls in type(self).__mro__:
+            if "_build_request" in cls.__dict__:
+                return True
+            if "run" in cls.__dict__:
+                return False
+        return True
+
+    def batch(self, messages: List[Message], max_concurrency: Optional[int] = None, stream: bool = False,
+              progress_callback: Optional[Callable[[int, int, int, Any], None]] = None,
+              max_throttle_retries: int = 3, **kwargs) -> BatchResult:
+        """
+        Run the model over a list of messages concurrently, results keep the order of messages.
+
+        Requests go through the shared HTTPClient, so the RateLimiter configured for the completion endpoint
+        paces them; calls rejected by the gateway for exceeding the QPS quota are retried with backoff.
+
+        Args:
+            messages (List[Message]): input messages, each one is passed to `run` as the first argument.
+            max_concurrency (int, optional): max number of concurrent calls. Defaults to the max_concurrency of
+                the endpoint's rate limiter, or the HTTP connection pool size.
+            stream (bool, optional): call the model in streaming mode, each stream is consumed inside the batch
+                and the returned message contains the concatenated content. Defaults to False.
+            progress_callback (Callable, optional): called in the caller's thread after each call finishes, with
+                (finished count, total count, index, message or exception).
+            max_throttle_retries (int, optional): max retries of a call rejected for rate limiting. Defaults to 3.
+            **kwargs: keyword arguments passed to every `run` call, such as temperature.
+
+        Returns:
+            obj:`BatchResult`: list of output messages, failed calls are replaced by the raised exception.
+                `token_usage` sums the usage of successful calls, `errors` maps indexes to exceptions.
+        """
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency must be bigger than zero")
+        total = len(messages)
+        results = [None] * total
+        errors = {}
+        token_usage = {}
+        if total == 0:
+            return BatchResult(results, token_usage, errors)
+        if max_concurrency is None:
+            max_concurrency = self._default_batch_concurrency()
+
+        with futures.ThreadPoolExecutor(max_workers=min(max_concurrency, total)) as executor:
+            tasks = {
+                executor.submit(contextvars.copy_context().run, self._batch_run, message, stream,
+                                max_throttle_retries, kwargs): index
+                for index, message in enumerate(messages)
+            }
+            for finished, task in enumerate(futures.as_completed(tasks), 1):
+                index = tasks[task]
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = errors[index] = e
+                else:
+                    for key, value in (result.token_usage or {}).items():
+                        if isinstance(value, (int, float)):
+                            token_usage[key] = token_usage.get(key, 0) + value
+                results[index] = result
+                if progress_callback is not None:
+                    progress_callback(finished, total, index, result)
+        return BatchResult(results, token_usage, errors)
+
+    def _default_batch_concurrency(self) -> int:
+        url = self.http_client.service_url("/" + self.version + "/api/llm/" + self.name, self.base_url)
+        limiter = RateLimiter().get(url)
+        if limiter is not None and limiter.max_concurrency:
+            return limiter.max_concurrency
+        return self.http_client.pool_config.pool_maxsize
+
+    def _batch_run(self, message, stream: bool, max_throttle_retries: int, kwargs: Dict[str, Any]):
+        attempt = 0
+        while True:
+            try:
+                result = self.run(message, stream=stream, **kwargs)
+                if stream:
+                    for _ in result.content:
+                        pass
+                return result
+            except AppBuilderServerException as e:
+                if attempt >= max_throttle_retries or not _is_throttled_error(e):
+                    raise
+            # 指数退避并加随机抖动, 避免被限流的请求同时重试
+            time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.0))
+            attempt += 1
+
+    async def arun(self, *args, **kwargs):
+        """
+        Asynchronous version of run, accepts the same arguments as run.
+
+        The request is built by _build_request, the same helper run uses (so the input checking and prompt
+        building of subclasses are reused), and sent through AsyncHTTPClient without occupying a thread.
+        With stream=True the content of the returned message is an async iterator of answer chunks,
+        use `async for` to consume it. Subclasses that override run without a matching _build_request
+        run it in the event loop's executor instead.
+
+        Returns:
+            obj:`Message`: Output message after running model.
+        """
+        if not self._builds_request():
+            return await super().arun(*args, **kwargs)
+
+        client = self.http_client
+        if not ModelCatalog().is_loaded(client):
+            # 冷启动时构造请求会同步拉取模型目录, 先在线程池中完成拉取, 避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            await loop.run_in_executor(None, functools.partial(ctx.run, ModelCatalog().get, client))
+
+        request = self._build_request(*args, **kwargs)
+        response = await self.acompletion(self.version, self.base_url, request)
 
         if response.error_no != 0:
             raise AppBuilderServerException(service_err_code=response.error_no, service_err_message=response.error_msg)
@@ -368,42 +606,279 @@ class CompletionBaseComponent(Component):
         return query, inputs, response_mode, user_id
 
     def get_model_config(self, model_config_inputs):
-        """获取模型配置信息"""
-        self.model_config["model"]["name"] = self.model_name
+        """获取模型配置信息.
+
+        类属性model_config只作为模板, 每次请求基于模板构造新的配置, 不修改共享状态,
+        因此多个线程、多个使用不同模型的实例可以并发调用。
+        """
+        template = self.model_config["model"]
+        model = dict(template)
+        model["name"] = self.model_name
 
         model_url = self._check_model_and_get_model_url(self.model_name, self.model_type)
         if model_url:
-            self.model_config["model"]["url"] = model_url
+            model["url"] = model_url
 
-        self.model_config["model"]["completion_params"]["temperature"] = model_config_inputs.temperature
-        self.model_config["model"]["completion_params"]["top_p"] = model_config_inputs.top_p
-        return self.model_config
+        model["completion_params"] = dict(template.get("completion_params", {}),
+                                          temperature=model_config_inputs.temperature,
+                                          top_p=model_config_inputs.top_p)
+        return dict(self.model_config, model=model)
 
     def completion(self, version, base_url, request: CompletionRequest, timeout: float = None,
                    retry: int = 0) -> CompletionResponse:
         r"""Send a byte array of an audio file to obtain the result of speech recognition."""
-
+        stream = True if request.response_mode == "streaming" else False
+        model = self._metrics_model(request)
+        metrics = llm_metrics()
+        metrics.record_request(self.name, model, stream)
+        cache_key = self._completion_cache_key(request, stream)
+        if cache_key is not None:
+            entry = self.completion_cache.get(cache_key)
+            if entry is not None:
+                logger.debug("completion cache hit: {}".format(cache_key))
+                metrics.record_cache_hit(self.name, model)
+                return CompletionResponse.from_cache(entry, stream)
+
+        if not self.request_coalescing:
+            return self._send_completion(request, stream, model, cache_key, timeout, retry)
+
+        key = self._coalescing_key(request, stream)
+
+        def send():
+            response = self._send_completion(request, stream, model, cache_key, timeout, retry)
+            if stream:
+                response.result = StreamBroadcast(
+                    response.result, on_done=lambda: _completion_flights.forget(key, response))
+            return response
+
+        while True:
+            response, leader = _completion_flights.do(key, send, hold=stream)
+            try:
+                response = self._coalesced_response(response, stream, leader)
+            except StreamAbandonedError:
+                # 共享的流式请求在订阅前被其他调用方全部放弃, 重新发起请求
+                continue
+            if not leader:
+                logger.debug("completion coalesced: {}".format(key))
+                metrics.record_coalesced(self.name, model)
+            return response
+
+    async def acompletion(self, version, base_url, request: CompletionRequest, timeout: float = None,
+                          retry: int = 0) -> CompletionResponse:
+        r"""Asynchronous version of completion, the result of streaming response mode is an async generator."""
+        stream = True if request.response_mode == "streaming" else False
+        model = self._metrics_model(request)
+        metrics = llm_metrics()
+        metrics.record_request(self.name, model, stream)
+        cache_key = self._completion_cache_key(request, stream)
+        if cache_key is not None:
+            entry = self.completion_cache.get(cache_key)
+            if entry is not None:
+                logger.debug("completion cache hit: {}".format(cache_key))
+                metrics.record_cache_hit(self.name, model)
+                return CompletionResponse.from_cache(entry, stream, asynchronous=True)
+
+        if not self.request_coalescing:
+            return await self._asend_completion(request, stream, model, cache_key, timeout, retry)
+
+        key = self._coalescing_key(request, stream)
+
+        async def send():
+            response = await self._asend_completion(request, stream, model, cache_key, timeout, retry)
+            if stream:
+                response.result = AsyncStreamBroadcast(
+                    response.result, on_done=lambda: _acompletion_flights.forget(key, response))
+            return response
+
+        while True:
+            response, leader = await _acompletion_flights.do(key, send, hold=stream)
+            try:
+                response = self._coalesced_response(response, stream, leader)
+            except StreamAbandonedError:
+                # 共享的流式请求在订阅前被其他调用方全部放弃, 重新发起请求
+                continue
+            if not leader:
+                logger.debug("completion coalesced: {}".format(key))
+                metrics.record_coalesced(self.name, model)
+            return response
+
+    def _send_completion(self, request: CompletionRequest, stream: bool, model: str, cache_key: Optional[str],
+                         timeout: float = None, retry: int = 0) -> CompletionResponse:
+        r"""向网关发送completion请求, 记录指标并写入缓存"""
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
 
         completion_url = "/" + self.version + "/api/llm/" + self.name
-
-        stream = True if request.response_mode == "streaming" else False
         url = self.http_client.service_url(completion_url, self.base_url)
         logger.debug(
             "request url: {}, method: {}, json: {}, headers: {}".format(url,
                                                                         "POST",
                                                                         request.params,
                                                                         headers))
-        response = self.http_client.session.post(url, json=request.params, headers=headers, timeout=timeout,
-                                                 stream=stream)
+        start = time.perf_counter()
+        try:
+            response = self.http_client.post(url, json=request.params, headers=headers, timeout=timeout,
+                                             stream=stream, retry=retry)
+
+            logger.debug(
+                "request url: {}, method: {}, json: {}, headers: {}, response: {}".format(url, "POST",
+                                                                                          request.params,
+                                                                                          headers,
+                                                                                          response))
+            response = self.gene_response(response, stream)
+        except Exception as e:
+            llm_metrics().record_error(self.name, model, e)
+            raise
+        self._record_metrics(response, stream, model, start)
+        if cache_key is not None:
+            self._save_to_cache(cache_key, response, stream)
+        return response
+
+    async def _asend_completion(self, request: CompletionRequest, stream: bool, model: str,
+                                cache_key: Optional[str], timeout: float = None, retry: int = 0) -> CompletionResponse:
+        r"""_send_completion的异步版本"""
+        headers = self.async_http_client.auth_header()
+        headers["Content-Type"] = "application/json"
 
+        completion_url = "/" + self.version + "/api/llm/" + self.name
+        url = self.async_http_client.service_url(completion_url, self.base_url)
         logger.debug(
-            "request url: {}, method: {}, json: {}, headers: {}, response: {}".format(url, "POST",
-                                                                                      request.params,
-                                                                                      headers,
-                                                                                      response))
-        return self.gene_response(response, stream)
+            "request url: {}, method: {}, json: {}, headers: {}".format(url,
+                                                                        "POST",
+                                                                        request.params,
+                                                                        headers))
+        start = time.perf_counter()
+        try:
+            response = await self.async_http_client.post(url, json=request.params, headers=headers,
+                                                         timeout=timeout, stream=stream, retry=retry)
+
+            logger.debug(
+                "request url: {}, method: {}, json: {}, headers: {}, response: {}".format(url, "POST",
+                                                                                          request.params,
+                                                                                          headers,
+                                                                                          response))
+            response = self.gene_response(response, stream)
+        except Exception as e:
+            llm_metrics().record_error(self.name, model, e)
+            raise
+        self._record_metrics(response, stream, model, start)
+        if cache_key is not None:
+            self._save_to_cache(cache_key, response, stream)
+        return response
+
+    def _coalescing_key(self, request: CompletionRequest, stream: bool) -> tuple:
+        r"""合并请求的key, 与缓存key的计算方式相同, 另外区分鉴权信息, 不同用户的请求不会被合并"""
+        params = request.params
+        model = params.get("model_config", {}).get("model", {})
+        return (self.http_client.secret_key, self.http_client.gateway, CompletionCache.make_key(
+            self.name, self.version, model.get("name"),
+            {"query": params.get("query"), "inputs": params.get("inputs")},
+            model.get("completion_params", {}), stream))
+
+    @staticmethod
+    def _coalesced_response(response: CompletionResponse, stream: bool, leader: bool) -> CompletionResponse:
+        r"""流式响应每个调用方各自订阅一份完整的数据块, 非流式响应为其他调用方复制一份"""
+        if stream:
+            return CompletionResponse.from_stream(response.log_id, response.result.subscribe())
+        if leader:
+            return response
+        return CompletionResponse.from_cache({"log_id": response.log_id, "data": response.data})
+
+    def _completion_cache_key(self, request: CompletionRequest, stream: bool) -> Optional[str]:
+        r"""未开启缓存或请求不可缓存(如采样请求)时返回None"""
+        if self.completion_cache is None:
+            return None
+        params = request.params
+        model = params.get("model_config", {}).get("model", {})
+        if not self.completion_cache.cacheable(model.get("completion_params", {})):
+            return None
+        return self.completion_cache.make_key(
+            self.name, self.version, model.get("name"),
+            {"query": params.get("query"), "inputs": params.get("inputs")},
+            model.get("completion_params", {}), stream)
+
+    def _metrics_model(self, request: CompletionRequest) -> str:
+        r"""指标中的model标签, 取实际请求的模型"""
+        model = request.params.get("model_config", {}).get("model", {}).get("name")
+        return model or self.model_name or ""
+
+    def _record_metrics(self, response: CompletionResponse, stream: bool, model: str, start: float):
+        r"""非流式响应直接记录耗时与token用量, 流式响应在收到第一个数据块时记录首token耗时, 读取完后记录其余指标"""
+        metrics = llm_metrics()
+        component = self.name
+        if not stream:
+            duration = time.perf_counter() - start
+            metrics.record_success(component, model, duration, duration, response.token_usage)
+            return
+
+        class _Observer(object):
+            def __init__(self):
+                self.ttft = None
+                self.usage = None
+
+            def on_event(self, event):
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - start
+                if isinstance(event, dict) and "usage" in event:
+                    self.usage = event["usage"]
+
+            def on_end(self):
+                duration = time.perf_counter() - start
+                metrics.record_success(component, model, self.ttft if self.ttft is not None else duration,
+                                       duration, self.usage)
+
+        def observe(events):
+            observer = _Observer()
+            try:
+                for event in events:
+                    observer.on_event(event)
+                    yield event
+            except Exception as e:
+                metrics.record_error(component, model, e)
+                raise
+            observer.on_end()
+
+        async def aobserve(events):
+            observer = _Observer()
+            try:
+                async for event in events:
+                    observer.on_event(event)
+                    yield event
+            except Exception as e:
+                metrics.record_error(component, model, e)
+                raise
+            observer.on_end()
+
+        if isinstance(response.result, collections.abc.AsyncGenerator):
+            response.result = aobserve(response.result)
+        else:
+            response.result = observe(response.result)
+
+    def _save_to_cache(self, cache_key: str, response: CompletionResponse, stream: bool):
+        r"""非流式响应直接写入缓存, 流式响应在数据块被完整读取后写入"""
+        cache = self.completion_cache
+        if not stream:
+            cache.set(cache_key, {"log_id": response.log_id, "data": response.data})
+            return
+
+        def record(events):
+            recorded = []
+            for event in events:
+                recorded.append(event)
+                yield event
+            cache.set(cache_key, {"log_id": response.log_id, "events": recorded})
+
+        async def arecord(events):
+            recorded = []
+            async for event in events:
+                recorded.append(event)
+                yield event
+            cache.set(cache_key, {"log_id": response.log_id, "events": recorded})
+
+        if isinstance(response.result, collections.abc.AsyncGenerator):
+            response.result = arecord(response.result)
+        else:
+            response.result = record(response.result)
 
     @staticmethod
     def check_service_error(data: dict):
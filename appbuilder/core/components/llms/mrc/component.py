@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from appbuilder.core._exception import AppBuilderServerException
 from appbuilder.core.components.llms.base import CompletionBaseComponent, ModelArgsConfig
 from appbuilder.core.message import Message
 from appbuilder.core.component import ComponentArguments
@@ -143,6 +142,13 @@ class MRC(CompletionBaseComponent):
         返回:
             obj:`Message`: 模型运行后的输出消息。
         """
+        return super().run(message=message, context_list=context_list, reject=reject, clarify=clarify,
+                           highlight=highlight, friendly=friendly, cite=cite, stream=stream,
+                           temperature=temperature, top_p=top_p)
+
+    def _build_request(self, message, context_list, reject=False, clarify=False,
+                       highlight=False, friendly=False, cite=False, stream=False, temperature=1e-10, top_p=0):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
         instruction_set = self.__get_instruction_set()
         context_list = context_list.content
         inputs = {
@@ -160,11 +166,5 @@ class MRC(CompletionBaseComponent):
         response_mode = "streaming" if stream else "blocking"
         user_id = message.id
 
-        request = self.gene_request(query, inputs, response_mode, user_id, model_config)
-        response = self.completion(self.version, self.base_url, request)
-
-        if response.error_no != 0:
-            raise AppBuilderServerException(service_err_code=response.error_no, service_err_message=response.error_msg)
-
-        return response.to_message()
+        return self.gene_request(query, inputs, response_mode, user_id, model_config)
 
@@ -99,3 +99,8 @@ class Nl2pandasComponent(CompletionBaseComponent):
             obj:`Message`: 模型运行后的输出消息。
         """
         return super().run(message=message, table_info=table_info, stream=stream, temperature=temperature, top_p=top_p)
+
+    def _build_request(self, message, table_info=None, stream=False, temperature=1e-10, top_p=0):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
+        return super()._build_request(message=message, table_info=table_info, stream=stream,
+                                      temperature=temperature, top_p=top_p)
@@ -95,7 +95,10 @@ class Playground(CompletionBaseComponent):
         返回:
             obj:`Message`: 模型运行后的输出消息。
         """
+        return super().run(message=message, stream=stream, temperature=temperature, top_p=top_p)
 
+    def _build_request(self, message, stream=False, temperature=1e-10, top_p=0.0):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
         inputs = {}
 
         if isinstance(message.content, str):
@@ -111,7 +114,7 @@ class Playground(CompletionBaseComponent):
 
         prompt = self.prompt_template.format(**inputs)
         query_message = Message(prompt)
-        return super().run(message=query_message, stream=stream, temperature=temperature, top_p=top_p)
+        return super()._build_request(message=query_message, stream=stream, temperature=temperature, top_p=top_p)
 
     def __parse__(self, prompt_template):
         last_end = 0
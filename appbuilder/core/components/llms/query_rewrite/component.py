@@ -123,8 +123,10 @@ class QueryRewrite(CompletionBaseComponent):
             obj:`Message`: 模型运行后的输出消息。
         
         """
+        return super().run(message=message, rewrite_type=rewrite_type, stream=stream, temperature=temperature, top_p=top_p)
 
-
+    def _build_request(self, message, rewrite_type="带机器人回复", stream=False, temperature=1e-10, top_p=0):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
         if message is None:
             raise ValueError("输入消息不能为空")
 
@@ -140,4 +142,5 @@ class QueryRewrite(CompletionBaseComponent):
             converted_input = ''.join([f"User1: {message.content[i]}\n" for i in range(0, len(message.content), 2)])
         message.content = converted_input
 
-        return super().run(message=message, rewrite_type=rewrite_type, stream=stream, temperature=temperature, top_p=top_p)
+        return super()._build_request(message=message, rewrite_type=rewrite_type, stream=stream,
+                                      temperature=temperature, top_p=top_p)
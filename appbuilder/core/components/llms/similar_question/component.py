@@ -110,6 +110,10 @@ class SimilarQuestion(CompletionBaseComponent):
         """
         return super().run(message=message, stream=stream, temperature=temperature, top_p=top_p)
 
+    def _build_request(self, message, stream=False, temperature=1e-10, top_p=0.0):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
+        return super()._build_request(message=message, stream=stream, temperature=temperature, top_p=top_p)
+
     def tool_eval(self, name: str, streaming: bool = False, **kwargs):
         """
         tool_eval for function call
@@ -11,11 +11,11 @@
 # limitations under the License.
 
 r"""身份证混贴识别组件"""
-import base64
 import json
 
 from appbuilder.core import utils
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._payload import Base64Stream, form_body
 from appbuilder.core._exception import AppBuilderServerException, InvalidRequestArgumentError
 from appbuilder.core.component import Component
 from appbuilder.core.components.mix_card_ocr.model import *
@@ -84,13 +84,11 @@ class MixCardOCR(Component):
         request = MixCardOCRRequest()
         if inp.url:
             request.url = inp.url
-        if inp.raw_image:
-            request.image = base64.b64encode(inp.raw_image)
         request.detect_risk = "false"
         request.detect_quality = "false"
         request.detect_photo = "false"
         request.detect_card = "false"
-        response = self._recognize(request, timeout, retry)
+        response = self._recognize(request, timeout, retry, raw_image=inp.raw_image)
         out = MixCardOCROutMsg()
         for res in response.words_result:
             card_type = res.card_info.card_type
@@ -108,23 +106,28 @@ class MixCardOCR(Component):
         out.direction = response.direction
         return Message(content=out.model_dump())
 
-    def _recognize(self, request: MixCardOCRRequest, timeout: float = None, retry: int = 0) -> MixCardOCRResponse:
+    def _recognize(self, request: MixCardOCRRequest, timeout: float = None, retry: int = 0,
+                   raw_image: bytes = b"") -> MixCardOCRResponse:
         r"""调用底层身份证混贴识别
                 参数:
                     request (obj: `GeneralOCRRequest`) : 通用文字识别输入参数
+                    raw_image (bytes, 可选) : 图片原始内容, 设置后忽略request.image
 
                 返回：
                     response (obj: `GeneralOCRResponse`): 通用文字识别返回结果
                """
-        if not request.image and not request.url:
+        if not request.image and not raw_image and not request.url:
             raise ValueError("one of image or url must be set")
         data = MixCardOCRRequest.to_dict(request)
-        if self.http_client.retry.total != retry:
-            self.http_client.retry.total = retry
+        if raw_image:
+            # 图片按块编码写入请求体, 避免在内存中生成多份完整的base64与urlencode副本
+            data["image"] = Base64Stream(raw_image)
+            data = form_body(data)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/x-www-form-urlencoded'
         url = self.http_client.service_url("/v1/bce/aip/ocr/v1/multi_idcard")
-        response = self.http_client.session.post(url, headers=headers, data=data, timeout=timeout)
+        response = self.http_client.post(url, headers=headers, data=data, retry=retry, timeout=timeout,
+                                         hedge=self.hedge_policy)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
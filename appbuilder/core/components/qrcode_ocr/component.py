@@ -14,7 +14,6 @@
 
 """qrcode ocr component."""
 
-import base64
 import json
 
 from appbuilder.core import utils
@@ -22,6 +21,7 @@ from appbuilder.core.component import Component
 from appbuilder.core.components.qrcode_ocr.model import *
 from appbuilder.core.message import Message
 from appbuilder.core._client import HTTPClient
+from appbuilder.core._payload import Base64Stream, form_body
 from appbuilder.core._exception import AppBuilderServerException, InvalidRequestArgumentError
 
 
@@ -91,37 +91,39 @@ class QRcodeOCR(Component):
         """
         inp = QRcodeInMsg(**message.content)
         req = QRcodeRequest()
-        if inp.raw_image:
-            req.image = base64.b64encode(inp.raw_image)
         if inp.url:
             req.url = inp.url
         if not isinstance(location, str) or location not in ('true', 'false'):
             raise InvalidRequestArgumentError("location must be a string with value 'true' or 'false'")
         req.location = location
-        result = self._recognize(req, timeout, retry)
+        result = self._recognize(req, timeout, retry, raw_image=inp.raw_image)
         result_dict = proto.Message.to_dict(result)
         out = QRcodeOutMsg(**result_dict)
         return Message(content=out.model_dump())
 
     def _recognize(self, request: QRcodeRequest, timeout: float = None,
-                   retry: int = 0) -> QRcodeResponse:
+                   retry: int = 0, raw_image: bytes = b"") -> QRcodeResponse:
         r"""调用二维码识别底层能力
                    参数:
                        request (obj: `QRcodeRequest`) : 二维码识别输入参数
+                       raw_image (bytes, 可选) : 图片原始内容, 设置后忽略request.image
                    返回：
                        response (obj: `QRcodeResponse`): 二维码识别返回结果
                """
-        if not request.image and not request.url:
+        if not request.image and not raw_image and not request.url:
             raise ValueError("one of image or url must be set")
 
         data = QRcodeRequest.to_dict(request)
-        if self.http_client.retry.total != retry:
-            self.http_client.retry.total = retry
+        if raw_image:
+            # 图片按块编码写入请求体, 避免在内存中生成多份完整的base64与urlencode副本
+            data["image"] = Base64Stream(raw_image)
+            data = form_body(data)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/x-www-form-urlencoded'
         headers['Accept'] = 'application/json'
         url = self.http_client.service_url("/v1/bce/aip/ocr/v1/qrcode")
-        response = self.http_client.session.post(url, headers=headers, data=data, timeout=timeout)
+        response = self.http_client.post(url, headers=headers, data=data, retry=retry, timeout=timeout,
+                                         hedge=self.hedge_policy)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
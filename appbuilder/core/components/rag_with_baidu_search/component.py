@@ -144,6 +144,24 @@ class RAGWithBaiduSearch(CompletionBaseComponent):
         temperature=1e-10, 
         top_p=1e-10,
     ):
+        return super().run(message=message, instruction=instruction, reject=reject, clarify=clarify,
+                           highlight=highlight, friendly=friendly, cite=cite, stream=stream,
+                           temperature=temperature, top_p=top_p)
+
+    def _build_request(
+        self, 
+        message, 
+        instruction=None, 
+        reject=None,
+        clarify=None,
+        highlight=None,
+        friendly=None,
+        cite=None,
+        stream=False, 
+        temperature=1e-10, 
+        top_p=1e-10,
+    ):
+        """校验并预处理输入, 构造completion请求, 参数与run相同"""
         instruction_set = self.__get_instruction_set()
 
         # query 长度限制不能超过 72
@@ -172,10 +190,4 @@ class RAGWithBaiduSearch(CompletionBaseComponent):
         response_mode = "streaming" if stream else "blocking"
         user_id = message.id
 
-        request = self.gene_request(message.content, inputs, response_mode, user_id, model_config)
-
-        response = self.completion(self.version, self.base_url, request)
-        if response.error_no != 0:
-            raise AppBuilderServerException(service_err_code=response.error_no, service_err_message=response.error_msg)
-
-        return response.to_message()
+        return self.gene_request(message.content, inputs, response_mode, user_id, model_config)
@@ -120,9 +120,7 @@ class Text2Image(Component):
         data = Text2ImageSubmitRequest.to_json(request)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/json'
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
-        response = self.http_client.session.post(url, data=data, headers=headers, timeout=timeout)
+        response = self.http_client.post(url, data=data, headers=headers, retry=retry, timeout=timeout)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -152,9 +150,7 @@ class Text2Image(Component):
         }
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/json'
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
-        response = self.http_client.session.post(url, json=data, headers=headers, timeout=timeout)
+        response = self.http_client.post(url, json=data, headers=headers, retry=retry, timeout=timeout)
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
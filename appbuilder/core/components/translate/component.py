@@ -126,14 +126,13 @@ class Translation(Component):
         if not request.from_lang:
             request.from_lang = "auto"
         request_data = TranslateRequest.to_json(request)
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/json;charset=utf-8'
 
         url = self.http_client.service_url("/v1/bce/aip/mt/texttrans/v1")
 
-        response = self.http_client.session.post(url, headers=headers, data=request_data, timeout=timeout)
+        response = self.http_client.post(url, headers=headers, data=request_data, retry=retry, timeout=timeout,
+                                         hedge=self.hedge_policy)
 
         self.http_client.check_response_header(response)
         data = response.json()
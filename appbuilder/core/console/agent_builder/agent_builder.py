@@ -66,7 +66,7 @@ class AgentBuilder(Component):
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
         url = self.http_client.service_url("/v1/ai_engine/agi_platform/v1/conversation/create", "/api")
-        response = self.http_client.session.post(url, headers=headers, json={"app_id": self.app_id}, timeout=None)
+        response = self.http_client.post(url, headers=headers, json={"app_id": self.app_id}, timeout=None)
         self.http_client.check_response_header(response)
         request_id = self.http_client.response_request_id(response)
         data = response.json()
@@ -93,7 +93,7 @@ class AgentBuilder(Component):
         }
         headers = self.http_client.auth_header()
         url = self.http_client.service_url("/v1/ai_engine/agi_platform/v1/instance/upload", "/api")
-        response = self.http_client.session.post(url, files=multipart_form_data, headers=headers)
+        response = self.http_client.post(url, files=multipart_form_data, headers=headers)
         self.http_client.check_response_header(response)
         request_id = self.http_client.response_request_id(response)
         data = response.json()
@@ -130,7 +130,7 @@ class AgentBuilder(Component):
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
         url = self.http_client.service_url("/v1/ai_engine/agi_platform/v1/instance/integrated", '/api')
-        response = self.http_client.session.post(url, headers=headers, json=req.model_dump(), timeout=None, stream=True)
+        response = self.http_client.post(url, headers=headers, json=req.model_dump(), timeout=None, stream=True)
         self.http_client.check_response_header(response)
         request_id = self.http_client.response_request_id(response)
         if stream:
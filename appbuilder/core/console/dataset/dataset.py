@@ -1,5 +1,5 @@
 from typing import List, Dict
-from appbuilder.core._client import HTTPClient
+from appbuilder.core._client import HTTPClientRegistry, shared_http_client
 from appbuilder.core.console.dataset.model import DocumentListResponse, AddDocumentsResponse
 from appbuilder.core.constants import MAX_DOCUMENTS_NUM, SUPPORTED_FILE_TYPE
 import json
@@ -44,7 +44,7 @@ class Dataset:
     @property
     def http_client(self):
         if self._http_client is None:
-            self._http_client = HTTPClient()
+            self._http_client, _ = shared_http_client(self)
         return self._http_client
 
     @classmethod
@@ -57,14 +57,18 @@ class Dataset:
             Dataset实例
         """
         payload = json.dumps({"name": dataset_name})
-        http_client = HTTPClient()
-        headers = http_client.auth_header()
-        headers["Content-Type"] = "application/json"
-        response = http_client.session.post(url=http_client.service_url(cls.create_url),
-                                            headers=headers, data=payload)
-        http_client.check_response_header(response)
-        http_client.check_console_response(response)
-        response = response.json()["result"]
+        registry = HTTPClientRegistry()
+        http_client = registry.acquire()
+        try:
+            headers = http_client.auth_header()
+            headers["Content-Type"] = "application/json"
+            response = http_client.post(url=http_client.service_url(cls.create_url),
+                                        headers=headers, data=payload)
+            http_client.check_response_header(response)
+            http_client.check_console_response(response)
+            response = response.json()["result"]
+        finally:
+            registry.release(http_client)
         return Dataset(dataset_id=response["id"], dataset_name=response["name"])
 
     def add_documents(self, file_path_list: List[str], is_custom_process_rule: bool = False,
@@ -104,8 +108,8 @@ class Dataset:
         payload = json.dumps(payload)
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        response = self.http_client.session.post(url=self.http_client.service_url(self.add_file_url),
-                                                 headers=headers, data=payload)
+        response = self.http_client.post(url=self.http_client.service_url(self.add_file_url),
+                                         headers=headers, data=payload)
         self.http_client.check_response_header(response)
         self.http_client.check_console_response(response)
         res = AddDocumentsResponse.parse_obj(response.json()["result"])
@@ -122,8 +126,8 @@ class Dataset:
         headers = self.http_client.auth_header()
         with open(file_path, 'rb') as file:
             files = {'file': (os.path.basename(file_path), file)}
-            response = self.http_client.session.post(url=self.http_client.service_url(self.upload_file_url),
-                                                     files=files, headers=headers)
+            response = self.http_client.post(url=self.http_client.service_url(self.upload_file_url),
+                                             files=files, headers=headers)
             self.http_client.check_response_header(response)
             self.http_client.check_console_response(response)
             res = response.json()["result"]
@@ -149,8 +153,8 @@ class Dataset:
         payload = json.dumps({"dataset_id": self.dataset_id, "document_id": document_id})
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        response = self.http_client.session.post(url=self.http_client.service_url(self.delete_file_url),
-                                                 headers=headers, data=payload)
+        response = self.http_client.post(url=self.http_client.service_url(self.delete_file_url),
+                                         headers=headers, data=payload)
         self.http_client.check_response_header(response)
         self.http_client.check_console_response(response)
 
@@ -189,8 +193,8 @@ class Dataset:
         payload = json.dumps({"dataset_id": self.dataset_id, "page": page, "limit": limit, "keyword": keyword})
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        response = self.http_client.session.post(url=self.http_client.service_url(self.get_file_list_url),
-                                                 headers=headers, data=payload)
+        response = self.http_client.post(url=self.http_client.service_url(self.get_file_list_url),
+                                         headers=headers, data=payload)
         self.http_client.check_response_header(response)
         self.http_client.check_console_response(response)
         res = DocumentListResponse.parse_obj(response.json()["result"])
@@ -1,5 +1,4 @@
 import json
-from appbuilder.core._client import HTTPClient
 from appbuilder.core.component import Message, Component
 from appbuilder.core.console.base import ConsoleCompletionResponse
 
@@ -34,13 +33,6 @@ class RAG(Component):
     def __init__(self, app_id: str = ""):
         super().__init__()
         self.app_id = app_id
-        self._http_client = None
-
-    @property
-    def http_client(self):
-        if self._http_client is None:
-            self._http_client = HTTPClient()
-        return self._http_client
 
     def run(self, query: Message, conversation_id: str = "", stream: bool = False):
         """
@@ -57,8 +49,8 @@ class RAG(Component):
                               "response_mode": response_mode, "conversation_id": conversation_id})
         headers = self.http_client.auth_header()
         headers["Content-Type"] = "application/json"
-        response = self.http_client.session.post(url=self.http_client.service_url(self.integrated_url),
-                                                 headers=headers, data=payload, stream=True)
+        response = self.http_client.post(url=self.http_client.service_url(self.integrated_url),
+                                         headers=headers, data=payload, stream=True)
         response = ConsoleCompletionResponse(response, stream)
         return response.to_message()
 
@@ -13,3 +13,325 @@
 # limitations under the License.
 
 
+
+"""streaming pipeline over components, downstream stages start on partial upstream output"""
+
+import re
+import threading
+import collections
+import contextvars
+from abc import ABC, abstractmethod
+from concurrent import futures
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from appbuilder.core.component import Component
+from appbuilder.core.message import Message
+
+
+_SENTENCE_END = re.compile(r"[。！？!?；;\n]+|\.(?=\s)")
+
+
+def sentence_segmenter(min_length: int = 1) -> Callable[[Iterable[str]], Iterator[str]]:
+    r"""返回按句子切分文本流的函数, 句子在结束标点(。！？!?；;与换行)处切分.
+
+        参数:
+            min_length(int, 可选): 句子的最小长度, 不足时与下一句合并, 默认1.
+        返回：
+            Callable: 输入为文本块的迭代器, 输出为句子的迭代器.
+    """
+
+    def segment(chunks: Iterable[str]) -> Iterator[str]:
+        buffer = ""
+        for chunk in chunks:
+            buffer += chunk
+            start = 0
+            for match in _SENTENCE_END.finditer(buffer):
+                # 结束标点在末尾时等待下一个数据块, 连续的结束标点可能被拆分到两个数据块
+                if match.end() < len(buffer) and match.end() - start >= min_length:
+                    yield buffer[start:match.end()]
+                    start = match.end()
+            buffer = buffer[start:]
+        if buffer.strip():
+            yield buffer
+
+    return segment
+
+
+def _default_to_message(value: Any) -> Message:
+    return value if isinstance(value, Message) else Message(value)
+
+
+def _iter_output(message: Any) -> Iterator[Any]:
+    r"""组件的输出为流式Message时逐块返回, 否则返回content本身"""
+    content = message.content if isinstance(message, Message) else message
+    if isinstance(content, Iterator):
+        yield from content
+    else:
+        yield content
+
+
+def _join(items: List[Any]) -> Any:
+    if len(items) == 1:
+        return items[0]
+    if all(isinstance(item, str) for item in items):
+        return "".join(items)
+    return items
+
+
+class Stage(ABC):
+    r"""流水线中的一个阶段, 把上游数据块的迭代器转换为下游数据块的迭代器, 子类需要实现process"""
+
+    @abstractmethod
+    def process(self, items: Iterator[Any]) -> Iterator[Any]:
+        r"""读取上游数据块, 返回下游数据块的迭代器"""
+
+
+class ComponentStage(Stage):
+    r"""读取完上游的全部输出后调用一次组件, 组件的流式输出逐块传给下游, 适用于需要完整输入的大模型组件.
+
+        参数:
+            component(Component): 组件.
+            to_message(Callable, 可选): 把上游输出转换为组件输入Message的函数, 上游的文本块会先拼接为完整文本,
+                默认用上游输出构造Message.
+            **run_kwargs: 调用组件时的其他参数, 例如stream=True.
+    """
+
+    def __init__(self, component: Component, to_message: Optional[Callable[[Any], Message]] = None, **run_kwargs):
+        self.component = component
+        self.to_message = to_message or _default_to_message
+        self.run_kwargs = run_kwargs
+
+    def process(self, items: Iterator[Any]) -> Iterator[Any]:
+        message = self.to_message(_join(list(items)))
+        yield from _iter_output(self.component(message, **self.run_kwargs))
+
+
+class SegmentStage(Stage):
+    r"""把上游的文本流切分为片段, 每个片段调用一次组件, 适用于逐句合成语音等场景.
+
+    片段按顺序输出, max_concurrency大于1时后面的片段会在前面的片段输出前开始处理。
+
+        参数:
+            component(Component): 组件.
+            to_message(Callable, 可选): 把片段转换为组件输入Message的函数, 默认用片段构造Message.
+            segmenter(Callable, 可选): 切分函数, 输入为上游数据块的迭代器, 输出为片段的迭代器,
+                默认sentence_segmenter().
+            max_concurrency(int, 可选): 同时处理的片段数, 默认1.
+            **run_kwargs: 调用组件时的其他参数.
+    """
+
+    def __init__(self, component: Component, to_message: Optional[Callable[[Any], Message]] = None,
+                 segmenter: Optional[Callable[[Iterable[Any]], Iterator[Any]]] = None,
+                 max_concurrency: int = 1, **run_kwargs):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be bigger than zero")
+        self.component = component
+        self.to_message = to_message or _default_to_message
+        self.segmenter = segmenter or sentence_segmenter()
+        self.max_concurrency = max_concurrency
+        self.run_kwargs = run_kwargs
+
+    def _run(self, segment: Any) -> List[Any]:
+        return list(_iter_output(self.component(self.to_message(segment), **self.run_kwargs)))
+
+    def process(self, items: Iterator[Any]) -> Iterator[Any]:
+        if self.max_concurrency == 1:
+            for segment in self.segmenter(items):
+                yield from self._run(segment)
+            return
+        pending = []
+        with futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            try:
+                for segment in self.segmenter(items):
+                    pending.append(executor.submit(contextvars.copy_context().run, self._run, segment))
+                    while len(pending) >= self.max_concurrency or (pending and pending[0].done()):
+                        yield from pending.pop(0).result()
+                while pending:
+                    yield from pending.pop(0).result()
+            finally:
+                for task in pending:
+                    task.cancel()
+
+
+class _Failure(object):
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END = object()
+
+
+class _Cancellation(object):
+    r"""流水线的取消状态, 所有队列共享其中的Condition, 取消时唤醒阻塞在队列上的全部线程"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.cancelled = False
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+
+class _Channel(object):
+    r"""阶段之间的队列, maxsize为0时不限长度. get与put阻塞等待, 不轮询, 流水线取消时立即返回"""
+
+    def __init__(self, cancellation: _Cancellation, maxsize: int = 0):
+        self._cancellation = cancellation
+        self._cond = cancellation.cond
+        self._items = collections.deque()
+        self._maxsize = maxsize
+
+    def put(self, item: Any) -> bool:
+        r"""队列满时等待, 流水线已取消时返回False"""
+        with self._cond:
+            while self._maxsize and len(self._items) >= self._maxsize and not self._cancellation.cancelled:
+                self._cond.wait()
+            if self._cancellation.cancelled:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self) -> Any:
+        r"""队列为空时等待, 流水线已取消时抛出_Cancelled"""
+        with self._cond:
+            while not self._items and not self._cancellation.cancelled:
+                self._cond.wait()
+            if self._cancellation.cancelled:
+                raise _Cancelled()
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+
+class Pipeline(object):
+    r"""流式流水线, 每个阶段在单独的线程中运行, 阶段之间通过有界队列连接.
+
+    下游阶段在上游产生第一个数据块后即开始处理, 队列满时上游阻塞等待(背压)。任意阶段出错时异常传递给调用方,
+    调用方停止读取时所有阶段随之退出。
+
+        参数:
+            stages(List[Stage]): 按顺序执行的阶段.
+            buffer_size(int, 可选): 阶段之间的队列长度, 默认16.
+
+    Examples:
+
+        .. code-block:: python
+
+            import appbuilder
+            from appbuilder.core.functional import Pipeline, ComponentStage, SegmentStage
+
+            playground = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+            tts = appbuilder.TTS()
+            pipeline = Pipeline([
+                ComponentStage(playground, to_message=lambda text: appbuilder.Message({"query": text}), stream=True),
+                SegmentStage(tts, to_message=lambda sentence: appbuilder.Message({"text": sentence})),
+            ])
+            for audio in pipeline.stream(appbuilder.Message("介绍一下北京")):
+                play(audio["audio_binary"])
+    """
+
+    def __init__(self, stages: List[Stage], buffer_size: int = 16):
+        if not stages:
+            raise ValueError("stages must not be empty")
+        if buffer_size <= 0:
+            raise ValueError("buffer_size must be bigger than zero")
+        self.stages = list(stages)
+        self.buffer_size = buffer_size
+
+    def stream(self, message: Any) -> Iterator[Any]:
+        r"""运行流水线, 返回最后一个阶段输出的迭代器, 第一个阶段的输入为message.content.
+            调用迭代器的close或者丢弃迭代器时, 即使还没有开始读取, 所有阶段也随之退出.
+        """
+        cancellation = _Cancellation()
+        source = _Channel(cancellation)
+        source.put(message.content if isinstance(message, Message) else message)
+        source.put(_END)
+        channels = [source] + [_Channel(cancellation, maxsize=self.buffer_size) for _ in self.stages]
+        for stage, inbox, outbox in zip(self.stages, channels, channels[1:]):
+            threading.Thread(target=contextvars.copy_context().run,
+                             args=(self._run_stage, stage, inbox, outbox),
+                             name="appbuilder-pipeline", daemon=True).start()
+        return _PipelineOutput(self._drain(channels[-1], cancellation), cancellation)
+
+    def run(self, message: Any, stream: bool = True) -> Message:
+        r"""运行流水线, stream为True时返回content为输出迭代器的Message, 否则等待全部输出后拼接返回"""
+        output = self.stream(message)
+        return Message(content=output if stream else _join(list(output)))
+
+    @staticmethod
+    def _drain(outbox: _Channel, cancellation: _Cancellation) -> Iterator[Any]:
+        try:
+            while True:
+                item = outbox.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        except _Cancelled:
+            # 其他线程关闭了输出
+            return
+        finally:
+            cancellation.cancel()
+
+    @staticmethod
+    def _read(inbox: _Channel) -> Iterator[Any]:
+        # 取消时get抛出_Cancelled而不是正常结束, 避免阶段把不完整的输入当作完整输入继续处理
+        while True:
+            item = inbox.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise _UpstreamFailure(item)
+            yield item
+
+    def _run_stage(self, stage: Stage, inbox: _Channel, outbox: _Channel):
+        try:
+            for item in stage.process(self._read(inbox)):
+                if not outbox.put(item):
+                    return
+        except _Cancelled:
+            return
+        except _UpstreamFailure as e:
+            outbox.put(e.failure)
+            return
+        except Exception as e:
+            outbox.put(_Failure(e))
+            return
+        outbox.put(_END)
+
+
+class _UpstreamFailure(Exception):
+    def __init__(self, failure: _Failure):
+        self.failure = failure
+
+
+class _Cancelled(BaseException):
+    r"""流水线被取消时从阶段的输入中抛出, 与GeneratorExit一样继承BaseException, 不会被阶段中的except Exception捕获"""
+    pass
+
+
+class _PipelineOutput(object):
+    r"""Pipeline.stream返回的迭代器, close或被回收时取消流水线"""
+
+    def __init__(self, output: Iterator[Any], cancellation: _Cancellation):
+        self._output = output
+        self._cancellation = cancellation
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        return next(self._output)
+
+    def close(self):
+        self._cancellation.cancel()
+        self._output.close()
+
+    def __del__(self):
+        self._cancellation.cancel()
@@ -16,17 +16,48 @@ import uuid
 import json
 import os
 import logging
+import contextlib
 from typing import Union, List, Dict, Optional
 import sqlalchemy
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, Column, Integer, String, JSON, DateTime, Boolean
+from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 from appbuilder.core.message import Message
 from appbuilder.core.context import get_context, _LOCAL_KEY
+from appbuilder.core._client import _env_int
 
 
 _db = declarative_base()
 
 
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL 模式下读写互不阻塞，写入只需要同步 WAL 文件
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _create_engine(user_session_config: Union[sqlalchemy.engine.URL, str]) -> sqlalchemy.engine.Engine:
+    """
+    创建 UserSession 使用的数据库引擎。连接池大小由环境变量 APPBUILDER_USER_SESSION_POOL_SIZE（默认10）
+    与 APPBUILDER_USER_SESSION_MAX_OVERFLOW（默认20）指定；SQLite 文件数据库开启 WAL 模式，并允许跨线程使用连接。
+    """
+    url = sqlalchemy.engine.make_url(user_session_config)
+    pool_args = {
+        "pool_size": _env_int("APPBUILDER_USER_SESSION_POOL_SIZE", 10),
+        "max_overflow": _env_int("APPBUILDER_USER_SESSION_MAX_OVERFLOW", 20),
+    }
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_pre_ping=True, **pool_args)
+    if url.database in (None, "", ":memory:"):
+        # 内存数据库只在单个连接中存在，使用默认的连接池
+        return create_engine(url)
+    engine = create_engine(url, poolclass=QueuePool, connect_args={"check_same_thread": False}, **pool_args)
+    event.listen(engine, "connect", _set_sqlite_pragma)
+    return engine
+
+
 class SessionMessage(_db):
     """
     会话 Message 数据模型，用于在数据库中存储和管理会话消息。
@@ -89,10 +120,39 @@ class UserSession(object):
         if not isinstance(user_session_config, (sqlalchemy.engine.URL, str)):
             raise ValueError("user_session_config must be sqlalchemy.URL or str")
         logging.info(f"create user_session by {user_session_config}")
-        engine = create_engine(user_session_config)
+        engine = _create_engine(user_session_config)
         _db.metadata.create_all(engine) # 创建表
-        Session = sessionmaker(engine)
-        self._db_session = Session()
+        self._engine = engine
+        # 每个线程使用独立的数据库 Session，每次读写结束后归还连接
+        self._db_session = scoped_session(sessionmaker(engine))
+
+    @contextlib.contextmanager
+    def _session_scope(self):
+        """
+        当前线程的数据库 Session，正常退出时提交，异常时回滚，结束后关闭并归还连接
+        """
+        session = self._db_session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._db_session.remove()
+
+    def ping(self) -> None:
+        """
+        检查数据库是否可以连接，连接失败时抛出异常，用于服务的就绪检查。
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self._engine.connect() as conn:
+            conn.execute(sqlalchemy.text("SELECT 1"))
 
     def get_history(self, key: str, limit: int=10) -> List[Message]:
         """
@@ -115,12 +175,13 @@ class UserSession(object):
             return session_messages
         else:
             # 服务化版本使用数据库存储
-            session_messages = self._db_session.query(SessionMessage).filter(
-                SessionMessage.session_id == ctx.session_id,
-                SessionMessage.message_key == key,
-                SessionMessage.deleted == False).order_by(
-                    SessionMessage.updated_at.desc()).limit(limit).all()
-            return [Message(content=item.message_value) for item in session_messages][::-1]
+            with self._session_scope() as session:
+                session_messages = session.query(SessionMessage).filter(
+                    SessionMessage.session_id == ctx.session_id,
+                    SessionMessage.message_key == key,
+                    SessionMessage.deleted == False).order_by(
+                        SessionMessage.updated_at.desc()).limit(limit).all()
+                return [Message(content=item.message_value) for item in session_messages][::-1]
 
     def append(self, message_dict: Dict[str, Message]) -> None:
         """
@@ -162,19 +223,21 @@ class UserSession(object):
             None
         """
         ctx = get_context()
+        if not ctx.session_vars_dict:
+            return
         try:
-            for key, message_value in ctx.session_vars_dict.items():
-                message = SessionMessage(
-                    session_id=ctx.session_id,
-                    request_id=ctx.request_id,
-                    message_key=key,
-                    message_value=json.loads(message_value.json(exclude_none=True)),
-                    created_at=datetime.datetime.now(),
-                    updated_at=datetime.datetime.now())
-                self._db_session.add(message)
-                self._db_session.commit()
+            # 本轮数据在同一个事务中保存
+            with self._session_scope() as session:
+                for key, message_value in ctx.session_vars_dict.items():
+                    message = SessionMessage(
+                        session_id=ctx.session_id,
+                        request_id=ctx.request_id,
+                        message_key=key,
+                        message_value=message_value.model_dump(mode="json", exclude_none=True),
+                        created_at=datetime.datetime.now(),
+                        updated_at=datetime.datetime.now())
+                    session.add(message)
             ctx.session_vars_dict = {}
         except Exception as e:
             logging.error(e)
-            self._db_session.rollback()
             raise e
\ No newline at end of file
@@ -11,13 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import os
+import json
 import time
-import itertools
-from typing import List
+import hashlib
+import tempfile
+import threading
+from typing import List, Optional
 from urllib.parse import urlparse
-from appbuilder.core._client import HTTPClient
+from appbuilder.core._client import HTTPClient, _env_float
 from appbuilder.core._exception import TypeNotSupportedException, ModelNotSupportedException
-from appbuilder.utils.model_util import GetModelListRequest, Models, RemoteModelCollector
+from appbuilder.utils.model_util import Models, ModelData, RemoteModelCollector
+from appbuilder.utils.logger_util import logger
 from functools import lru_cache
 
 
@@ -42,13 +47,13 @@ def get_model_list(secret_key: str = "", api_type_filter: List[str] = [], is_ava
     api_type_set = {"chat", "completions", "embeddings", "text2image"}
     if api_type_filter and not set(api_type_filter).issubset(api_type_set):
         raise TypeNotSupportedException(f"api_type_filter only support {api_type_set}")
-    request = GetModelListRequest()
-    request.apiTypefilter = api_type_filter
-    model = Models(secret_key=secret_key)
-    response = model.list(request)
+    # 模型列表来自进程级共享的ModelCatalog, 按apiType在本地过滤, 不再每次调用都请求网关
+    model_list = ModelCatalog().get(Models(secret_key=secret_key).http_client).model_list
     models = []
 
-    for model in itertools.chain(response.result.common, response.result.custom):
+    for model in model_list:
+        if api_type_filter and model.apiType not in api_type_filter:
+            continue
         if is_available and (model.chargeStatus not in ["OPENED", "FREE"] or
                              not any(version.serviceStatus == "Done" for version in model.versionList)):
             continue
@@ -92,36 +97,231 @@ def ttl_lru_cache(seconds_to_live: int, maxsize: int = 128):
 
 
 class ModelInfo:
-    """ 模型信息类 """
+    """ 模型信息类, 按模型名称建立索引, 查询为O(1) """
 
-    def __init__(self, client: HTTPClient):
-        """根据模型名称获取并初始化模型信息"""
+    def __init__(self, client: HTTPClient, model_list: Optional[List[ModelData]] = None):
+        """根据模型名称获取并初始化模型信息, 未传入model_list时从远程拉取模型列表"""
         self.client = client
-        response = Models(client).list()
-        self.model_list = [*response.result.common, *response.result.custom]
+        if model_list is None:
+            response = Models(client).list()
+            model_list = [*response.result.common, *response.result.custom]
+        self.model_list = model_list
+        self._models = {}
+        for model in model_list:
+            # 与按顺序查找的结果保持一致, 同名时取第一个
+            self._models.setdefault(model.name, model)
+
+    def _get_model(self, model_name: str) -> ModelData:
+        origin_name = RemoteModelCollector().get_remote_name_by_short_name(model_name)
+        model = self._models.get(origin_name or model_name)
+        if model is None:
+            raise ModelNotSupportedException(f"Model[{model_name}] not available! "
+                                             f"You can query available models through: appbuilder.get_model_list()")
+        return model
 
     def get_model_url(self, model_name: str) -> str:
         """获取模型在工作台网关的请求url"""
-        short_name = model_name
-        remote_model_name_collector = RemoteModelCollector()
-        origin_name = remote_model_name_collector.get_remote_name_by_short_name(short_name)
-        if not origin_name:
-            origin_name = short_name
-        for model in self.model_list:
-            if model.name == origin_name:
-                return convert_cloudhub_url(self.client, model.url)
-        raise ModelNotSupportedException(f"Model[{model_name}] not available! "
-                                         f"You can query available models through: appbuilder.get_model_list()")
+        return convert_cloudhub_url(self.client, self._get_model(model_name).url)
 
     def get_model_type(self, model_name: str) -> str:
         """获取模型类型"""
-        short_name = model_name
-        remote_model_name_collector = RemoteModelCollector()
-        origin_name = remote_model_name_collector.get_remote_name_by_short_name(short_name)
-        if not origin_name:
-            origin_name = short_name
-        for model in self.model_list:
-            if model.name == origin_name:
-                return model.apiType
-        raise ModelNotSupportedException(f"Model[{model_name}] not available! "
-                                         f"You can query available models through: appbuilder.get_model_list()")
+        return self._get_model(model_name).apiType
+
+
+class _CatalogEntry(object):
+    """ 某一组(secret_key, gateway)对应的模型目录 """
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.lock = threading.Lock()
+        self.model_info = None
+        self.loaded_at = 0.0
+        self.etag = None
+        self.last_modified = None
+        # 从磁盘预热的数据需要在后台向网关确认一次
+        self.validated = True
+        self.refreshing = False
+
+
+class ModelCatalog(object):
+    r"""进程级共享的模型目录, 是一个全局单例.
+
+    相同(secret_key, gateway)的组件共享同一份模型列表, 只在首次使用时拉取一次。超过refresh_interval秒
+    (环境变量APPBUILDER_MODEL_CATALOG_REFRESH_INTERVAL, 默认3600)后在后台线程刷新, 刷新期间继续使用旧数据,
+    刷新失败时保留旧数据。刷新时携带上一次返回的ETag/Last-Modified, 网关返回304时只更新时间, 不重新传输列表。
+
+    设置persist_path(环境变量APPBUILDER_MODEL_CATALOG_PATH)后模型列表会持久化到磁盘。进程重启后, 未超过
+    ttl秒(环境变量APPBUILDER_MODEL_CATALOG_TTL, 默认7天)的数据直接使用, 并在后台向网关校验一次, 组件初始化
+    不需要等待远程请求; 超过ttl的数据需要先完成一次条件请求再使用。
+
+    Examples:
+
+        .. code-block:: python
+
+            from appbuilder.core.utils import ModelCatalog
+
+            catalog = ModelCatalog()
+            catalog.persist_path = "/tmp/appbuilder_models.json"
+            model_info = catalog.get(client)
+            print(model_info.get_model_url("eb-4"))
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        """
+        单例模式
+        """
+        if cls._instance is None:
+            cls._instance = object.__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.refresh_interval = _env_float("APPBUILDER_MODEL_CATALOG_REFRESH_INTERVAL", 60 * 60)
+        self.ttl = _env_float("APPBUILDER_MODEL_CATALOG_TTL", 7 * 24 * 60 * 60)
+        self.persist_path = os.getenv("APPBUILDER_MODEL_CATALOG_PATH") or None
+
+    def _entry(self, client: HTTPClient) -> _CatalogEntry:
+        key = (client.secret_key, client.gateway)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _CatalogEntry(key))
+        return entry
+
+    def is_loaded(self, client: HTTPClient) -> bool:
+        r"""client所用凭证对应的模型信息是否已经加载, 未加载时get会同步拉取"""
+        entry = self._entries.get((client.secret_key, client.gateway))
+        return entry is not None and entry.model_info is not None
+
+    def get(self, client: HTTPClient) -> ModelInfo:
+        r"""获取client所用凭证对应的模型信息, 首次调用时同步拉取或从磁盘加载, 之后只在过期时触发后台刷新.
+
+            参数:
+                client(obj:`HTTPClient`): 客户端实例.
+            返回：
+                obj:`ModelInfo`
+        """
+        entry = self._entry(client)
+        if entry.model_info is None:
+            with entry.lock:
+                if entry.model_info is None:
+                    self._load(entry, client)
+        if (not entry.validated or time.time() - entry.loaded_at >= self.refresh_interval) \
+                and not entry.refreshing:
+            with entry.lock:
+                if entry.refreshing:
+                    return entry.model_info
+                entry.refreshing = True
+            threading.Thread(target=self._background_refresh, args=(entry, client),
+                             name="appbuilder-model-catalog", daemon=True).start()
+        return entry.model_info
+
+    def refresh(self, client: HTTPClient) -> ModelInfo:
+        r"""立即向网关确认并更新client所用凭证对应的模型信息"""
+        entry = self._entry(client)
+        with entry.lock:
+            self._fetch(entry, client)
+        return entry.model_info
+
+    def clear(self):
+        r"""清空内存中的模型目录, 不删除持久化文件"""
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, entry: _CatalogEntry, client: HTTPClient):
+        persisted = self._read_persisted(entry.key)
+        if persisted is None:
+            self._fetch(entry, client)
+            return
+        model_info = ModelInfo(client, persisted["models"])
+        entry.etag = persisted.get("etag")
+        entry.last_modified = persisted.get("last_modified")
+        if time.time() - persisted["loaded_at"] >= self.ttl:
+            # 过期的数据只用于条件请求, 网关确认未变化后才使用
+            self._fetch(entry, client, model_info)
+            return
+        entry.model_info = model_info
+        entry.loaded_at = persisted["loaded_at"]
+        entry.validated = False
+
+    def _fetch(self, entry: _CatalogEntry, client: HTTPClient, cached: Optional[ModelInfo] = None):
+        cached = entry.model_info or cached
+        etag, last_modified = (entry.etag, entry.last_modified) if cached is not None else (None, None)
+        response, validators = Models(client).list_if_modified(etag=etag, last_modified=last_modified)
+        if response is not None:
+            cached = ModelInfo(client, [*response.result.common, *response.result.custom])
+        entry.model_info = cached
+        entry.etag = validators["etag"]
+        entry.last_modified = validators["last_modified"]
+        entry.loaded_at = time.time()
+        entry.validated = True
+        self._write_persisted(entry)
+
+    def _background_refresh(self, entry: _CatalogEntry, client: HTTPClient):
+        try:
+            with entry.lock:
+                self._fetch(entry, client)
+        except Exception as e:
+            logger.warning("failed to refresh model catalog, keep using the cached one: {}".format(e))
+            # 失败后等待下一个刷新周期再重试, 避免每次请求都触发刷新
+            entry.loaded_at = time.time()
+            entry.validated = True
+        finally:
+            entry.refreshing = False
+
+    @staticmethod
+    def _persist_key(key: tuple) -> str:
+        # 持久化文件中不保存明文token
+        return hashlib.sha256("\n".join(key).encode("utf-8")).hexdigest()
+
+    def _read_all_persisted(self, path: str) -> dict:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_persisted(self, key: tuple) -> Optional[dict]:
+        path = self.persist_path
+        if not path:
+            return None
+        item = self._read_all_persisted(path).get(self._persist_key(key))
+        if not item:
+            return None
+        try:
+            return dict(item, models=[ModelData(model) for model in item["models"]])
+        except Exception as e:
+            logger.warning("failed to load persisted model catalog: {}".format(e))
+            return None
+
+    def _write_persisted(self, entry: _CatalogEntry):
+        path = self.persist_path
+        if not path:
+            return
+        try:
+            with self._lock:
+                data = self._read_all_persisted(path)
+                data[self._persist_key(entry.key)] = {
+                    "loaded_at": entry.loaded_at,
+                    "etag": entry.etag,
+                    "last_modified": entry.last_modified,
+                    "models": [ModelData.to_dict(model) for model in entry.model_info.model_list],
+                }
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+        except Exception as e:
+            logger.warning("failed to persist model catalog: {}".format(e))
@@ -0,0 +1,155 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder import AdmissionConfig, AdmissionRejectedException
+from appbuilder.core._admission import AdmissionController
+from appbuilder.core.component import Component
+from appbuilder.core.message import Message
+
+
+class _SlowComponent(Component):
+    """流式输出时每个数据块间隔delay秒"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def run(self, message, stream=False):
+        def gen():
+            for char in message.content:
+                time.sleep(self.delay)
+                yield char
+        return Message(gen()) if stream else Message(message.content)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def _rejected(self, reason):
+        metric = appbuilder.MetricsRegistry().get("appbuilder_agent_rejected_total")
+        return metric.get(reason=reason) if metric is not None else 0
+
+    def test_queue(self):
+        """ 测试超过max_inflight的请求排队, 队列满时拒绝, 名额按顺序转交 """
+        controller = AdmissionController(AdmissionConfig(max_inflight=2, max_queue_size=1, queue_timeout=5))
+        first, second = controller.acquire(), controller.acquire()
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(controller.acquire()))
+        waiter.start()
+        while controller.queue_depth == 0:
+            time.sleep(0.01)
+
+        rejected = self._rejected("queue_full")
+        with self.assertRaises(AdmissionRejectedException) as ctx:
+            controller.acquire()
+        self.assertEqual(ctx.exception.code, 503)
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+        self.assertEqual(self._rejected("queue_full") - rejected, 1)
+
+        first.release()
+        first.release()
+        waiter.join(1)
+        self.assertEqual(len(admitted), 1)
+        self.assertEqual((controller.inflight, controller.queue_depth), (2, 0))
+        second.release()
+        admitted[0].release()
+        self.assertEqual(controller.inflight, 0)
+
+    def test_deadline(self):
+        """ 测试排队超时, 以及预计等待时间超过截止时间时直接拒绝 """
+        controller = AdmissionController(AdmissionConfig(max_inflight=1, queue_timeout=0.1))
+        admission = controller.acquire()
+        start = time.monotonic()
+        with self.assertRaises(AdmissionRejectedException):
+            controller.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        self.assertEqual(controller.queue_depth, 0)
+        time.sleep(0.2)
+        admission.release()
+
+        # 平均处理耗时约0.3秒, 剩余0.1秒的请求不需要排队
+        admission = controller.acquire()
+        start = time.monotonic()
+        with self.assertRaises(AdmissionRejectedException) as ctx:
+            controller.acquire(timeout=0.1)
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual(ctx.exception.retry_after, 1)
+        admission.release()
+
+    def test_session_limit(self):
+        """ 测试单个会话的并发数限制 """
+        controller = AdmissionController(AdmissionConfig(max_session_inflight=1))
+        admission = controller.acquire("s1")
+        with self.assertRaises(AdmissionRejectedException) as ctx:
+            controller.acquire("s1")
+        self.assertEqual(ctx.exception.code, 429)
+        controller.acquire("s2").release()
+        admission.release()
+        controller.acquire("s1").release()
+
+    def test_async(self):
+        """ 测试异步排队不阻塞事件循环, 取消排队的请求不占用名额 """
+        controller = AdmissionController(AdmissionConfig(max_inflight=1, queue_timeout=5))
+
+        async def run():
+            admission = await controller.aacquire()
+            waiter = asyncio.ensure_future(controller.aacquire())
+            cancelled = asyncio.ensure_future(controller.aacquire())
+            await asyncio.sleep(0.05)
+            self.assertEqual(controller.queue_depth, 2)
+            cancelled.cancel()
+            await asyncio.sleep(0.01)
+            self.assertEqual(controller.queue_depth, 1)
+            admission.release()
+            (await waiter).release()
+            self.assertEqual((controller.inflight, controller.queue_depth), (0, 0))
+
+        asyncio.run(run())
+
+
+class TestAgentRuntimeAdmission(unittest.TestCase):
+    def setUp(self):
+        self.env = mock.patch.dict(os.environ, {"APPBUILDER_TOKEN": "mock-token"})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def test_flask_overload(self):
+        """ 测试流式请求在输出结束前占用名额, 过载时返回503与Retry-After """
+        agent = appbuilder.AgentRuntime(component=_SlowComponent(0.1),
+                                        admission_config=AdmissionConfig(max_inflight=1, max_queue_size=0))
+        client = agent.create_flask_app().test_client()
+        response = client.post("/chat", json={"message": "你好", "stream": True})
+        chunks = response.response
+        next(chunks)
+
+        rejected = client.post("/chat", json={"message": "你好"})
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.json["code"], 503)
+        self.assertEqual(rejected.headers["Retry-After"], "1")
+
+        list(chunks)
+        response.close()
+        self.assertEqual(agent.admission_controller.inflight, 0)
+        self.assertEqual(client.post("/chat", json={"message": "你好"}).json["code"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
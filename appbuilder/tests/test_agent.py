@@ -1,7 +1,10 @@
 import unittest
 import pydantic
 import os
+import copy
+import json
 import appbuilder
+from appbuilder.core.agent import _SSEEncoder
 
 
 class TestAgentRuntime(unittest.TestCase):
@@ -53,5 +56,53 @@ class TestAgentRuntime(unittest.TestCase):
         for it in answer.content:
             self.assertIs(type(it), str)
 
+
+class TestSSEEncoder(unittest.TestCase):
+    def _legacy_encode(self, session_id, stream_message, content, is_completion):
+        result = copy.deepcopy(stream_message)
+        result.content = content
+        return "data: " + json.dumps({
+            "code": 0, "message": "",
+            "result": {
+                "session_id": session_id,
+                "is_completion": is_completion,
+                "answer_message": json.loads(result.json(exclude_none=True))
+            }
+        }, ensure_ascii=False) + "\n\n"
+
+    def test_same_as_message_json(self):
+        """ 测试编码结果与逐块序列化整个Message相同 """
+        messages = [appbuilder.Message(iter([])),
+                    appbuilder.Message(iter([]), name=None, extra={"key": "值"})]
+        for stream_message in messages:
+            encoder = _SSEEncoder('session"1', stream_message)
+            for content, is_completion in [("你好", False), (None, True), ({"list": [1, 2.5, "a"]}, True)]:
+                self.assertEqual(encoder.encode(content, is_completion),
+                                 self._legacy_encode('session"1', stream_message, content, is_completion))
+
+    def test_fields_changed_during_iteration(self):
+        """ 测试迭代过程中extra与token_usage变化时, 每帧按收到数据块时的字段编码 """
+        stream_message = appbuilder.Message(None, extra={})
+
+        def content():
+            yield "你"
+            stream_message.extra["search"] = ["a"]
+            yield "好"
+            stream_message.token_usage = {"total_tokens": 3}
+            yield "！"
+
+        stream_message.content = content()
+        encoder = _SSEEncoder("s1", stream_message)
+        frames, expected = [], []
+        for chunk in stream_message.content:
+            snapshot = stream_message.model_copy(update={"content": None})
+            frames.append(encoder.frame(encoder.answer_message(chunk)))
+            expected.append(self._legacy_encode("s1", snapshot, chunk, False))
+        self.assertEqual(frames, expected)
+        answers = [json.loads(frame[len("data: "):])["result"]["answer_message"] for frame in frames]
+        self.assertEqual([answer["extra"] for answer in answers], [{}, {"search": ["a"]}, {"search": ["a"]}])
+        self.assertEqual([answer.get("token_usage") for answer in answers], [None, None, {"total_tokens": 3}])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,278 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import json
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder.core.component import Component, _request_credential
+from appbuilder.core.message import Message
+from appbuilder.utils.mock_gateway import MockGateway
+
+try:
+    import httpx
+    from starlette.testclient import TestClient
+except ImportError:
+    httpx = None
+
+
+class _EchoComponent(Component):
+    """只实现同步run的组件"""
+
+    def run(self, message, stream=False):
+        if stream:
+            return Message(iter(list(message.content)))
+        return Message(message.content)
+
+
+class _TokenComponent(Component):
+    """流式输出当前请求使用的鉴权信息"""
+
+    def __init__(self):
+        super().__init__(lazy_certification=True)
+
+    def run(self, message, stream=False):
+        def gen():
+            for _ in range(3):
+                time.sleep(0.05)
+                yield self.http_client.secret_key
+        return Message(gen())
+
+
+class _UsageComponent(Component):
+    """流式输出过程中更新token_usage"""
+
+    def run(self, message, stream=False):
+        answer = Message(None, token_usage={})
+
+        def gen():
+            for i, char in enumerate(message.content):
+                answer.token_usage = {"completion_tokens": i + 1}
+                yield char
+        answer.content = gen()
+        return answer
+
+
+def _parse_sse(text):
+    return [json.loads(line[len("data: "):]) for line in text.split("\n\n") if line.startswith("data: ")]
+
+
+@unittest.skipIf(httpx is None, "starlette or httpx is not installed")
+class TestAgentRuntimeASGI(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway(stream_chunks=4, stream_interval=0.1).start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def test_blocking_and_stream(self):
+        """ 测试非流式与流式接口与Flask应用的返回格式一致 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent())
+        client = TestClient(agent.create_asgi_app())
+        response = client.post("/chat", json={"message": "你好", "session_id": "s1"})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["code"], 0)
+        self.assertEqual(body["result"]["session_id"], "s1")
+        self.assertEqual(body["result"]["answer_message"]["content"], "你好")
+
+        response = client.post("/chat", json={"message": "你好", "stream": True})
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        events = _parse_sse(response.text)
+        self.assertEqual([e["result"]["answer_message"]["content"] for e in events], ["你", "好"])
+        self.assertEqual([e["result"]["is_completion"] for e in events], [False, True])
+        self.assertEqual(len({e["result"]["session_id"] for e in events}), 1)
+
+    def test_stream_fields_changed(self):
+        """ 测试流式输出过程中Message的字段变化时, 每帧带上收到数据块时的字段 """
+        client = TestClient(appbuilder.AgentRuntime(component=_UsageComponent()).create_asgi_app())
+        events = _parse_sse(client.post("/chat", json={"message": "你好啊", "stream": True}).text)
+        self.assertEqual([e["result"]["answer_message"]["token_usage"] for e in events],
+                         [{"completion_tokens": i} for i in (1, 2, 3)])
+
+    def test_bad_request(self):
+        """ 测试参数错误 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent())
+        client = TestClient(agent.create_asgi_app())
+        for data in [{}, {"message": "你好", "stream": "true"}, {"message": "你好", "session_id": 1}]:
+            response = client.post("/chat", json=data)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["code"], 400)
+
+        component = appbuilder.Playground(prompt_template="{query}", model="eb-4", lazy_certification=True)
+        client = TestClient(appbuilder.AgentRuntime(component=component).create_asgi_app())
+        response = client.post("/chat", json={"message": {"query": "你好"}})
+        self.assertEqual(response.status_code, 400)
+        response = client.post("/chat", json={"message": {"query": "你好"}},
+                               headers={"X-Appbuilder-Token": "mock-token"})
+        self.assertEqual(response.json()["result"]["answer_message"]["content"], "mock answer: 你好")
+
+    def test_endpoints(self):
+        """ 测试/metrics、/healthz与/readyz接口 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent())
+        client = TestClient(agent.create_asgi_app())
+        client.post("/chat", json={"message": "你好", "stream": True})
+        response = client.get("/metrics")
+        self.assertIn("appbuilder_agent_time_to_first_chunk_seconds_count", response.text)
+        self.assertEqual(client.get("/healthz").json()["result"]["status"], "ok")
+        response = client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["result"]["active_streams"], 0)
+
+    def test_overload(self):
+        """ 测试过载时返回503与Retry-After, 流式请求结束后归还名额 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent(),
+                                        admission_config=appbuilder.AdmissionConfig(max_inflight=1, max_queue_size=0))
+        app = agent.create_asgi_app()
+
+        async def run():
+            admission = await agent.admission_controller.aacquire()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                rejected = await client.post("/chat", json={"message": "你好", "stream": True})
+                admission.release()
+                accepted = await client.post("/chat", json={"message": "你好", "stream": True})
+            return rejected, accepted
+
+        rejected, accepted = asyncio.run(run())
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.headers["retry-after"], "1")
+        self.assertEqual(len(_parse_sse(accepted.text)), 2)
+        self.assertEqual(agent.admission_controller.inflight, 0)
+
+    def test_disconnect_before_body(self):
+        """ 测试客户端在流式输出开始前断开时归还名额 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent(),
+                                        admission_config=appbuilder.AdmissionConfig(max_inflight=1, max_queue_size=0))
+        app = agent.create_asgi_app()
+        body = json.dumps({"message": "你好", "stream": True}).encode()
+        scope = {"type": "http", "method": "POST", "path": "/chat", "headers": [(b"content-type", b"application/json")],
+                 "query_string": b"", "root_path": "", "scheme": "http", "server": ("test", 80), "http_version": "1.1"}
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(10)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client disconnected")
+
+        async def run():
+            try:
+                await app(scope, receive, send)
+            except Exception:
+                pass
+
+        asyncio.run(run())
+        self.assertEqual(agent.admission_controller.inflight, 0)
+
+    def test_concurrent_stream(self):
+        """ 测试异步组件的流式连接并发执行, 不为每个连接占用线程 """
+        component = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        app = appbuilder.AgentRuntime(component=component).create_asgi_app()
+
+        async def chat(client, i):
+            response = await client.post("/chat", json={"message": {"query": str(i)}, "stream": True})
+            return "".join(e["result"]["answer_message"]["content"] for e in _parse_sse(response.text))
+
+        async def run(count):
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    await chat(client, 0)
+                    threads = threading.active_count()
+                    start = time.monotonic()
+                    answers = await asyncio.gather(*[chat(client, i) for i in range(count)])
+                    elapsed, new_threads = time.monotonic() - start, threading.active_count() - threads
+                session = component.async_http_client.session
+            return answers, elapsed, new_threads, session
+
+        answers, elapsed, new_threads, session = asyncio.run(run(100))
+        # 应用退出时关闭了组件的aiohttp session
+        self.assertTrue(session.closed)
+        self.assertEqual(answers, ["mock answer: {}".format(i) for i in range(100)])
+        # 每个流式响应耗时约0.4秒, 串行需要40秒, 并发度受连接池大小限制
+        self.assertLess(elapsed, 10)
+        # 只有事件循环默认线程池中的线程, 数量与连接数无关
+        self.assertLess(new_threads, 40)
+
+    def test_request_credential(self):
+        """ 测试并发请求各自使用请求头中的AppbuilderToken, 不修改共享的组件 """
+        component = _TokenComponent()
+        app = appbuilder.AgentRuntime(component=component).create_asgi_app()
+
+        async def chat(client, i):
+            response = await client.post("/chat", json={"message": "你好", "stream": True},
+                                         headers={"X-Appbuilder-Token": "token-{}".format(i)})
+            return [e["result"]["answer_message"]["content"] for e in _parse_sse(response.text)]
+
+        async def run(count):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*[chat(client, i) for i in range(count)])
+
+        answers = asyncio.run(run(10))
+        self.assertEqual(answers, [["Bearer token-{}".format(i)] * 3 for i in range(10)])
+        self.assertIsNone(component.secret_key)
+        self.assertIsNone(component._http_client)
+
+    def test_request_credential_reset(self):
+        """ 测试请求结束后恢复鉴权信息, 不会泄漏到同一个线程或任务处理的下一个请求 """
+        agent = appbuilder.AgentRuntime(component=_TokenComponent())
+        headers = {"X-Appbuilder-Token": "reset-token"}
+        client = agent.create_flask_app().test_client()
+        for stream in (False, True):
+            response = client.post("/chat", json={"message": "你好", "stream": stream}, headers=headers)
+            response.get_data()
+            response.close()
+            self.assertIsNone(_request_credential.get())
+
+        app = agent.create_asgi_app()
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for stream in (False, True):
+                    response = await client.post("/chat", json={"message": "你好", "stream": stream}, headers=headers)
+                    # ASGITransport在当前任务中执行应用, 未恢复时鉴权信息会留在当前上下文中
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIsNone(_request_credential.get())
+
+        asyncio.run(run())
+
+    def test_override_chat(self):
+        """ 测试重写AgentRuntime.chat时ASGI应用同样使用重写的chat """
+        class _Runtime(appbuilder.AgentRuntime):
+            def chat(self, message, stream=False, **args):
+                return Message("chat: " + message.content)
+
+        client = TestClient(_Runtime(component=_EchoComponent()).create_asgi_app())
+        response = client.post("/chat", json={"message": "你好"})
+        self.assertEqual(response.json()["result"]["answer_message"]["content"], "chat: 你好")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder import MetricsRegistry, AdmissionConfig
+from appbuilder.core.component import Component
+from appbuilder.core.message import Message
+
+try:
+    from starlette.testclient import TestClient
+except ImportError:
+    TestClient = None
+
+
+class _EchoComponent(Component):
+    """流式输出时逐字返回, 输入为"error"时抛出异常"""
+
+    def run(self, message, stream=False):
+        if message.content == "error":
+            raise appbuilder.AppBuilderServerException(code=502, message="error")
+        if stream:
+            return Message(iter(list(message.content)))
+        return Message(message.content)
+
+
+class TestAgentRuntimeMetrics(unittest.TestCase):
+    def setUp(self):
+        self.env = mock.patch.dict(os.environ, {"APPBUILDER_TOKEN": "mock-token"})
+        self.env.start()
+        self.registry = MetricsRegistry()
+        self.registry.reset()
+        self.agent = appbuilder.AgentRuntime(component=_EchoComponent())
+        self.client = self.agent.create_flask_app().test_client()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def _value(self, name, labels=()):
+        return self.registry.snapshot()[name].get(labels)
+
+    def test_chat_metrics(self):
+        """ 测试对话接口自动记录请求数、耗时、首个数据块耗时、错误码与Session写入耗时 """
+        self.client.post("/chat", json={"message": "你好"})
+        response = self.client.post("/chat", json={"message": "你好", "stream": True})
+        self.assertEqual(len(response.get_data(as_text=True).split("\n\n")), 3)
+        self.client.post("/chat", json={"message": "error"})
+        self.client.post("/chat", json={})
+
+        self.assertEqual(self._value("appbuilder_agent_requests_total", ("false",)), 2)
+        self.assertEqual(self._value("appbuilder_agent_requests_total", ("true",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_request_duration_seconds", ("false",))["count"], 1)
+        self.assertEqual(self._value("appbuilder_agent_request_duration_seconds", ("true",))["count"], 1)
+        self.assertEqual(self._value("appbuilder_agent_time_to_first_chunk_seconds")["count"], 1)
+        self.assertEqual(self._value("appbuilder_agent_session_write_seconds")["count"], 2)
+        self.assertEqual(self._value("appbuilder_agent_errors_total", ("502",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_errors_total", ("400",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_active_streams"), 0)
+
+    @unittest.skipIf(TestClient is None, "starlette or httpx is not installed")
+    def test_asgi_chat_metrics(self):
+        """ 测试ASGI应用记录的指标与Flask应用相同, 组件出错时同样记录错误码 """
+        client = TestClient(self.agent.create_asgi_app())
+        client.post("/chat", json={"message": "你好"})
+        client.post("/chat", json={"message": "你好", "stream": True})
+        client.post("/chat", json={"message": "error"})
+        client.post("/chat", json={})
+
+        self.assertEqual(self._value("appbuilder_agent_requests_total", ("false",)), 2)
+        self.assertEqual(self._value("appbuilder_agent_requests_total", ("true",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_errors_total", ("502",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_errors_total", ("400",)), 1)
+        self.assertEqual(self._value("appbuilder_agent_active_streams"), 0)
+
+    def test_active_streams(self):
+        """ 测试流式输出期间记录进行中的流数量 """
+        response = self.client.post("/chat", json={"message": "你好", "stream": True})
+        chunks = response.response
+        next(chunks)
+        self.assertEqual(self._value("appbuilder_agent_active_streams"), 1)
+        self.assertEqual(self.agent.readiness()["active_streams"], 1)
+        list(chunks)
+        response.close()
+        self.assertEqual(self._value("appbuilder_agent_active_streams"), 0)
+
+    def test_endpoints(self):
+        """ 测试/metrics、/healthz与/readyz接口 """
+        self.client.post("/chat", json={"message": "你好"})
+        response = self.client.get("/metrics")
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        self.assertIn('appbuilder_agent_requests_total{stream="false"} 1', response.get_data(as_text=True))
+        self.assertEqual(self.client.get("/healthz").json["result"]["status"], "ok")
+        response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json["result"]["ready"])
+
+    def test_not_ready(self):
+        """ 测试排队已满或数据库不可用时未就绪 """
+        agent = appbuilder.AgentRuntime(component=_EchoComponent(),
+                                        admission_config=AdmissionConfig(max_inflight=1, max_queue_size=0))
+        client = agent.create_flask_app().test_client()
+        admission = agent.admission_controller.acquire()
+        response = client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json["result"]["inflight"], 1)
+        admission.release()
+        self.assertEqual(client.get("/readyz").status_code, 200)
+
+        with mock.patch.object(agent.user_session, "ping", side_effect=RuntimeError("unavailable")):
+            self.assertEqual(client.get("/readyz").status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,297 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import json
+import time
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import appbuilder
+from appbuilder.core._client import AsyncHTTPClient
+from appbuilder.core.component import Component
+from appbuilder.core.message import Message
+from appbuilder.core._completion_cache import CompletionCache
+from appbuilder.utils.mock_gateway import MockGateway
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+MODEL_LIST = {
+    "result": {
+        "common": [{
+            "name": "ERNIE-Bot 4.0",
+            "url": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro",
+            "apiType": "chat",
+            "chargeStatus": "OPENED",
+            "versionList": [{"serviceStatus": "Done"}],
+        }],
+        "custom": [],
+    }
+}
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    """本地网关，按路径返回固定结果"""
+
+    slow_once = set()
+    slow_once_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("X-Appbuilder-Authorization") != "Bearer test-token":
+            return self._reply(403, {"message": "forbidden"})
+        if self.path.endswith("/slow-once"):
+            # 同一X-Test-Id的第一个请求很慢, 之后的请求立即返回
+            with self.slow_once_lock:
+                first = self.headers.get("X-Test-Id") not in self.slow_once
+                self.slow_once.add(self.headers.get("X-Test-Id"))
+            if first:
+                time.sleep(1)
+            return self._reply(200, {"result": "ok"})
+        if self.path.endswith("/service/list"):
+            return self._reply(200, MODEL_LIST)
+        if "/embeddings/" in self.path:
+            texts = json.loads(body)["input"]
+            return self._reply(200, {"data": [{"embedding": [float(len(t))]} for t in texts]})
+        if "/api/llm/" in self.path:
+            query = json.loads(body)["query"]
+            return self._reply(200, {"answer": "echo:" + query, "usage": {"total_tokens": 1}})
+        return self._reply(404, {"message": "not found"})
+
+    def _reply(self, code, data):
+        payload = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Appbuilder-Request-Id", "test-request-id")
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _SyncComponent(Component):
+    """只实现同步run的组件"""
+
+    def run(self, message):
+        return Message(message.content * 2)
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class TestAsyncHTTPClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _GatewayHandler)
+        cls.gateway = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_post_and_check_response(self):
+        """ 测试异步请求结果可以复用同步的检查方法 """
+        async def _run():
+            client = AsyncHTTPClient("test-token", self.gateway)
+            response = await client.post(client.service_url("/v1/bce/wenxinworkshop/service/list"),
+                                         headers=client.auth_header(), json={})
+            client.check_response_header(response)
+            client.check_response_json(response.json())
+            self.assertEqual(client.response_request_id(response), "test-request-id")
+
+            response = await client.post(client.service_url("/v1/bce/wenxinworkshop/service/list"), json={})
+            with self.assertRaises(appbuilder.ForbiddenException):
+                client.check_response_header(response)
+            await client.close()
+
+        asyncio.run(_run())
+
+    def test_hedged_request(self):
+        """ 测试异步对冲请求使用最先返回的结果 """
+        async def _run():
+            client = AsyncHTTPClient("test-token", self.gateway)
+            headers = client.auth_header()
+            headers["X-Test-Id"] = "hedge"
+            start = time.monotonic()
+            response = await client.post(client.service_url("/v1/slow-once"), headers=headers, json={},
+                                         hedge=appbuilder.HedgePolicy(delay=0.1))
+            elapsed = time.monotonic() - start
+            await client.close()
+            return response, elapsed
+
+        response, elapsed = asyncio.run(_run())
+        self.assertEqual(response.json(), {"result": "ok"})
+        self.assertLess(elapsed, 0.8)
+
+    def test_hedged_request_fast_failure(self):
+        """ 测试异步请求在对冲延迟内失败时立即发送对冲请求 """
+        async def _run():
+            client = AsyncHTTPClient("test-token", self.gateway)
+            asend = client._asend
+            calls = []
+
+            async def _fail_once(*args, **kwargs):
+                calls.append(time.monotonic())
+                if len(calls) == 1:
+                    raise aiohttp.ClientConnectionError("connection reset")
+                return await asend(*args, **kwargs)
+
+            start = time.monotonic()
+            with mock.patch.object(client, "_asend", side_effect=_fail_once):
+                response = await client.post(client.service_url("/v1/bce/wenxinworkshop/service/list"),
+                                             headers=client.auth_header(), json={},
+                                             hedge=appbuilder.HedgePolicy(delay=5))
+            elapsed = time.monotonic() - start
+            await client.close()
+            return response, elapsed, len(calls)
+
+        response, elapsed, calls = asyncio.run(_run())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, 2)
+        self.assertLess(elapsed, 1)
+
+    def test_embedding_arun_and_abatch(self):
+        """ 测试Embedding原生异步调用 """
+        async def _run():
+            single = await embedding.arun(Message("abc"))
+            batch = await embedding.abatch(["a", "bb"] * 10)
+            await embedding.async_http_client.close()
+            return single, batch
+
+        with mock.patch.dict("os.environ", {"APPBUILDER_TOKEN": "test-token", "GATEWAY_URL": self.gateway}):
+            embedding = appbuilder.Embedding()
+            single, batch = asyncio.run(_run())
+        self.assertEqual(single.content, [3.0])
+        self.assertEqual(batch.content, [[1.0], [2.0]] * 10)
+
+    def test_completion_arun(self):
+        """ 测试LLM组件原生异步调用 """
+        play = appbuilder.Playground(prompt_template="你好，{name}", model="eb-4",
+                                     secret_key="test-token", gateway=self.gateway)
+
+        async def _run():
+            answers = await asyncio.gather(*[play.arun(Message({"name": str(i)})) for i in range(5)])
+            await play.async_http_client.close()
+            return answers
+
+        answers = asyncio.run(_run())
+        self.assertEqual([answer.content for answer in answers], ["echo:你好，{}".format(i) for i in range(5)])
+
+    def test_completion_arun_without_run(self):
+        """ 测试arun通过_build_request构造请求, 不执行同步的run; 只重写run的子类在线程池中执行run """
+        play = appbuilder.Playground(prompt_template="你好，{name}", model="eb-4",
+                                     secret_key="test-token", gateway=self.gateway)
+        with mock.patch.object(appbuilder.Playground, "run", side_effect=AssertionError("run called")):
+            answer = asyncio.run(play.arun(Message({"name": "arun"})))
+        self.assertEqual(answer.content, "echo:你好，arun")
+
+        class _Catching(appbuilder.Playground):
+            def run(self, message, **kwargs):
+                try:
+                    return super().run(message, **kwargs)
+                except Exception:
+                    return Message("swallowed")
+
+        catching = _Catching(prompt_template="你好，{name}", model="eb-4",
+                             secret_key="test-token", gateway=self.gateway)
+        answer = asyncio.run(catching.arun(Message({"name": "sub"})))
+        self.assertEqual(answer.content, "echo:你好，sub")
+
+    def test_session_closed_with_loop(self):
+        """ 测试每个事件循环使用独立的session, 事件循环结束时关闭, 不需要手动close """
+        play = appbuilder.Playground(prompt_template="你好，{name}", model="eb-4",
+                                     secret_key="test-token", gateway=self.gateway)
+
+        async def _run(i):
+            answer = await play.arun(Message({"name": str(i)}))
+            return answer, play.async_http_client.session
+
+        sessions = []
+        for i in range(3):
+            answer, session = asyncio.run(_run(i))
+            self.assertEqual(answer.content, "echo:你好，{}".format(i))
+            sessions.append(session)
+        self.assertEqual(len(set(map(id, sessions))), 3)
+        self.assertTrue(all(session.closed for session in sessions))
+        self.assertEqual(play.async_http_client._sessions, {})
+
+        async def _close():
+            await play.arun(Message({"name": "close"}))
+            session = play.async_http_client.session
+            await play.aclose()
+            return session
+
+        self.assertTrue(asyncio.run(_close()).closed)
+
+    def test_completion_arun_stream(self):
+        """ 测试LLM组件异步流式调用, 多个流在同一个事件循环中并发读取 """
+        with MockGateway(stream_chunks=4, stream_interval=0.01) as gateway:
+            play = appbuilder.Playground(prompt_template="{name}", model="eb-4",
+                                         secret_key="test-token", gateway=gateway.url)
+
+            async def _consume(i):
+                msg = await play.arun(Message({"name": "流式{}".format(i)}), stream=True)
+                chunks = [chunk async for chunk in msg.content]
+                return chunks, msg
+
+            async def _run():
+                results = await asyncio.gather(*[_consume(i) for i in range(20)])
+                await play.async_http_client.close()
+                return results
+
+            results = asyncio.run(_run())
+        for i, (chunks, msg) in enumerate(results):
+            self.assertEqual(len(chunks), 4)
+            self.assertEqual("".join(chunks), "mock answer: 流式{}".format(i))
+            self.assertEqual(msg.content, "".join(chunks))
+            self.assertTrue(msg.token_usage)
+
+    def test_completion_arun_stream_cache(self):
+        """ 测试异步流式响应写入缓存与重放 """
+        with MockGateway() as gateway:
+            play = appbuilder.Playground(prompt_template="{name}", model="eb-4",
+                                         secret_key="test-token", gateway=gateway.url)
+            play.completion_cache = CompletionCache()
+
+            async def _run():
+                answers = []
+                for _ in range(2):
+                    msg = await play.arun(Message({"name": "缓存"}), stream=True)
+                    answers.append([chunk async for chunk in msg.content])
+                await play.async_http_client.close()
+                return answers
+
+            first, second = asyncio.run(_run())
+            self.assertEqual(first, second)
+            self.assertEqual(gateway.request_counts()["completion"], 1)
+
+    def test_default_arun_and_abatch(self):
+        """ 测试只实现run的组件默认的arun、abatch """
+        component = _SyncComponent(lazy_certification=True)
+        self.assertEqual(asyncio.run(component.arun(Message("a"))).content, "aa")
+        results = asyncio.run(component.abatch([Message("a"), Message("b")], max_concurrency=1))
+        self.assertEqual([result.content for result in results], ["aa", "bb"])
+        with self.assertRaises(ValueError):
+            asyncio.run(component.abatch([Message("a")], max_concurrency=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
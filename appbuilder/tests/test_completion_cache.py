@@ -0,0 +1,169 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder import CompletionCache, MemoryCacheBackend, SQLiteCacheBackend, DiskCacheBackend
+from appbuilder.core._completion_cache import CacheBackend
+from appbuilder.utils.mock_gateway import MockGateway
+
+
+class TestCompletionCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        self.play.completion_cache = CompletionCache()
+
+    def _completions(self):
+        return self.gateway.request_counts().get("completion", 0)
+
+    def test_blocking_hit(self):
+        """ 测试相同输入命中缓存, 不同参数不命中 """
+        before = self._completions()
+        first = self.play(appbuilder.Message({"query": "你好"}))
+        second = self.play(appbuilder.Message({"query": " 你好 "}))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.token_usage, second.token_usage)
+        self.assertEqual(self._completions() - before, 1)
+
+        self.play(appbuilder.Message({"query": "你好"}), temperature=1e-10, top_p=0.5)
+        self.assertEqual(self._completions() - before, 2)
+        stats = self.play.completion_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["writes"]), (1, 2, 2))
+
+    def test_sampling_not_cached(self):
+        """ 测试采样请求默认不读写缓存, 设置cache_sampling后缓存 """
+        before = self._completions()
+        for _ in range(2):
+            self.play(appbuilder.Message({"query": "采样"}), temperature=0.8, top_p=0.8)
+        self.assertEqual(self._completions() - before, 2)
+        stats = self.play.completion_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["writes"]), (0, 0, 0))
+
+        self.play.completion_cache = CompletionCache(cache_sampling=True)
+        for _ in range(2):
+            self.play(appbuilder.Message({"query": "采样"}), temperature=0.8, top_p=0.8)
+        self.assertEqual(self._completions() - before, 3)
+
+    def test_stream_replay(self):
+        """ 测试流式响应读取完后写入缓存, 命中时重放数据块 """
+        before = self._completions()
+        first = self.play(appbuilder.Message({"query": "流式"}), stream=True)
+        chunks = list(first.content)
+        second = self.play(appbuilder.Message({"query": "流式"}), stream=True)
+        self.assertEqual(list(second.content), chunks)
+        self.assertEqual(second.content, "".join(chunks))
+        self.assertEqual(second.token_usage, first.token_usage)
+        self.assertEqual(self._completions() - before, 1)
+
+    def test_partial_stream_not_cached(self):
+        """ 测试未读完的流式响应不写入缓存 """
+        msg = self.play(appbuilder.Message({"query": "读一半"}), stream=True)
+        next(iter(msg.content))
+        self.assertEqual(self.play.completion_cache.stats()["writes"], 0)
+
+    def test_arun_hit(self):
+        """ 测试异步调用使用同一份缓存 """
+        before = self._completions()
+        self.play(appbuilder.Message({"query": "异步"}))
+        msg = asyncio.run(self.play.arun(appbuilder.Message({"query": "异步"})))
+        self.assertEqual(msg.content, "mock answer: 异步")
+        self.assertEqual(self._completions() - before, 1)
+
+    def test_server_error_not_cached(self):
+        """ 测试错误响应不写入缓存 """
+        self.gateway.inject_error("/api/llm/", status=500, times=1)
+        with self.assertRaises(appbuilder.AppBuilderServerException):
+            self.play(appbuilder.Message({"query": "错误"}))
+        self.assertEqual(self.play(appbuilder.Message({"query": "错误"})).content, "mock answer: 错误")
+
+
+class TestCacheBackend(unittest.TestCase):
+    def _check_backend(self, backend):
+        backend.set("a", "1")
+        self.assertEqual(backend.get("a"), "1")
+        self.assertIsNone(backend.get("b"))
+        backend.set("b", "2", ttl=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(backend.get("b"))
+        backend.delete("a")
+        self.assertIsNone(backend.get("a"))
+        backend.set("c", "3")
+        backend.clear()
+        self.assertIsNone(backend.get("c"))
+
+    def test_abstract_backend(self):
+        """ 测试未实现全部方法的后端无法实例化 """
+        class _GetOnly(CacheBackend):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            _GetOnly()
+
+    def test_memory_backend(self):
+        """ 测试内存后端的过期与LRU淘汰 """
+        backend = MemoryCacheBackend(max_size=2)
+        self._check_backend(backend)
+        backend.set("a", "1")
+        backend.set("b", "2")
+        backend.get("a")
+        backend.set("c", "3")
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), "1")
+
+    def test_sqlite_backend(self):
+        """ 测试SQLite后端, 重新打开后数据仍在 """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            backend = SQLiteCacheBackend(path)
+            self._check_backend(backend)
+            backend.set("persist", "value")
+            backend.close()
+            self.assertEqual(SQLiteCacheBackend(path).get("persist"), "value")
+
+    def test_disk_backend(self):
+        """ 测试磁盘后端 """
+        with tempfile.TemporaryDirectory() as tmp:
+            self._check_backend(DiskCacheBackend(tmp))
+            cache = CompletionCache(DiskCacheBackend(tmp))
+            cache.set("k" * 64, {"data": {"answer": "答案"}})
+            self.assertEqual(CompletionCache(DiskCacheBackend(tmp)).get("k" * 64), {"data": {"answer": "答案"}})
+
+    def test_make_key(self):
+        """ 测试缓存key与输入的key顺序无关 """
+        key = CompletionCache.make_key("c", "v1", "m", {"a": 1, "b": "x"}, {"temperature": 1e-10})
+        self.assertEqual(key, CompletionCache.make_key("c", "v1", "m", {"b": "x ", "a": 1}, {"temperature": 1e-10}))
+        self.assertNotEqual(key, CompletionCache.make_key("c", "v1", "m", {"a": 1, "b": "x"}, {"temperature": 1e-10},
+                                                          stream=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
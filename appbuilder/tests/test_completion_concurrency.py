@@ -0,0 +1,135 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import json
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import appbuilder
+from appbuilder.core._client import HTTPClient
+from appbuilder.core._rate_limiter import RateLimiter
+from appbuilder.core.components.llms.base import CompletionBaseComponent
+from appbuilder.utils.mock_gateway import MockGateway
+
+
+class TestCompletionConcurrency(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def test_model_config_under_thread_pool(self):
+        """ 测试多个线程、多个不同模型的实例并发调用时, 每个请求的模型与参数互不干扰 """
+        components = {
+            "ERNIE-Bot 4.0": appbuilder.Playground(prompt_template="{query}", model="ERNIE-Bot 4.0"),
+            "ERNIE-Bot-turbo": appbuilder.Playground(prompt_template="{query}", model="ERNIE-Bot-turbo"),
+            "ERNIE-Bot-8K": appbuilder.Playground(prompt_template="{query}", model="ERNIE-Bot-8K"),
+        }
+        template = json.dumps(CompletionBaseComponent.model_config, sort_keys=True)
+        sent = []
+        post = HTTPClient.post
+
+        def _record(client, url, **kwargs):
+            body = kwargs.get("json")
+            if body is not None and "/api/llm/" in url:
+                # 在请求发出前序列化, 与真实发送的内容一致
+                sent.append(json.loads(json.dumps(body)))
+            return post(client, url, **kwargs)
+
+        def _call(i):
+            model = list(components)[i % len(components)]
+            temperature = round(0.1 + (i % 9) / 10, 1)
+            query = "{}|{}".format(model, temperature)
+            msg = components[model](appbuilder.Message({"query": query}), temperature=temperature)
+            return msg.content == "mock answer: " + query
+
+        with mock.patch.object(HTTPClient, "post", _record):
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                results = list(executor.map(_call, range(300)))
+
+        self.assertTrue(all(results))
+        self.assertEqual(len(sent), 300)
+        for body in sent:
+            model, temperature = body["query"].split("|")
+            self.assertEqual(body["model_config"]["model"]["name"], model)
+            self.assertEqual(body["model_config"]["model"]["completion_params"]["temperature"], float(temperature))
+        # 类属性中的模板没有被修改
+        self.assertEqual(json.dumps(CompletionBaseComponent.model_config, sort_keys=True), template)
+
+    def test_batch(self):
+        """ 测试batch按输入顺序返回结果, 汇总token用量并回调进度 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        messages = [appbuilder.Message({"query": str(i)}) for i in range(30)]
+        progress = []
+        results = play.batch(messages, max_concurrency=8,
+                             progress_callback=lambda done, total, index, result: progress.append((done, total)))
+        self.assertEqual([r.content for r in results], ["mock answer: {}".format(i) for i in range(30)])
+        self.assertEqual(results.errors, {})
+        self.assertEqual(results.token_usage["total_tokens"], sum(r.token_usage["total_tokens"] for r in results))
+        self.assertEqual(sorted(progress), [(i, 30) for i in range(1, 31)])
+
+        results = play.batch(messages[:5], stream=True)
+        self.assertEqual([r.content for r in results], ["mock answer: {}".format(i) for i in range(5)])
+
+    def test_batch_arguments(self):
+        """ 测试batch的参数校验与空输入 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        results = play.batch([])
+        self.assertEqual((list(results), results.errors, results.token_usage), ([], {}, {}))
+        for max_concurrency in (0, -1):
+            with self.assertRaises(ValueError):
+                play.batch([appbuilder.Message({"query": "0"})], max_concurrency=max_concurrency)
+            with self.assertRaises(ValueError):
+                play.batch([], max_concurrency=max_concurrency)
+
+    def test_batch_errors(self):
+        """ 测试单个调用失败不影响其他调用, 被限流的调用自动重试 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        messages = [appbuilder.Message({"query": str(i)}) for i in range(10)]
+        self.gateway.inject_error("/api/llm/", status=500, times=1)
+        results = play.batch(messages, max_concurrency=4)
+        self.assertEqual(len(results.errors), 1)
+        index, error = next(iter(results.errors.items()))
+        self.assertIs(results[index], error)
+        self.assertIsInstance(error, appbuilder.AppBuilderServerException)
+
+        self.gateway.inject_error("/api/llm/", status=429, times=2)
+        results = play.batch(messages, max_concurrency=4)
+        self.assertEqual(results.errors, {})
+
+    def test_batch_rate_limit(self):
+        """ 测试batch的速率受接口限流控制 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        path = "/api/llm/" + play.name
+        RateLimiter().set_limit(path, max_qps=20, burst=1, adaptive=False)
+        try:
+            start = time.monotonic()
+            results = play.batch([appbuilder.Message({"query": str(i)}) for i in range(21)], max_concurrency=8)
+            self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        finally:
+            RateLimiter().remove_limit(path)
+        self.assertEqual(results.errors, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,459 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import gzip
+import base64
+import tempfile
+import json
+import time
+import zlib
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import appbuilder
+import appbuilder.core.component
+from appbuilder.core._client import HTTPClient, HTTPPoolConfig, HTTPClientRegistry, RetryPolicy, HedgePolicy
+from appbuilder.core._rate_limiter import EndpointLimiter, RateLimiter
+from appbuilder.core._circuit_breaker import CircuitBreaker
+from appbuilder.core._payload import Base64Stream, json_body
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    """本地网关，返回固定结果"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    attempts = {}
+    attempts_lock = threading.Lock()
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            chunk = self.rfile.read(size + 2)[:size]
+            if size == 0:
+                return body
+            body += chunk
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith("/echo"):
+            encoding = self.headers.get("Content-Encoding")
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "deflate":
+                body = zlib.decompress(body)
+            payload = json.dumps({"encoding": encoding, "chunked": self.headers.get("Transfer-Encoding"),
+                                  "body": body.decode()}).encode()
+            # 返回体使用gzip压缩, 验证客户端自动解压
+            payload = gzip.compress(payload)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        if self.path.endswith("/busy"):
+            with self.attempts_lock:
+                key = self.headers.get("X-Test-Id")
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.endswith("/error"):
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.endswith("/slow"):
+            time.sleep(float(self.headers.get("X-Sleep", "1")))
+        if self.path.endswith("/slow-once"):
+            # 同一X-Test-Id的第一个请求很慢, 之后的请求立即返回
+            with self.attempts_lock:
+                key = self.headers.get("X-Test-Id")
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+                first = self.attempts[key] == 1
+            if first:
+                time.sleep(1)
+        payload = json.dumps({"result": "ok"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestHTTPClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _GatewayHandler)
+        cls.gateway = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _post(self, client):
+        response = client.session.post(client.service_url("/v1/test"), headers=client.auth_header(), json={})
+        client.check_response_header(response)
+        return response.json()
+
+    def test_pool_config_from_env(self):
+        """ 测试连接池配置从环境变量中获取 """
+        env = {
+            "APPBUILDER_HTTP_POOL_CONNECTIONS": "4",
+            "APPBUILDER_HTTP_POOL_MAXSIZE": "32",
+            "APPBUILDER_HTTP_POOL_BLOCK": "true",
+            "APPBUILDER_HTTP_POOL_IDLE_TIMEOUT": "30",
+        }
+        with mock.patch.dict("os.environ", env):
+            config = HTTPPoolConfig()
+        self.assertEqual(config.pool_connections, 4)
+        self.assertEqual(config.pool_maxsize, 32)
+        self.assertTrue(config.pool_block)
+        self.assertEqual(config.pool_idle_timeout, 30)
+        self.assertEqual(HTTPPoolConfig(pool_maxsize=8).pool_maxsize, 8)
+
+    def test_pool_stats_reuse_connections(self):
+        """ 测试并发请求复用连接池中的连接 """
+        client = HTTPClient("test-token", self.gateway, pool_config=HTTPPoolConfig(pool_maxsize=4, pool_block=True))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: self._post(client), range(40)))
+        self.assertEqual(results, [{"result": "ok"}] * 40)
+        stats = client.pool_stats()[self.gateway]
+        self.assertEqual(stats["num_requests"], 40)
+        self.assertLessEqual(stats["num_connections"], 4)
+        self.assertEqual(stats["maxsize"], 4)
+
+    def test_pool_idle_timeout(self):
+        """ 测试连接池空闲超时后丢弃已缓存的连接 """
+        client = HTTPClient("test-token", self.gateway, pool_config=HTTPPoolConfig(pool_idle_timeout=0))
+        self._post(client)
+        self.assertEqual(len(client.pool_stats()), 1)
+        with mock.patch("appbuilder.core._client.time.monotonic", return_value=1e12):
+            self._post(client)
+        stats = list(client.pool_stats().values())[0]
+        self.assertEqual(stats["num_requests"], 1)
+
+    def test_component_pool_config(self):
+        """ 测试Component透传连接池配置 """
+        config = HTTPPoolConfig(pool_maxsize=16)
+        component = appbuilder.core.component.Component(
+            secret_key="test-token", gateway=self.gateway, pool_config=config)
+        self.assertIs(component.http_client.pool_config, config)
+        self.assertEqual(component.http_client.adapter._pool_config.pool_maxsize, 16)
+
+    def test_registry_shares_client(self):
+        """ 测试相同鉴权信息的组件共享同一个HTTPClient """
+        registry = HTTPClientRegistry()
+        components = [appbuilder.core.component.Component(secret_key="shared-token", gateway=self.gateway)
+                      for _ in range(15)]
+        clients = {id(component.http_client) for component in components}
+        self.assertEqual(len(clients), 1)
+        other = appbuilder.core.component.Component(secret_key="other-token", gateway=self.gateway)
+        self.assertIsNot(other.http_client, components[0].http_client)
+
+        stats = [item for item in registry.stats() if item["gateway"] == self.gateway]
+        self.assertIn(15, [item["refcount"] for item in stats])
+
+    def test_registry_close_idle(self):
+        """ 测试引用计数为0的HTTPClient在空闲超时后关闭 """
+        registry = HTTPClientRegistry()
+        # 先关闭之前的用例遗留的空闲HTTPClient
+        registry.close_idle(idle_timeout=0)
+        client = registry.acquire("idle-token", self.gateway)
+        self.assertIs(registry.acquire("idle-token", self.gateway), client)
+        registry.release(client)
+        self.assertEqual(registry.close_idle(idle_timeout=0), 0)
+        registry.release(client)
+        self.assertEqual(registry.close_idle(idle_timeout=3600), 0)
+        self.assertEqual(registry.close_idle(idle_timeout=0), 1)
+        new_client = registry.acquire("idle-token", self.gateway)
+        self.assertIsNot(new_client, client)
+        registry.release(new_client)
+
+    def test_registry_release_on_reset(self):
+        """ 测试重新设置鉴权信息时释放之前的HTTPClient """
+        registry = HTTPClientRegistry()
+        component = appbuilder.core.component.Component(secret_key="reset-token-1", gateway=self.gateway)
+        first = component.http_client
+        component.set_secret_key_and_gateway("reset-token-2", self.gateway)
+        self.assertIsNot(component.http_client, first)
+        refcounts = {item["refcount"] for item in registry.stats()
+                     if item["gateway"] == self.gateway and item["refcount"] == 0}
+        self.assertEqual(refcounts, {0})
+
+    def test_registry_release_while_locked(self):
+        """ 测试持有注册表锁时被垃圾回收触发的release不会死锁, 引用计数在下一次操作时更新 """
+        registry = HTTPClientRegistry()
+        registry.close_idle(idle_timeout=0)
+        client = registry.acquire("locked-token", self.gateway)
+
+        def release_locked():
+            with registry._lock:
+                registry.release(client)
+
+        thread = threading.Thread(target=release_locked, daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(registry.close_idle(idle_timeout=0), 1)
+
+    def test_retry_policy(self):
+        """ 测试重试策略的退避时间与Retry-After """
+        policy = RetryPolicy(total=3, backoff_factor=1, backoff_max=4)
+        for attempt in range(5):
+            self.assertLessEqual(policy.backoff(attempt), 4)
+        self.assertEqual(RetryPolicy(respect_retry_after=True, backoff_factor=0).backoff(0, {"Retry-After": "2"}), 2)
+        self.assertEqual(RetryPolicy(retry_after_max=1, backoff_factor=0).backoff(0, {"Retry-After": "30"}), 1)
+        self.assertIs(RetryPolicy.from_value(policy), policy)
+        self.assertEqual(RetryPolicy.from_value(2).total, 2)
+        with self.assertRaises(AttributeError):
+            policy.total = 10
+        with self.assertRaises(appbuilder.core._exception.InvalidRequestArgumentError):
+            RetryPolicy(total=-1)
+
+    def test_per_request_retry_is_thread_safe(self):
+        """ 测试并发请求使用各自的重试次数 """
+        client = HTTPClient("test-token", self.gateway)
+        url = client.service_url("/v1/busy")
+
+        def _post(index):
+            retry = RetryPolicy(total=index % 4, backoff_factor=0.001)
+            response = client.post(url, headers={"X-Test-Id": str(index)}, json={}, retry=retry)
+            return response.status_code
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            status_codes = list(executor.map(_post, range(32)))
+        self.assertEqual(set(status_codes), {429})
+        for index in range(32):
+            self.assertEqual(_GatewayHandler.attempts[str(index)], index % 4 + 1)
+        self.assertEqual(client.retry.total, 0)
+
+    def test_rate_limiter_enforces_qps(self):
+        """ 测试设置限流后请求速率不超过max_qps """
+        client = HTTPClient("test-token", self.gateway)
+        RateLimiter().set_limit("/v1/limited", max_qps=20, burst=1)
+        try:
+            start = time.monotonic()
+            for _ in range(6):
+                self.assertEqual(client.post(client.service_url("/v1/limited"), json={}).status_code, 200)
+            self.assertGreaterEqual(time.monotonic() - start, 0.25)
+            # 未设置限流的接口不受影响
+            self.assertIsNone(RateLimiter().get(client.service_url("/v1/test")))
+            stats = RateLimiter().stats()["/v1/limited"]
+            self.assertEqual(stats["requests"], 6)
+            self.assertEqual(stats["in_flight"], 0)
+        finally:
+            RateLimiter().remove_limit("/v1/limited")
+
+    def test_rate_limiter_shrinks_on_throttle(self):
+        """ 测试被网关限流后自动降低速率 """
+        client = HTTPClient("test-token", self.gateway)
+        limiter = RateLimiter().set_limit("/v1/busy", max_qps=10, min_qps=2)
+        try:
+            client.post(client.service_url("/v1/busy"), headers={"X-Test-Id": "limiter"}, json={})
+            self.assertEqual(limiter.stats()["throttled"], 1)
+            self.assertEqual(limiter.stats()["qps"], 5)
+            for _ in range(5):
+                limiter.on_throttle()
+            self.assertEqual(limiter.stats()["qps"], 2)
+            for _ in range(100):
+                limiter.on_success()
+            self.assertEqual(limiter.stats()["qps"], 10)
+        finally:
+            RateLimiter().remove_limit("/v1/busy")
+        self.assertTrue(RateLimiter.is_throttled(200, b'{"error_code": 18, "error_msg": "Open api qps request limit reached"}'))
+        self.assertTrue(RateLimiter.is_throttled(200, b'{"code": 336501}'))
+        self.assertFalse(RateLimiter.is_throttled(200, b'{"result": "ok"}'))
+        self.assertFalse(RateLimiter.is_throttled(200, None))
+
+    def test_rate_limiter_config(self):
+        """ 测试限流配置解析及路径匹配 """
+        with mock.patch.dict("os.environ", {"APPBUILDER_RATE_LIMITS": "/v1/a=5:2, /v1/prefix/b=3,invalid"}), \
+                mock.patch.object(RateLimiter, "_instance", None):
+            limiter = RateLimiter()
+        try:
+            self.assertEqual(limiter.get("http://host/v1/a").max_concurrency, 2)
+            self.assertEqual(limiter.get("http://host/rpc/v1/prefix/b?x=1").max_qps, 3)
+            self.assertIsNone(limiter.get("http://host/v1/c"))
+            self.assertIs(limiter.set_default_limit("/v1/a", max_qps=100), limiter.get("http://host/v1/a"))
+        finally:
+            limiter.remove_limit("/v1/a")
+            limiter.remove_limit("/v1/prefix/b")
+        self.assertIsNone(limiter.get("http://host/v1/a"))
+
+    def test_rate_limiter_path_cache_bounded(self):
+        """ 测试路径匹配缓存有上限, 按最近使用淘汰 """
+        with mock.patch.object(RateLimiter, "_instance", None), \
+                mock.patch("appbuilder.core._rate_limiter._PATH_CACHE_SIZE", 10):
+            limiter = RateLimiter()
+            limiter.set_limit("/v1/a", max_qps=5)
+            self.assertIsNotNone(limiter.get("http://host/v1/a"))
+            for index in range(100):
+                self.assertIsNone(limiter.get("http://host/v1/resource/{}".format(index)))
+                limiter.get("http://host/v1/a")
+            self.assertEqual(len(limiter._path_cache), 10)
+            self.assertIn("/v1/a", limiter._path_cache)
+
+    def test_limiter_max_concurrency(self):
+        """ 测试并发请求数不超过max_concurrency """
+        limiter = EndpointLimiter(max_qps=1000, max_concurrency=2)
+        peak = []
+
+        def _call(_):
+            limiter.acquire()
+            try:
+                peak.append(limiter.stats()["in_flight"])
+                time.sleep(0.01)
+            finally:
+                limiter.release()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(_call, range(16)))
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    def test_default_timeout(self):
+        """ 测试未指定timeout时使用默认超时 """
+        client = HTTPClient("test-token", self.gateway, pool_config=HTTPPoolConfig(read_timeout=0.2))
+        self.assertEqual(client.pool_config.default_timeout(), (10, 0.2))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.post(client.service_url("/v1/slow"), headers={"X-Sleep": "1"}, json={}, timeout=None)
+        # 显式指定的timeout优先
+        response = client.post(client.service_url("/v1/slow"), headers={"X-Sleep": "0.3"}, json={}, timeout=2)
+        self.assertEqual(response.status_code, 200)
+
+    def test_circuit_breaker(self):
+        """ 测试连续失败后熔断, 恢复时间后探测成功关闭熔断 """
+        client = HTTPClient("test-token", self.gateway)
+        breaker = CircuitBreaker().set_breaker("/v1/error", failure_threshold=3, recovery_timeout=0.2)
+        try:
+            for _ in range(3):
+                self.assertEqual(client.post(client.service_url("/v1/error"), json={}).status_code, 500)
+            self.assertEqual(breaker.state, "open")
+            with self.assertRaises(appbuilder.CircuitOpenException):
+                client.post(client.service_url("/v1/error"), json={}, retry=2)
+            self.assertEqual(breaker.stats()["rejected"], 1)
+            time.sleep(0.25)
+            # 探测请求失败, 继续熔断
+            client.post(client.service_url("/v1/error"), json={})
+            self.assertEqual(breaker.state, "open")
+            time.sleep(0.25)
+            breaker.before_request()
+            self.assertEqual(breaker.state, "half_open")
+            breaker.on_success()
+            self.assertEqual(CircuitBreaker().stats()["/v1/error"]["state"], "closed")
+            # 未设置熔断器的接口不受影响
+            self.assertIsNone(CircuitBreaker().get(client.service_url("/v1/test")))
+        finally:
+            CircuitBreaker().remove_breaker("/v1/error")
+
+    def test_hedged_request(self):
+        """ 测试慢请求在对冲延迟后发送对冲请求, 使用最先返回的结果 """
+        client = HTTPClient("test-token", self.gateway)
+        url = client.service_url("/v1/slow-once")
+        start = time.monotonic()
+        response = client.post(url, headers={"X-Test-Id": "hedge"}, json={}, hedge=HedgePolicy(delay=0.1))
+        self.assertEqual(response.json(), {"result": "ok"})
+        self.assertLess(time.monotonic() - start, 0.8)
+        self.assertEqual(_GatewayHandler.attempts["hedge"], 2)
+        # 不对冲时等待慢请求返回
+        start = time.monotonic()
+        client.post(url, headers={"X-Test-Id": "no-hedge"}, json={})
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+
+    def test_hedged_request_fast_failure(self):
+        """ 测试请求在对冲延迟内失败时立即发送对冲请求, 所有请求都失败时抛出异常 """
+        client = HTTPClient("test-token", self.gateway)
+        url = client.service_url("/v1/test")
+        request = client.session.request
+        calls = []
+
+        def _fail_once(*args, **kwargs):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise requests.exceptions.ConnectionError("connection reset")
+            return request(*args, **kwargs)
+
+        start = time.monotonic()
+        with mock.patch.object(client.session, "request", side_effect=_fail_once):
+            response = client.post(url, json={}, hedge=HedgePolicy(delay=5))
+        self.assertEqual(response.json(), {"result": "ok"})
+        self.assertEqual(len(calls), 2)
+        self.assertLess(time.monotonic() - start, 1)
+
+        with mock.patch.object(client.session, "request",
+                               side_effect=requests.exceptions.ConnectionError("connection reset")) as send:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.post(url, json={}, hedge=HedgePolicy(delay=5))
+        self.assertEqual(send.call_count, 2)
+
+    def test_request_compression(self):
+        """ 测试请求体压缩与返回体自动解压 """
+        for encoding in ("gzip", "deflate"):
+            client = HTTPClient("test-token", self.gateway,
+                                pool_config=HTTPPoolConfig(request_compression=encoding, compression_min_size=100))
+            url = client.service_url("/v1/echo")
+            data = client.post(url, json={"text": "x" * 1000}).json()
+            self.assertEqual(data["encoding"], encoding)
+            self.assertEqual(json.loads(data["body"]), {"text": "x" * 1000})
+            # 小于compression_min_size的请求体不压缩
+            self.assertIsNone(client.post(url, json={"text": "x"}).json()["encoding"])
+            # 流式请求体边读边压缩, 以chunked方式发送
+            data = client.post(url, data=json_body({"data": Base64Stream(b"\x00" * 3000, chunk_size=300)})).json()
+            self.assertEqual((data["encoding"], data["chunked"]), (encoding, "chunked"))
+            self.assertEqual(json.loads(data["body"])["data"], base64.b64encode(b"\x00" * 3000).decode())
+
+    def test_streaming_body(self):
+        """ 测试流式请求体按Content-Length发送 """
+        client = HTTPClient("test-token", self.gateway)
+        with tempfile.TemporaryFile() as f:
+            f.write(b"header")
+            f.write(os.urandom(100000))
+            f.seek(6)
+            body = json_body({"file_list": [{"name": "a.pdf", "data": Base64Stream(f, chunk_size=1000)}]})
+            data = client.post(client.service_url("/v1/echo"), data=body, retry=1).json()
+            f.seek(6)
+            expected = base64.b64encode(f.read()).decode()
+        self.assertIsNone(data["chunked"])
+        self.assertEqual(json.loads(data["body"]), {"file_list": [{"name": "a.pdf", "data": expected}]})
+
+    def test_hedge_policy_delay(self):
+        """ 测试对冲延迟取耗时分位数 """
+        policy = HedgePolicy(delay=0.5, percentile=0.9, min_samples=10)
+        self.assertEqual(policy.hedge_delay([0.1] * 5), 0.5)
+        self.assertEqual(policy.hedge_delay([i / 100 for i in range(100)]), 0.9)
+        self.assertIsNone(HedgePolicy.from_value(None))
+        self.assertIsInstance(HedgePolicy.from_value(True), HedgePolicy)
+        with self.assertRaises(AttributeError):
+            policy.delay = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,10 @@
 # limitations under the License.
 
 import os
+import json
+import time
 import unittest
+from unittest import mock
 import requests
 import appbuilder
 from appbuilder.core.message import Message
@@ -89,5 +92,29 @@ class TestImageUnderstand(unittest.TestCase):
             next(result)
 
 
+class TestImageUnderstandPolling(unittest.TestCase):
+    def _response(self, data):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(data).encode("utf-8")
+        return response
+
+    def test_min_poll_interval(self):
+        """测试查询结果时保持最小间隔, 不依赖接口的限流配置"""
+        image_understand = appbuilder.ImageUnderstand(secret_key="mock-token", gateway="http://127.0.0.1:1")
+        responses = [
+            self._response({"result": {"task_id": "task"}}),
+            self._response({"result": {"task_id": "task", "ret_code": 1}}),
+            self._response({"result": {"task_id": "task", "ret_code": 0, "description_to_llm": "cat"}}),
+        ]
+        # 直接替换post, 请求不经过RateLimiter
+        with mock.patch.object(image_understand.http_client, "post", side_effect=responses) as post:
+            start = time.monotonic()
+            msg = image_understand.run(Message(content={"url": "http://image", "question": "图像内容是什么？"}))
+        self.assertGreaterEqual(time.monotonic() - start, 1.0)
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(msg.content["description"], "cat")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sys
+import json
+import subprocess
+import unittest
+
+import appbuilder
+
+HEAVY_MODULES = ["pandas", "numpy", "sqlalchemy", "proto", "pydantic", "requests", "aiohttp"]
+
+
+def _run(code: str):
+    out = subprocess.check_output([sys.executable, "-c", code])
+    return json.loads(out)
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_import_does_not_load_heavy_modules(self):
+        """ 测试import appbuilder不导入组件及重依赖 """
+        loaded = _run("import sys, json, appbuilder;"
+                      "print(json.dumps([m for m in {} if m in sys.modules]))".format(HEAVY_MODULES))
+        self.assertEqual(loaded, [])
+
+    def test_component_loads_own_dependencies(self):
+        """ 测试访问组件时只导入组件所需的依赖 """
+        loaded = _run("import sys, json, appbuilder; appbuilder.Playground;"
+                      "print(json.dumps([m for m in {} if m in sys.modules]))".format(HEAVY_MODULES))
+        self.assertIn("requests", loaded)
+        self.assertNotIn("pandas", loaded)
+        self.assertNotIn("sqlalchemy", loaded)
+
+    def test_public_api(self):
+        """ 测试公开接口都可以访问 """
+        for name in appbuilder.__all__:
+            self.assertIsNotNone(getattr(appbuilder, name))
+        self.assertIn("Playground", dir(appbuilder))
+        from appbuilder import Playground, Message
+        self.assertIs(Playground, appbuilder.Playground)
+        self.assertIs(Message, appbuilder.core.message.Message)
+        self.assertTrue(hasattr(appbuilder.console, "RAG"))
+        with self.assertRaises(AttributeError):
+            appbuilder.NotExists
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import asyncio
+import unittest
+from unittest import mock
+
+import requests
+
+import appbuilder
+from appbuilder import MetricsRegistry, CompletionCache
+from appbuilder.core._metrics import Counter, Gauge, Histogram
+from appbuilder.utils.mock_gateway import MockGateway
+
+LABELS = ("playground", "eb-4")
+
+
+class TestLLMMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.reset()
+        self.play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+
+    def _value(self, name, labels=LABELS):
+        return self.registry.snapshot()[name].get(labels)
+
+    def test_blocking(self):
+        """ 测试非流式调用记录请求数、耗时与token用量 """
+        msg = self.play(appbuilder.Message({"query": "你好"}))
+        self.assertEqual(self._value("appbuilder_llm_requests_total", LABELS + ("false",)), 1)
+        self.assertEqual(self._value("appbuilder_llm_completion_tokens_total"), msg.token_usage["completion_tokens"])
+        self.assertEqual(self._value("appbuilder_llm_prompt_tokens_total"), msg.token_usage["prompt_tokens"])
+        self.assertEqual(self._value("appbuilder_llm_request_duration_seconds")["count"], 1)
+        self.assertEqual(self._value("appbuilder_llm_tokens_per_second")["count"], 1)
+
+    def test_stream(self):
+        """ 测试流式调用在读取完后记录首token耗时与总耗时 """
+        self.gateway.stream_interval = 0.02
+        try:
+            msg = self.play(appbuilder.Message({"query": "流式输出"}), stream=True)
+            self.assertIsNone(self._value("appbuilder_llm_request_duration_seconds"))
+            list(msg.content)
+        finally:
+            self.gateway.stream_interval = 0
+        ttft = self._value("appbuilder_llm_time_to_first_token_seconds")
+        latency = self._value("appbuilder_llm_request_duration_seconds")
+        self.assertEqual((ttft["count"], latency["count"]), (1, 1))
+        self.assertLess(ttft["sum"], latency["sum"])
+        self.assertEqual(self._value("appbuilder_llm_completion_tokens_total"), msg.token_usage["completion_tokens"])
+
+        async def consume():
+            msg = await self.play.arun(appbuilder.Message({"query": "异步"}), stream=True)
+            return [chunk async for chunk in msg.content]
+
+        asyncio.run(consume())
+        self.assertEqual(self._value("appbuilder_llm_request_duration_seconds")["count"], 2)
+
+    def test_errors_and_cache(self):
+        """ 测试按错误码记录错误数, 以及缓存命中数 """
+        self.gateway.inject_error("/api/llm/", status=500, times=1)
+        with self.assertRaises(appbuilder.AppBuilderServerException):
+            self.play(appbuilder.Message({"query": "错误"}))
+        self.assertEqual(self._value("appbuilder_llm_errors_total", LABELS + ("500",)), 1)
+
+        self.play.completion_cache = CompletionCache()
+        self.play(appbuilder.Message({"query": "缓存"}))
+        self.play(appbuilder.Message({"query": "缓存"}))
+        self.assertEqual(self._value("appbuilder_llm_cache_hits_total"), 1)
+        self.assertEqual(self._value("appbuilder_llm_request_duration_seconds")["count"], 1)
+
+    def test_prometheus_endpoint(self):
+        """ 测试通过HTTP导出Prometheus文本格式 """
+        self.play(appbuilder.Message({"query": "你好"}))
+        server = self.registry.start_http_server(port=0, host="127.0.0.1")
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+            response = requests.get(url, timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('appbuilder_llm_requests_total{component="playground",model="eb-4",stream="false"} 1',
+                      response.text)
+        self.assertIn("# TYPE appbuilder_llm_request_duration_seconds histogram", response.text)
+        self.assertIn('appbuilder_llm_request_duration_seconds_bucket{component="playground",'
+                      'model="eb-4",le="+Inf"} 1', response.text)
+
+
+class TestMetricTypes(unittest.TestCase):
+    def test_counter(self):
+        """ 测试计数器的标签校验 """
+        counter = Counter("c", "doc", ("a",))
+        counter.inc(a="x")
+        counter.inc(2, a="x")
+        self.assertEqual(counter.get(a="x"), 3)
+        with self.assertRaises(ValueError):
+            counter.inc(b="x")
+        with self.assertRaises(ValueError):
+            counter.inc(-1, a="x")
+
+    def test_gauge(self):
+        """ 测试瞬时值可增可减 """
+        gauge = Gauge("g", "doc")
+        gauge.inc(3)
+        gauge.dec()
+        self.assertEqual(gauge.get(), 2)
+        gauge.set(0.5)
+        self.assertEqual(gauge.expose(), ["# HELP g doc", "# TYPE g gauge", "g 0.5"])
+
+    def test_histogram(self):
+        """ 测试直方图按上界累计 """
+        histogram = Histogram("h", "doc", buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.get(), {"count": 4, "sum": 14.5, "buckets": {1: 2, 5: 3, float("inf"): 4}})
+        self.assertIn('h_bucket{le="1"} 2', "\n".join(histogram.expose()))
+
+    def test_register_conflict(self):
+        """ 测试同名指标重复注册返回同一个对象, 类型不同时报错 """
+        registry = MetricsRegistry()
+        counter = registry.counter("appbuilder_test_total", "doc", ("a",))
+        self.assertIs(registry.counter("appbuilder_test_total", "doc", ("a",)), counter)
+        with self.assertRaises(ValueError):
+            registry.histogram("appbuilder_test_total", "doc", ("a",))
+
+
+if __name__ == '__main__':
+    unittest.main()
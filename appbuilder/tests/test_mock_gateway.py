@@ -0,0 +1,88 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder.core._exception import AppBuilderServerException
+from appbuilder.utils.mock_gateway import MockGateway
+
+
+class TestMockGateway(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def tearDown(self):
+        self.gateway.clear_errors()
+
+    def test_completion(self):
+        """ 测试大模型组件的同步与流式调用 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        msg = play(appbuilder.Message({"query": "你好"}))
+        self.assertEqual(msg.content, "mock answer: 你好")
+
+        msg = play(appbuilder.Message({"query": "你好"}), stream=True)
+        self.assertEqual("".join(msg.content), "mock answer: 你好")
+
+    def test_components(self):
+        """ 测试能力组件的请求与响应解析 """
+        self.assertEqual(len(appbuilder.Embedding().run(appbuilder.Message("百度")).content), 384)
+        ocr = appbuilder.GeneralOCR().run(appbuilder.Message({"raw_image": b"image"}))
+        self.assertTrue(ocr.content["words_result"])
+        tts = appbuilder.TTS().run(appbuilder.Message({"text": "你好"}))
+        self.assertTrue(tts.content["audio_binary"])
+        asr = appbuilder.ASR().run(appbuilder.Message({"raw_audio": b"\x00" * 100}))
+        self.assertTrue(asr.content["result"])
+
+    def test_agent_builder(self):
+        """ 测试console接口 """
+        builder = appbuilder.AgentBuilder("mock-app")
+        conversation_id = builder.create_conversation()
+        answer = "".join(chunk.answer for chunk in builder.run(conversation_id, "你好", stream=True).content)
+        self.assertEqual(answer, builder.run(conversation_id, "你好").content.answer)
+
+    def test_inject_error(self):
+        """ 测试错误注入只在指定次数内生效 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        self.gateway.inject_error("/api/llm/", status=500, times=1)
+        with self.assertRaises(AppBuilderServerException):
+            play(appbuilder.Message({"query": "你好"}))
+        self.assertEqual(play(appbuilder.Message({"query": "你好"})).content, "mock answer: 你好")
+
+    def test_latency(self):
+        """ 测试按路径设置的延迟 """
+        embedding = appbuilder.Embedding()
+        self.gateway.set_latency("/embeddings/", 0.2)
+        try:
+            start = time.monotonic()
+            embedding.run(appbuilder.Message("百度"))
+            self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        finally:
+            self.gateway.set_latency("/embeddings/", 0.0)
+        self.assertGreater(self.gateway.request_counts()["embedding"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder.core._exception import ModelNotSupportedException
+from appbuilder.core.utils import ModelCatalog
+from appbuilder.utils.mock_gateway import MockGateway
+from appbuilder.utils import model_util
+from appbuilder.utils.model_util import RemoteModelCollector, Models
+
+
+class TestModelCatalog(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.catalog = ModelCatalog()
+        self.catalog.clear()
+        self.refresh_interval = self.catalog.refresh_interval
+        self.persist_path = self.catalog.persist_path
+        self.catalog.persist_path = None
+
+    def tearDown(self):
+        self.catalog.clear()
+        self.catalog.refresh_interval = self.refresh_interval
+        self.catalog.persist_path = self.persist_path
+
+    def _fetches(self):
+        return self.gateway.request_counts().get("model_list", 0)
+
+    def test_shared_between_components(self):
+        """ 测试不同组件类、不同实例共享同一份模型列表 """
+        before = self._fetches()
+        components = [appbuilder.Playground(prompt_template="{query}", model="eb-4"),
+                      appbuilder.Playground(prompt_template="{query}", model="ERNIE-Bot-8K"),
+                      appbuilder.QueryRewrite(model="eb-turbo"),
+                      appbuilder.StyleWriting(model="ERNIE-Bot")]
+        for component in components[:2]:
+            component(appbuilder.Message({"query": "你好"}))
+        for component in components:
+            component._check_model_and_get_model_url(component.model_name, component.model_type)
+        self.assertEqual(self._fetches() - before, 1)
+        self.assertIs(components[0].model_info, components[2].model_info)
+
+    def test_lookup(self):
+        """ 测试按名称与简称查询模型 """
+        model_info = self.catalog.get(appbuilder.Playground(prompt_template="{query}", model="eb-4").http_client)
+        self.assertTrue(model_info.get_model_url("eb-4").endswith("/completions_pro"))
+        self.assertEqual(model_info.get_model_url("eb-4"), model_info.get_model_url("ERNIE-Bot 4.0"))
+        self.assertEqual(model_info.get_model_type("Embedding-V1"), "embeddings")
+        with self.assertRaises(ModelNotSupportedException):
+            model_info.get_model_type("not-exist")
+
+    def test_arun_cold_start(self):
+        """ 测试arun在模型目录未加载时在线程池中拉取, 不阻塞事件循环 """
+        component = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        self.catalog.clear()
+        threads = []
+        load = ModelCatalog._load
+
+        def record(catalog, entry, client):
+            threads.append(threading.current_thread())
+            return load(catalog, entry, client)
+
+        with mock.patch.object(ModelCatalog, "_load", autospec=True, side_effect=record):
+            answer = asyncio.run(component.arun(appbuilder.Message({"query": "你好"})))
+        self.assertEqual(answer.content, "mock answer: 你好")
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def _not_modified(self):
+        return self.gateway.request_counts().get("model_list_not_modified", 0)
+
+    def _wait_refreshed(self, client):
+        entry = self.catalog._entry(client)
+        for _ in range(100):
+            if not entry.refreshing:
+                return
+            time.sleep(0.01)
+
+    def test_background_refresh(self):
+        """ 测试过期后在后台以条件请求刷新, 刷新期间与刷新失败时继续使用旧数据 """
+        client = appbuilder.Playground(prompt_template="{query}", model="eb-4").http_client
+        before, not_modified = self._fetches(), self._not_modified()
+        old = self.catalog.get(client)
+        loaded_at = self.catalog._entry(client).loaded_at
+        self.catalog.refresh_interval = 0
+        self.assertIs(self.catalog.get(client), old)
+        self.catalog.refresh_interval = 3600
+        self._wait_refreshed(client)
+        # 模型列表未变化, 网关返回304, 继续使用原来的数据
+        self.assertIs(self.catalog.get(client), old)
+        self.assertGreater(self.catalog._entry(client).loaded_at, loaded_at)
+        self.assertEqual(self._fetches() - before, 1)
+        self.assertEqual(self._not_modified() - not_modified, 1)
+
+        self.gateway.inject_error("/service/list", status=500, times=1)
+        self.catalog.refresh_interval = 0
+        self.assertIs(self.catalog.get(client), old)
+        self.catalog.refresh_interval = 3600
+        self._wait_refreshed(client)
+        self.assertIs(self.catalog.get(client), old)
+
+    def test_persist(self):
+        """ 测试持久化到磁盘后, 重新加载不需要等待远程请求, 并在后台校验一次 """
+        with tempfile.TemporaryDirectory() as tmp:
+            self.catalog.persist_path = os.path.join(tmp, "models.json")
+            client = appbuilder.Playground(prompt_template="{query}", model="eb-4").http_client
+            url = self.catalog.get(client).get_model_url("eb-4")
+            with open(self.catalog.persist_path, encoding="utf-8") as f:
+                self.assertNotIn("mock-token", f.read())
+
+            self.catalog.clear()
+            self.gateway.set_latency("/service/list", 0.5)
+            try:
+                before, not_modified = self._fetches(), self._not_modified()
+                start = time.monotonic()
+                self.assertEqual(self.catalog.get(client).get_model_url("eb-4"), url)
+                self.assertLess(time.monotonic() - start, 0.5)
+                self._wait_refreshed(client)
+            finally:
+                self.gateway.set_latency("/service/list", 0)
+            self.assertEqual(self._fetches() - before, 1)
+            self.assertEqual(self._not_modified() - not_modified, 1)
+
+            # 超过ttl的数据需要先完成条件请求
+            self.catalog.clear()
+            self.catalog.ttl = 0
+            try:
+                not_modified = self._not_modified()
+                self.assertEqual(self.catalog.get(client).get_model_url("eb-4"), url)
+                self.assertEqual(self._not_modified() - not_modified, 1)
+            finally:
+                self.catalog.ttl = 7 * 24 * 60 * 60
+
+    def test_list_if_modified(self):
+        """ 测试模型列表的条件请求 """
+        models = Models(secret_key="mock-token", gateway=self.gateway.url)
+        response, validators = models.list_if_modified()
+        self.assertTrue(len(response.result.common) > 0)
+        self.assertIsNotNone(validators["etag"])
+        self.assertEqual(models.list_if_modified(etag=validators["etag"]), (None, validators))
+        response, _ = models.list_if_modified(last_modified=validators["last_modified"])
+        self.assertIsNone(response)
+        self.assertIsNotNone(models.list_if_modified(etag='"changed"')[0])
+
+    def test_get_model_list(self):
+        """ 测试get_model_list复用模型目录 """
+        before = self._fetches()
+        self.assertIn("ERNIE-Bot 4.0", appbuilder.get_model_list(api_type_filter=["chat"]))
+        self.assertEqual(appbuilder.get_model_list(api_type_filter=["embeddings"], is_available=True),
+                         ["Embedding-V1"])
+        self.assertEqual(self._fetches() - before, 1)
+
+
+class TestRemoteModelCollector(unittest.TestCase):
+    def test_resolve(self):
+        """ 测试简称解析, 同一个简称以最先注册的远程模型为准 """
+        collector = RemoteModelCollector()
+        self.assertEqual(collector.get_remote_name_by_short_name("eb-4"), "ERNIE-Bot 4.0")
+        self.assertEqual(collector.get_remote_name_by_short_name("ERNIE Speed-AppBuilder"), "EB-turbo-AppBuilder专用版")
+        self.assertIsNone(collector.get_remote_name_by_short_name("ERNIE-Bot 4.0"))
+        collector.register_remote_model_name("ERNIE-Bot", "eb-4")
+        self.assertEqual(collector.get_remote_name_by_short_name("eb-4"), "ERNIE-Bot 4.0")
+
+    def test_deprecated_warn_once(self):
+        """ 测试废弃的简称只告警一次 """
+        collector = RemoteModelCollector()
+        with mock.patch.object(model_util, "_warned_short_names", set()), \
+                mock.patch.object(model_util.logger, "warning") as warning:
+            for _ in range(3):
+                self.assertEqual(collector.get_remote_name_by_short_name("eb-turbo-appbuilder"),
+                                 "EB-turbo-AppBuilder专用版")
+            self.assertEqual(warning.call_count, 1)
+
+    def test_register_from_file(self):
+        """ 测试从文件批量注册 """
+        collector = RemoteModelCollector()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mapping.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"Custom-Model-A": ["custom-a", "ca"], "Custom-Model-B": "custom-b"}, f)
+            collector.register_from_file(path)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump([["Custom-Model-C", "custom-c"]], f)
+            collector.register_from_file(path)
+        self.assertEqual(collector.get_remote_name_by_short_name("ca"), "Custom-Model-A")
+        self.assertEqual(collector.get_remote_name_by_short_name("custom-b"), "Custom-Model-B")
+        self.assertEqual(collector.get_remote_name_by_short_name("custom-c"), "Custom-Model-C")
+
+    def test_invalid_mapping_file(self):
+        """ 测试环境变量指定的映射文件不存在或格式错误时记录日志, 继续使用内置映射 """
+        collector = RemoteModelCollector()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mapping.json")
+            for content in ('{"Custom-Model-D": ', '[["Custom-Model-D", "custom-d"], ["custom-e"]]', '3'):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                for mapping_path in (path, os.path.join(tmp, "missing.json")):
+                    with mock.patch.dict(os.environ, {"APPBUILDER_MODEL_NAME_MAPPING": mapping_path}), \
+                            mock.patch.object(model_util.logger, "error") as error:
+                        model_util._register_mapping_from_env()
+                    self.assertEqual(error.call_count, 1)
+        self.assertIsNone(collector.get_remote_name_by_short_name("custom-d"))
+        self.assertEqual(collector.get_remote_name_by_short_name("eb-4"), "ERNIE-Bot 4.0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import json
+import base64
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import urlencode
+
+import requests
+
+from appbuilder.core._payload import Base64Stream, StreamingBody, SizedStreamingBody, json_body, form_body
+
+
+class TestPayload(unittest.TestCase):
+    def test_base64_stream(self):
+        """ 测试分块base64编码结果与一次性编码一致 """
+        raw = os.urandom(10001)
+        for size in (1, 2, 3, 1000, 20000):
+            stream = Base64Stream(raw, chunk_size=size)
+            self.assertEqual(b"".join(stream), base64.b64encode(raw))
+            self.assertEqual(len(stream), len(base64.b64encode(raw)))
+        self.assertEqual(b"".join(Base64Stream(b"")), b"")
+
+    def test_base64_stream_from_file(self):
+        """ 测试从文件当前位置读取, 可重复迭代 """
+        with tempfile.TemporaryFile() as f:
+            f.write(b"skip" + b"content" * 1000)
+            f.seek(4)
+            stream = Base64Stream(f, chunk_size=99)
+            expected = base64.b64encode(b"content" * 1000)
+            self.assertEqual(b"".join(stream), expected)
+            self.assertEqual(b"".join(stream), expected)
+            self.assertEqual(len(stream), len(expected))
+
+    def test_json_body(self):
+        """ 测试JSON请求体与json.dumps结果一致 """
+        raw = os.urandom(5000)
+        obj = {"file_list": [{"name": "文件.pdf", "data": Base64Stream(raw, chunk_size=300)}], "n": 1}
+        body = json_body(obj)
+        expected = json.dumps({"file_list": [{"name": "文件.pdf", "data": base64.b64encode(raw).decode()}],
+                               "n": 1}).encode()
+        self.assertEqual(b"".join(body), expected)
+        self.assertEqual(len(body), len(expected))
+
+    def test_form_body(self):
+        """ 测试表单请求体与urlencode结果一致 """
+        raw = os.urandom(5000)
+        fields = {"detect_direction": "true", "image": Base64Stream(raw, chunk_size=300), "probability": False}
+        body = form_body(fields)
+        expected = urlencode({"detect_direction": "true", "image": base64.b64encode(raw),
+                              "probability": False}).encode()
+        self.assertEqual(b"".join(body), expected)
+        self.assertIsInstance(body, StreamingBody)
+
+    def test_form_body_chunked(self):
+        """ 测试包含Base64Stream的表单请求体以chunked方式发送, 不为计算长度预先编码 """
+        with mock.patch("base64.b64encode", wraps=base64.b64encode) as b64encode:
+            body = form_body({"image": Base64Stream(os.urandom(3000), chunk_size=300)})
+            request = requests.Request("POST", "http://127.0.0.1/", data=body).prepare()
+            self.assertEqual(b64encode.call_count, 0)
+        self.assertEqual(request.headers["Transfer-Encoding"], "chunked")
+        self.assertNotIn("Content-Length", request.headers)
+
+        body = form_body({"detect_direction": "true", "language_type": "CHN_ENG"})
+        self.assertIsInstance(body, SizedStreamingBody)
+        self.assertEqual(len(body), len(b"".join(body)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+
+import appbuilder
+from appbuilder import Pipeline, ComponentStage, SegmentStage
+from appbuilder.core.component import Component
+from appbuilder.core.message import Message
+from appbuilder.core.functional import Stage, sentence_segmenter, _Cancellation, _Channel, _Cancelled
+from appbuilder.utils.mock_gateway import MockGateway
+
+
+class _Produce(Stage):
+    """ 产生count个数据块, 记录已产生的数量 """
+
+    def __init__(self, count):
+        self.count = count
+        self.produced = 0
+
+    def process(self, items):
+        list(items)
+        for i in range(self.count):
+            self.produced += 1
+            yield i
+
+
+class _Fail(Stage):
+    def process(self, items):
+        for item in items:
+            yield item
+            raise RuntimeError("stage failed")
+
+
+class _Record(Component):
+    """ 记录每次调用的输入 """
+
+    def __init__(self):
+        super().__init__(lazy_certification=True)
+        self.inputs = []
+
+    def run(self, message):
+        self.inputs.append(message.content)
+        return Message(message.content)
+
+
+class _Slow(Stage):
+    """ 每隔delay秒产生一个数据块 """
+
+    def __init__(self, count, delay):
+        self.count = count
+        self.delay = delay
+
+    def process(self, items):
+        list(items)
+        for i in range(self.count):
+            time.sleep(self.delay)
+            yield str(i)
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway(stream_chunks=8, stream_interval=0.05).start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def test_llm_to_tts(self):
+        """ 测试大模型的流式输出逐句合成语音, 第一段语音在大模型输出结束前返回 """
+        playground = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        tts = appbuilder.TTS()
+        sentences = []
+        pipeline = Pipeline([
+            ComponentStage(playground, to_message=lambda text: appbuilder.Message({"query": text}), stream=True),
+            SegmentStage(tts, to_message=lambda sentence: sentences.append(sentence) or
+                         appbuilder.Message({"text": sentence})),
+        ], buffer_size=4)
+        start = time.monotonic()
+        first = None
+        outputs = []
+        for audio in pipeline.stream(appbuilder.Message("北京。上海。广州。深圳。杭州。成都。重庆。")):
+            first = first or time.monotonic() - start
+            outputs.append(audio)
+        total = time.monotonic() - start
+        self.assertEqual("".join(sentences), "mock answer: 北京。上海。广州。深圳。杭州。成都。重庆。")
+        self.assertEqual(len(outputs), len(sentences))
+        self.assertEqual(outputs[0]["audio_type"], "mp3")
+        # 大模型输出8个数据块, 每个间隔0.05秒
+        self.assertLess(first, total - 0.15)
+
+    def test_component_chain(self):
+        """ 测试ComponentStage串联, 非流式输出 """
+        playground = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        to_message = lambda text: appbuilder.Message({"query": text})
+        pipeline = Pipeline([ComponentStage(playground, to_message=to_message),
+                             ComponentStage(playground, to_message=to_message, stream=True)])
+        self.assertEqual(pipeline.run(appbuilder.Message("你好"), stream=False).content,
+                         "mock answer: mock answer: 你好")
+
+    def test_segment_concurrency(self):
+        """ 测试SegmentStage并发处理时按顺序输出 """
+        tts = appbuilder.TTS()
+        self.gateway.set_latency("/tts_online", 0.1)
+        try:
+            pipeline = Pipeline([SegmentStage(tts, to_message=lambda s: appbuilder.Message({"text": s}),
+                                              segmenter=lambda items: iter(["一", "二", "三", "四"]),
+                                              max_concurrency=4)])
+            start = time.monotonic()
+            self.assertEqual(len(list(pipeline.stream(appbuilder.Message("")))), 4)
+            self.assertLess(time.monotonic() - start, 0.35)
+        finally:
+            self.gateway.set_latency("/tts_online", 0)
+
+    def test_backpressure(self):
+        """ 测试下游不读取时上游最多多产生buffer_size个数据块, 停止读取后各阶段退出 """
+        producer = _Produce(100)
+        output = Pipeline([producer], buffer_size=4).stream(None)
+        self.assertEqual(next(output), 0)
+        time.sleep(0.2)
+        self.assertLessEqual(producer.produced, 6)
+        threads = threading.active_count()
+        output.close()
+        time.sleep(0.3)
+        self.assertLess(threading.active_count(), threads)
+
+    def test_close_before_read(self):
+        """ 测试没有读取就关闭输出时, 各阶段随之退出 """
+        def stage_threads():
+            return len([t for t in threading.enumerate() if t.name == "appbuilder-pipeline"])
+
+        producer = _Produce(100)
+        threads = stage_threads()
+        output = Pipeline([producer], buffer_size=4).stream(None)
+        output.close()
+        time.sleep(0.3)
+        self.assertLessEqual(producer.produced, 6)
+        self.assertEqual(stage_threads(), threads)
+        with self.assertRaises(StopIteration):
+            next(output)
+
+    def test_cancel_does_not_flush(self):
+        """ 测试取消时下游阶段不会把不完整的输入当作完整输入处理 """
+        for stage in (ComponentStage, SegmentStage):
+            record = _Record()
+            output = Pipeline([_Slow(10, 0.05), stage(record)]).stream(None)
+            time.sleep(0.2)
+            output.close()
+            # 未取消时上游在0.5秒后正常结束
+            time.sleep(0.6)
+            self.assertEqual(record.inputs, [])
+
+    def test_channel_cancel(self):
+        """ 测试取消时阻塞在队列get与put上的线程立即被唤醒 """
+        cancellation = _Cancellation()
+        empty, full = _Channel(cancellation), _Channel(cancellation, maxsize=1)
+        self.assertTrue(full.put(0))
+        results = []
+
+        def _get():
+            try:
+                empty.get()
+            except _Cancelled:
+                results.append("get")
+
+        threads = [threading.Thread(target=_get), threading.Thread(target=lambda: results.append(full.put(1)))]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.assertEqual(results, [])
+        cancellation.cancel()
+        for thread in threads:
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(results, key=str), [False, "get"])
+
+    def test_error(self):
+        """ 测试阶段的异常传递给调用方 """
+        output = Pipeline([_Produce(3), _Fail(), ComponentStage(appbuilder.TTS())]).stream(None)
+        with self.assertRaises(RuntimeError):
+            list(output)
+
+    def test_abstract_stage(self):
+        """ 测试未实现process的阶段无法实例化 """
+        with self.assertRaises(TypeError):
+            type("_NoProcess", (Stage,), {})()
+
+    def test_sentence_segmenter(self):
+        """ 测试句子切分与拆分位置无关 """
+        text = "第一句。第二句！Third one. Fourth?\n最后"
+        expected = ["第一句。", "第二句！", "Third one.", " Fourth?\n", "最后"]
+        self.assertEqual(list(sentence_segmenter()([text])), expected)
+        self.assertEqual(list(sentence_segmenter()(list(text))), expected)
+        self.assertEqual(list(sentence_segmenter(min_length=6)([text])), ["第一句。第二句！", "Third one.",
+                                                                          " Fourth?\n", "最后"])
+
+
+if __name__ == '__main__':
+    unittest.main()
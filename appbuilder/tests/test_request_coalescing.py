@@ -0,0 +1,240 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import os
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import appbuilder
+from appbuilder.core.components.llms import base
+from appbuilder.core._single_flight import StreamBroadcast, AsyncStreamBroadcast, StreamAbandonedError
+from appbuilder.utils.mock_gateway import MockGateway
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = MockGateway().start()
+        cls.env = mock.patch.dict(os.environ, {"GATEWAY_URL": cls.gateway.url,
+                                               "APPBUILDER_TOKEN": "mock-token"})
+        cls.env.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.gateway.stop()
+
+    def setUp(self):
+        self.play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        self.play.request_coalescing = True
+        self.gateway.set_latency("/api/llm/", 0.3)
+
+    def tearDown(self):
+        self.gateway.set_latency("/api/llm/", 0)
+
+    def _completions(self):
+        return self.gateway.request_counts().get("completion", 0)
+
+    def _concurrent(self, fn, count=16):
+        barrier = threading.Barrier(count)
+
+        def call(i):
+            barrier.wait()
+            return fn(i)
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(call, range(count)))
+
+    def test_blocking(self):
+        """ 测试相同的并发调用只发送一次请求, 不同的调用互不影响 """
+        before = self._completions()
+        results = self._concurrent(lambda i: self.play(appbuilder.Message({"query": "热点"})))
+        self.assertEqual(self._completions() - before, 1)
+        self.assertEqual({msg.content for msg in results}, {"mock answer: 热点"})
+        self.assertTrue(all(msg.token_usage == results[0].token_usage for msg in results))
+
+        before = self._completions()
+        results = self._concurrent(lambda i: self.play(appbuilder.Message({"query": str(i % 2)})), count=8)
+        self.assertEqual(self._completions() - before, 2)
+        self.assertEqual([msg.content for msg in results], ["mock answer: {}".format(i % 2) for i in range(8)])
+
+        # 调用结束后不再共享结果
+        self.play(appbuilder.Message({"query": "热点"}))
+        self.assertEqual(self._completions() - before, 3)
+
+    def test_disabled_by_default(self):
+        """ 测试默认不合并请求 """
+        play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+        before = self._completions()
+        self._concurrent(lambda i: play(appbuilder.Message({"query": "热点"})), count=4)
+        self.assertEqual(self._completions() - before, 4)
+
+    def test_stream(self):
+        """ 测试流式订阅者都收到完整的数据块 """
+        before = self._completions()
+
+        def call(i):
+            msg = self.play(appbuilder.Message({"query": "流式热点"}), stream=True)
+            chunks = list(msg.content)
+            return chunks, msg.content, msg.token_usage
+
+        results = self._concurrent(call, count=8)
+        self.assertEqual(self._completions() - before, 1)
+        chunks, content, token_usage = results[0]
+        self.assertEqual("".join(chunks), "mock answer: 流式热点")
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(results, [(chunks, content, token_usage)] * 8)
+        self.assertEqual(len(base._completion_flights), 0)
+
+    def test_abandoned_stream(self):
+        """ 测试所有订阅者都放弃读取后释放正在进行的请求 """
+        msg = self.play(appbuilder.Message({"query": "放弃"}), stream=True)
+        next(iter(msg.content))
+        self.assertEqual(len(base._completion_flights), 1)
+        del msg
+        gc.collect()
+        self.assertEqual(len(base._completion_flights), 0)
+
+    def test_subscribe_abandoned_stream(self):
+        """ 测试拿到已被放弃的流式请求时重新发起请求 """
+        coalesced = base.CompletionBaseComponent._coalesced_response
+        calls = []
+
+        def abandon_once(response, stream, leader):
+            calls.append(leader)
+            if len(calls) == 1:
+                raise StreamAbandonedError("abandoned")
+            return coalesced(response, stream, leader)
+
+        before = self._completions()
+        with mock.patch.object(base.CompletionBaseComponent, "_coalesced_response", side_effect=abandon_once):
+            msg = self.play(appbuilder.Message({"query": "重新订阅"}), stream=True)
+            self.assertEqual("".join(msg.content), "mock answer: 重新订阅")
+        # 模拟的放弃没有关闭共享的请求, 第二次作为跟随者订阅
+        self.assertEqual(calls, [True, False])
+        self.assertEqual(self._completions() - before, 1)
+
+    def test_error(self):
+        """ 测试请求失败时所有调用方都收到异常 """
+        self.gateway.inject_error("/api/llm/", status=500, times=1)
+
+        def call(i):
+            try:
+                self.play(appbuilder.Message({"query": "错误"}))
+            except appbuilder.AppBuilderServerException as e:
+                return e
+            return None
+
+        errors = self._concurrent(call, count=4)
+        self.assertTrue(all(isinstance(e, appbuilder.AppBuilderServerException) for e in errors))
+        self.assertEqual(self.play(appbuilder.Message({"query": "错误"})).content, "mock answer: 错误")
+
+    def test_async(self):
+        """ 测试同一个事件循环中的异步调用合并 """
+        before = self._completions()
+
+        async def blocking():
+            return await asyncio.gather(*[self.play.arun(appbuilder.Message({"query": "异步热点"}))
+                                          for _ in range(10)])
+
+        results = asyncio.run(blocking())
+        self.assertEqual({msg.content for msg in results}, {"mock answer: 异步热点"})
+        self.assertEqual(self._completions() - before, 1)
+
+        async def consume():
+            msg = await self.play.arun(appbuilder.Message({"query": "异步流式"}), stream=True)
+            return "".join([chunk async for chunk in msg.content])
+
+        async def stream():
+            return await asyncio.gather(*[consume() for _ in range(10)])
+
+        self.assertEqual(asyncio.run(stream()), ["mock answer: 异步流式"] * 10)
+        self.assertEqual(self._completions() - before, 2)
+
+
+class TestStreamBroadcast(unittest.TestCase):
+    def test_abandoned(self):
+        """ 测试所有订阅者放弃后关闭源生成器, 之后的订阅抛出StreamAbandonedError而不是返回不完整的数据 """
+        closed = []
+
+        def source():
+            try:
+                yield from range(10)
+            finally:
+                closed.append(True)
+
+        broadcast = StreamBroadcast(source())
+        gen = broadcast.subscribe()
+        self.assertEqual(next(gen), 0)
+        del gen
+        gc.collect()
+        for _ in range(100):
+            if closed:
+                break
+            time.sleep(0.01)
+        self.assertEqual(closed, [True])
+        with self.assertRaises(StreamAbandonedError):
+            broadcast.subscribe()
+
+    def test_release_during_pull(self):
+        """ 测试读取源生成器时垃圾回收了其他订阅者, 不会因为等待锁而死锁 """
+        def source():
+            for i in range(3):
+                gc.collect()
+                yield i
+
+        broadcast = StreamBroadcast(source())
+        outputs = []
+        # 放在引用环中的订阅者只能由gc.collect回收, 回收发生在读取源生成器的线程中
+        garbage = {"gen": broadcast.subscribe()}
+        garbage["self"] = garbage
+        del garbage
+        reader = threading.Thread(target=lambda: outputs.extend(broadcast.subscribe()), daemon=True)
+        reader.start()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(outputs, [0, 1, 2])
+
+    def test_async_abandoned(self):
+        """ 测试异步源生成器在所属的事件循环中被关闭 """
+        closed = []
+
+        async def source():
+            try:
+                for i in range(10):
+                    yield i
+            finally:
+                closed.append(True)
+
+        async def run():
+            broadcast = AsyncStreamBroadcast(source())
+            gen = broadcast.subscribe()
+            self.assertEqual(await gen.__anext__(), 0)
+            await gen.aclose()
+            del gen
+            gc.collect()
+            await asyncio.sleep(0.01)
+            self.assertEqual(closed, [True])
+            with self.assertRaises(StreamAbandonedError):
+                broadcast.subscribe()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
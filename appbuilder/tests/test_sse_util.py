@@ -0,0 +1,50 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from appbuilder.utils.sse_util import SSEClient
+
+STREAM = ("data: {\"answer\": \"你好\"}\n\n"
+          ": comment\r\n"
+          "id: 7\r\nevent: update\r\ndata: line1\r\ndata:line2\r\n\r\n"
+          "retry: 3000\rdata: 世界\r\r"
+          "{\"code\": 1, \"message\": \"error\"}\n\n"
+          "data: tail").encode("utf-8")
+
+
+def _parse(chunks):
+    return [(e.event, e.id, e.data, e.retry, e.raw) for e in SSEClient(chunks).events()]
+
+
+class TestSSEClient(unittest.TestCase):
+    def test_events(self):
+        """ 测试字段解析、多行data、注释以及无法识别的行 """
+        self.assertEqual(_parse([STREAM]), [
+            ("message", None, "{\"answer\": \"你好\"}", None, "{\"answer\": \"你好\"}\n"),
+            ("update", "7", "line1\nline2", None, "7updateline1\nline2\n"),
+            ("message", None, "世界", "3000", "3000世界\n"),
+            ("message", None, "", None, "{\"code\": 1, \"message\": \"error\"}"),
+            ("message", None, "tail", None, "tail\n"),
+        ])
+
+    def test_split_chunks(self):
+        """ 测试事件与多字节字符被拆分到任意位置时结果不变 """
+        expected = _parse([STREAM])
+        for i in range(1, len(STREAM)):
+            self.assertEqual(_parse([STREAM[:i], b"", STREAM[i:]]), expected, i)
+        self.assertEqual(_parse([STREAM[i:i + 1] for i in range(len(STREAM))]), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
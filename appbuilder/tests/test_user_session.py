@@ -0,0 +1,84 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+import unittest
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+
+from appbuilder.core.context import init_context
+from appbuilder.core.message import Message
+from appbuilder.core.user_session import UserSession
+
+
+class TestUserSession(unittest.TestCase):
+    def setUp(self):
+        # UserSession是进程级单例, 测试中使用独立的数据库后恢复
+        self.saved = UserSession._instance, UserSession._initialized
+        UserSession._instance, UserSession._initialized = None, False
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user_session = UserSession("sqlite:///" + os.path.join(self.tmp.name, "session.db"))
+
+    def tearDown(self):
+        self.user_session._engine.dispose()
+        UserSession._instance, UserSession._initialized = self.saved
+        self.tmp.cleanup()
+
+    def test_sqlite_wal(self):
+        """ 测试SQLite数据库开启WAL模式 """
+        with self.user_session._engine.connect() as conn:
+            self.assertEqual(conn.execute(sqlalchemy.text("PRAGMA journal_mode")).scalar(), "wal")
+
+    def _chat(self, session_id, rounds):
+        histories = []
+        for i in range(rounds):
+            init_context(session_id=session_id, request_id="{}-{}".format(session_id, i))
+            histories.append(len(self.user_session.get_history("query", limit=rounds)))
+            self.user_session.append({"query": Message("{}-{}".format(session_id, i)),
+                                      "answer": Message({"text": "answer"})})
+            self.user_session._post_append()
+        init_context(session_id=session_id, request_id="{}-check".format(session_id))
+        return histories, [msg.content["content"] for msg in self.user_session.get_history("query", limit=rounds)]
+
+    def test_concurrent_sessions(self):
+        """ 测试多线程并发读写不同会话的数据互不干扰 """
+        sessions, rounds = 32, 10
+
+        def run(i):
+            return contextvars.copy_context().run(self._chat, "session-{}".format(i), rounds)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(run, range(sessions)))
+        for i, (histories, queries) in enumerate(results):
+            self.assertEqual(histories, list(range(rounds)))
+            self.assertEqual(queries, ["session-{}-{}".format(i, r) for r in range(rounds)])
+        self.assertEqual(self.user_session._engine.pool.checkedout(), 0)
+
+    def test_failed_write_rolls_back(self):
+        """ 测试写入失败时回滚, 不影响之后的请求 """
+        init_context(session_id="session-failed", request_id="request-1")
+        self.user_session.append({"query": Message("ok"), "answer": Message(object())})
+        with self.assertRaises(Exception):
+            self.user_session._post_append()
+        self.assertEqual(self.user_session.get_history("query"), [])
+        init_context(session_id="session-failed", request_id="request-2")
+        self.user_session.append({"query": Message("ok")})
+        self.user_session._post_append()
+        self.assertEqual([msg.content["content"] for msg in self.user_session.get_history("query")], ["ok"])
+
+
+if __name__ == '__main__':
+    unittest.main()
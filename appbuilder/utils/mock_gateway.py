@@ -0,0 +1,438 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+r"""本地模拟网关, 用于离线测试与性能压测.
+
+模拟CompletionBaseComponent、Embedding、GeneralOCR、TTS、ASR、DocParser以及console(RAG、AgentBuilder、
+Dataset)使用的网关接口, 支持设置响应延迟、SSE流式返回与错误注入。只依赖标准库。
+
+Examples:
+
+    .. code-block:: python
+
+        import os
+        import appbuilder
+        from appbuilder.utils.mock_gateway import MockGateway
+
+        with MockGateway(latency=0.01) as gateway:
+            os.environ["GATEWAY_URL"] = gateway.url
+            os.environ["APPBUILDER_TOKEN"] = "mock-token"
+            play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+            print(play(appbuilder.Message({"query": "你好"})).content)
+
+    也可以作为独立进程启动: python -m appbuilder.utils.mock_gateway --port 8000 --latency 0.05
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlparse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_LIST = {
+    "result": {
+        "common": [
+            {
+                "name": name,
+                "url": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/" + path,
+                "apiType": "chat",
+                "chargeStatus": "OPENED",
+                "versionList": [{"serviceStatus": "Done"}],
+            }
+            for name, path in [
+                ("ERNIE-Bot 4.0", "completions_pro"),
+                ("ERNIE-Bot-8K", "ernie_bot_8k"),
+                ("ERNIE-Bot", "completions"),
+                ("ERNIE-Bot-turbo", "eb-instant"),
+                ("EB-turbo-AppBuilder专用版", "ai_apaas"),
+            ]
+        ] + [{
+            "name": "Embedding-V1",
+            "url": "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/embeddings/embedding-v1",
+            "apiType": "embeddings",
+            "chargeStatus": "OPENED",
+            "versionList": [{"serviceStatus": "Done"}],
+        }],
+        "custom": [],
+    }
+}
+
+# 模型列表支持ETag与Last-Modified条件请求, 列表未变化时返回304
+MODEL_LIST_ETAG = '"{}"'.format(hashlib.sha1(json.dumps(MODEL_LIST, sort_keys=True).encode("utf-8")).hexdigest())
+MODEL_LIST_LAST_MODIFIED = formatdate(usegmt=True)
+
+class _ErrorRule(object):
+    def __init__(self, pattern: str, status: int, body: Optional[Dict[str, Any]], times: Optional[int]):
+        self.pattern = pattern
+        self.status = status
+        self.body = body
+        self.times = times
+
+
+class MockGateway(object):
+    r"""本地模拟网关.
+
+        参数:
+            host(str, 可选): 监听地址, 默认127.0.0.1.
+            port(int, 可选): 监听端口, 默认0表示随机端口.
+            latency(float, 可选): 每个请求返回前的延迟秒数, 默认0.
+            jitter(float, 可选): 在latency基础上增加的[0, jitter)随机延迟, 默认0.
+            stream_chunks(int, 可选): 流式返回的分片数, 默认8.
+            stream_interval(float, 可选): 流式返回相邻分片的间隔秒数, 默认0.
+            error_rate(float, 可选): 随机返回error_status的概率, 默认0.
+            error_status(int, 可选): 随机错误的HTTP状态码, 默认500.
+            token(str, 可选): 设置后校验X-Appbuilder-Authorization, 不匹配时返回401.
+            embedding_dim(int, 可选): 返回的向量维度, 默认384.
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 stream_chunks: int = 8,
+                 stream_interval: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 500,
+                 token: Optional[str] = None,
+                 embedding_dim: int = 384):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.stream_interval = stream_interval
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token = token
+        self.embedding_dim = embedding_dim
+
+        self._lock = threading.Lock()
+        self._route_latency = {}
+        self._errors = []
+        self._counts = {}
+        self._thread = None
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        r"""网关地址, 可以作为GATEWAY_URL使用"""
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self) -> "MockGateway":
+        r"""在后台线程中启动网关"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        r"""停止网关并释放端口"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_latency(self, pattern: str, latency: float):
+        r"""设置路径中包含pattern的请求的延迟, 优先于全局latency"""
+        with self._lock:
+            self._route_latency[pattern] = latency
+
+    def inject_error(self, pattern: str, status: int = 500, body: Optional[Dict[str, Any]] = None,
+                     times: Optional[int] = None):
+        r"""路径中包含pattern的请求返回错误.
+
+            参数:
+                pattern(str): 路径子串, 例如"/api/llm/"、"/ocr/".
+                status(int, 可选): HTTP状态码, 默认500.
+                body(dict, 可选): 返回体, 默认{"code": status, "message": "injected error", "requestId": ...}.
+                times(int, 可选): 生效次数, 默认一直生效.
+        """
+        with self._lock:
+            self._errors.append(_ErrorRule(pattern, status, body, times))
+
+    def clear_errors(self):
+        r"""清除所有注入的错误"""
+        with self._lock:
+            self._errors = []
+
+    def request_counts(self) -> Dict[str, int]:
+        r"""返回每个路由收到的请求数"""
+        with self._lock:
+            return dict(self._counts)
+
+    def _count(self, route: str):
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def _delay(self, path: str) -> float:
+        with self._lock:
+            for pattern, latency in self._route_latency.items():
+                if pattern in path:
+                    return latency
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def _match_error(self, path: str) -> Optional[_ErrorRule]:
+        with self._lock:
+            for rule in self._errors:
+                if rule.pattern in path and (rule.times is None or rule.times > 0):
+                    if rule.times is not None:
+                        rule.times -= 1
+                    return rule
+        if self.error_rate and random.random() < self.error_rate:
+            return _ErrorRule(path, self.error_status, None, None)
+        return None
+
+
+def _make_handler(gateway: MockGateway):
+    class _Handler(_GatewayHandler):
+        pass
+
+    _Handler.gateway = gateway
+    return _Handler
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分开写入, 不关闭Nagle算法时会与客户端的延迟确认叠加出约40ms的延迟
+    disable_nagle_algorithm = True
+    gateway: MockGateway = None
+
+    routes = [
+        (re.compile(r"/service/list$"), "model_list"),
+        (re.compile(r"/api/llm/"), "completion"),
+        (re.compile(r"/embeddings/"), "embedding"),
+        (re.compile(r"/aip/ocr/v1/"), "ocr"),
+        (re.compile(r"/aip_speech/tts_online$"), "tts"),
+        (re.compile(r"/paddle_speech/text2audio$"), "paddle_tts"),
+        (re.compile(r"/aip_speech/asrpro$"), "asr"),
+        (re.compile(r"/xmind/parser$"), "doc_parser"),
+        (re.compile(r"/conversation/create$"), "conversation_create"),
+        (re.compile(r"/instance/integrated$"), "integrated"),
+        (re.compile(r"/instance/upload$"), "upload"),
+        (re.compile(r"/datasets/create$"), "dataset_create"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self._read_body()
+        path = urlparse(self.path).path
+        route = next((name for pattern, name in self.routes if pattern.search(path)), None)
+        self.gateway._count(route or "not_found")
+        delay = self.gateway._delay(path)
+        if delay > 0:
+            time.sleep(delay)
+
+        self.request_id = str(uuid.uuid4())
+        if self.gateway.token is not None and \
+                self.headers.get("X-Appbuilder-Authorization", "") not in (self.gateway.token,
+                                                                           "Bearer " + self.gateway.token):
+            return self._reply_json(401, {"code": 401, "message": "unauthorized", "requestId": self.request_id})
+        rule = self.gateway._match_error(path)
+        if rule is not None:
+            data = rule.body if rule.body is not None else \
+                {"code": rule.status, "message": "injected error", "requestId": self.request_id}
+            return self._reply_json(rule.status, data)
+        if route is None:
+            return self._reply_json(404, {"code": 404, "message": "not found", "requestId": self.request_id})
+        try:
+            payload = json.loads(body) if body and body[:1] in (b"{", b"[") else None
+        except ValueError:
+            payload = None
+        getattr(self, "_route_" + route)(payload, body)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    return body
+                body += chunk
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send_headers(self, status: int, content_type: str, length: Optional[int] = None,
+                      headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("X-Appbuilder-Request-Id", self.request_id)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def _reply_json(self, status: int, data: Any):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send_headers(status, "application/json", len(payload))
+        self.wfile.write(payload)
+
+    def _reply_bytes(self, content_type: str, payload: bytes):
+        self._send_headers(200, content_type, len(payload))
+        self.wfile.write(payload)
+
+    def _reply_sse(self, events: List[Any]):
+        self._send_headers(200, "text/event-stream")
+        for index, event in enumerate(events):
+            if index and self.gateway.stream_interval:
+                time.sleep(self.gateway.stream_interval)
+            data = event if isinstance(event, str) else json.dumps(event, ensure_ascii=False)
+            self._write_chunk("data: {}\n\n".format(data).encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write("{:x}\r\n".format(len(data)).encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _split_answer(self, answer: str) -> List[str]:
+        count = max(1, self.gateway.stream_chunks)
+        size = max(1, -(-len(answer) // count))
+        return [answer[i:i + size] for i in range(0, len(answer), size)] or [""]
+
+    # 以下为各个路由的模拟实现
+    def _route_model_list(self, payload, body):
+        headers = {"ETag": MODEL_LIST_ETAG, "Last-Modified": MODEL_LIST_LAST_MODIFIED}
+        if self.headers.get("If-None-Match") == MODEL_LIST_ETAG or \
+                self.headers.get("If-Modified-Since") == MODEL_LIST_LAST_MODIFIED:
+            self.gateway._count("model_list_not_modified")
+            return self._send_headers(304, "application/json", 0, headers)
+        payload = json.dumps(MODEL_LIST, ensure_ascii=False).encode("utf-8")
+        self._send_headers(200, "application/json", len(payload), headers)
+        self.wfile.write(payload)
+
+    def _route_completion(self, payload, body):
+        payload = payload or {}
+        query = payload.get("query", "")
+        answer = "mock answer: {}".format(query)
+        usage = {"prompt_tokens": len(query), "completion_tokens": len(answer),
+                 "total_tokens": len(query) + len(answer)}
+        if payload.get("response_mode") == "streaming":
+            chunks = self._split_answer(answer)
+            events = [{"answer": chunk} for chunk in chunks[:-1]]
+            events.append({"answer": chunks[-1], "usage": usage})
+            return self._reply_sse(events)
+        self._reply_json(200, {"answer": answer, "usage": usage})
+
+    def _route_embedding(self, payload, body):
+        texts = (payload or {}).get("input", [])
+        dim = self.gateway.embedding_dim
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(text) % 7) / 7] * dim}
+                for i, text in enumerate(texts)]
+        self._reply_json(200, {"id": self.request_id, "object": "embedding_list", "data": data,
+                               "usage": {"prompt_tokens": sum(len(t) for t in texts)}})
+
+    def _route_ocr(self, payload, body):
+        words = [{"words": "mock line {}".format(i)} for i in range(3)]
+        self._reply_json(200, {"log_id": 1, "direction": 0, "words_result_num": len(words),
+                               "words_result": words})
+
+    def _route_tts(self, payload, body):
+        self._reply_bytes("audio/mp3", b"\xff\xfb" + b"\x00" * 4094)
+
+    def _route_paddle_tts(self, payload, body):
+        chunk = base64.b64encode(b"\x00" * 1024).decode()
+        if (payload or {}).get("stream"):
+            return self._reply_sse([chunk] * max(1, self.gateway.stream_chunks))
+        self._reply_bytes("audio/wav", b"RIFF" + b"\x00" * 4092)
+
+    def _route_asr(self, payload, body):
+        self._reply_json(200, {"err_no": 0, "err_msg": "success.", "corpus_no": "1", "sn": self.request_id,
+                               "result": ["mock asr result"]})
+
+    def _route_doc_parser(self, payload, body):
+        layouts = [{"type": "text", "text": "mock paragraph {}".format(i), "box": [0, 20 * i, 500, 20],
+                    "node_id": i} for i in range(5)]
+        para_nodes = [{"node_id": item["node_id"], "text": item["text"], "para_type": "text", "parent": None,
+                       "children": [], "position": [{"pageno": 0, "box": item["box"]}]} for item in layouts]
+        result = {
+            "para_nodes": para_nodes,
+            "catalog": [],
+            "pdf_data": "",
+            "file_content": [{"page_num": 0, "page_size": {"width": 595, "height": 842}, "page_angle": 0,
+                              "page_content": {"type": "text", "layout": layouts}}],
+        }
+        self._reply_json(200, {"error_code": 0, "error_msg": "", "log_id": self.request_id,
+                               "result": {"result_list": [result]}})
+
+    def _console(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {"code": 0, "message": "", "request_id": self.request_id, "result": result}
+
+    def _route_conversation_create(self, payload, body):
+        self._reply_json(200, self._console({"conversation_id": str(uuid.uuid4())}))
+
+    def _route_upload(self, payload, body):
+        self._reply_json(200, self._console({"id": str(uuid.uuid4()), "name": "mock_file"}))
+
+    def _route_dataset_create(self, payload, body):
+        self._reply_json(200, self._console({"id": str(uuid.uuid4()), "name": (payload or {}).get("name", "")}))
+
+    def _route_integrated(self, payload, body):
+        payload = payload or {}
+        answer = "mock answer: {}".format(payload.get("query", ""))
+        conversation_id = payload.get("conversation_id") or str(uuid.uuid4())
+
+        def _result(text, done):
+            return self._console({"answer": text, "conversation_id": conversation_id,
+                                  "message_id": self.request_id, "is_completion": done, "content": []})
+
+        if payload.get("response_mode") == "streaming":
+            chunks = self._split_answer(answer)
+            return self._reply_sse([_result(chunk, i == len(chunks) - 1) for i, chunk in enumerate(chunks)])
+        self._reply_json(200, _result(answer, True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="appbuilder mock gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--stream-interval", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    gateway = MockGateway(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                          stream_chunks=args.stream_chunks, stream_interval=args.stream_interval,
+                          error_rate=args.error_rate)
+    print(gateway.url, flush=True)
+    try:
+        gateway._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import json
 import proto
-from typing import Optional, MutableSequence
+import requests
+import threading
+from typing import Optional, MutableSequence, Tuple, Dict
 
 import appbuilder
-from appbuilder.core._client import HTTPClient
+from appbuilder.core._client import HTTPClient, shared_http_client
+from appbuilder.utils.logger_util import logger
 
 r"""模型名称到简称的映射.
 """
@@ -33,6 +37,22 @@ model_name_mapping = [
     ("EB-turbo-AppBuilder专用版", "ERNIE Speed-AppBuilder"),
 ]
 
+r"""已废弃的简称及推荐使用的名称, 每个简称只在第一次使用时告警.
+"""
+deprecated_short_names = {
+    "eb-turbo-appbuilder": "ERNIE Speed-AppBuilder",
+}
+_warned_short_names = set()
+
+
+def _warn_deprecated_short_name(short_name: str):
+    if short_name not in deprecated_short_names or short_name in _warned_short_names:
+        return
+    _warned_short_names.add(short_name)
+    logger.warning("Deprecate warning: model [{}] is deprecated, please use [{}]".format(
+        short_name, deprecated_short_names[short_name]))
+
+
 class RemoteModel(object):
     r"""远程模型类，用于封装远程模型的名称信息.
          参数:
@@ -60,10 +80,7 @@ class RemoteModel(object):
             short_name(str):
                 模型简称。
          """
-        # TODO(chengmo): 使用logging 替换 print，解决print多次的问题
-        if short_name == "eb-turbo-appbuilder":
-            print("Deprecate warning: model [eb-turbo-appbuilder] is deprecated, please use [ERNIE Speed-AppBuilder]")
-
+        _warn_deprecated_short_name(short_name)
         if short_name in self.short_names:
             return self.remote_name
         return None
@@ -73,6 +90,10 @@ class RemoteModelCollector():
     有两个核心功能：
     1、注册远程模型名和本地short_name
     2、根据short_name获取远程模型名
+
+    注册时维护short_name到远程模型名的反向索引, 查询为O(1)。同一个short_name注册到多个远程模型时, 以最先注册的为准。
+    设置环境变量APPBUILDER_MODEL_NAME_MAPPING为映射文件路径时, 导入时会自动调用register_from_file注册,
+    文件不存在或格式错误时记录日志并只使用内置的映射。
     """
     _instance = None
     _initialized = False
@@ -81,7 +102,9 @@ class RemoteModelCollector():
         if self._initialized:
             return
         self._initialized = True
+        self._lock = threading.Lock()
         self.remote_models = {}
+        self._short_names = {}
 
     def __new__(cls, *args, **kwargs):
         """
@@ -99,29 +122,64 @@ class RemoteModelCollector():
             short_name(str):
                 模型简称。
          """
-        if remote_name not in self.remote_models:
-            self.remote_models[remote_name] = RemoteModel(remote_name)
-        
-        self.remote_models[remote_name].register_short_name(short_name)
-    
+        with self._lock:
+            if remote_name not in self.remote_models:
+                self.remote_models[remote_name] = RemoteModel(remote_name)
+            self.remote_models[remote_name].register_short_name(short_name)
+            self._short_names.setdefault(short_name, remote_name)
+
+    def register_from_file(self, path: str):
+        r"""从JSON文件批量注册远程模型名和short_name.
+         参数:
+            path(str):
+                映射文件路径, 内容为远程模型名到简称列表的字典, 例如{"ERNIE-Bot 4.0": ["eb-4"]},
+                或者[远程模型名, 简称]组成的列表, 例如[["ERNIE-Bot 4.0", "eb-4"]]。
+         """
+        with open(path, "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+        if isinstance(mapping, dict):
+            pairs = [(remote_name, short_name) for remote_name, short_names in mapping.items()
+                     for short_name in ([short_names] if isinstance(short_names, str) else short_names)]
+        elif isinstance(mapping, list):
+            pairs = [tuple(pair) for pair in mapping]
+        else:
+            raise ValueError("model name mapping must be a dict or a list, got {}".format(type(mapping).__name__))
+        # 全部校验通过后再注册, 格式错误的文件不会注册其中的一部分
+        for pair in pairs:
+            if len(pair) != 2 or not all(isinstance(name, str) for name in pair):
+                raise ValueError("invalid model name mapping item: {}".format(list(pair)))
+        for remote_name, short_name in pairs:
+            self.register_remote_model_name(remote_name, short_name)
+
     def get_remote_name_by_short_name(self, short_name: str) -> Optional[str]:
         r"""根据short_name获取远程模型名.
          参数:
             short_name(str):
                 模型简称。
          """
-        for remote_model in self.remote_models.values():
-            remote_name = remote_model.get_remote_name_by_short_name(short_name)
-            if remote_name is not None:
-                return remote_name
-        
-        return None
+        _warn_deprecated_short_name(short_name)
+        return self._short_names.get(short_name)
 
 
 remote_model_collector = RemoteModelCollector()
 for remote_name, short_name in model_name_mapping:
     remote_model_collector.register_remote_model_name(remote_name, short_name)
 
+
+def _register_mapping_from_env():
+    r"""注册APPBUILDER_MODEL_NAME_MAPPING指定的映射文件, 失败时不影响导入appbuilder"""
+    path = os.getenv("APPBUILDER_MODEL_NAME_MAPPING")
+    if not path:
+        return
+    try:
+        remote_model_collector.register_from_file(path)
+    except (OSError, ValueError, TypeError) as e:
+        logger.error("failed to load model name mapping from {}, use the builtin mapping: {}".format(path, e))
+
+
+_register_mapping_from_env()
+
+
 class GetModelListRequest(proto.Message):
     r"""获取模型列表请求体
          参数:
@@ -297,7 +355,9 @@ class Models:
             返回：
                 无
         """
-        self.http_client = client or HTTPClient(secret_key, gateway)
+        if client is None:
+            client, _ = shared_http_client(self, secret_key, gateway)
+        self.http_client = client
 
     def list(self, request: GetModelListRequest = None, timeout: float = None,
              retry: int = 0) -> GetModelListResponse:
@@ -312,15 +372,41 @@ class Models:
         返回:
             obj:`GetModelListResponse`: 模型列表返回体。
         """
+        response, _ = self.list_if_modified(request, timeout=timeout, retry=retry)
+        return response
+
+    def list_if_modified(self, request: GetModelListRequest = None, etag: Optional[str] = None,
+                         last_modified: Optional[str] = None, timeout: float = None,
+                         retry: int = 0) -> Tuple[Optional[GetModelListResponse], Dict[str, Optional[str]]]:
+        """
+        带条件地查询模型列表, 网关支持ETag或Last-Modified时, 模型列表未变化的请求不会返回列表内容。
+
+        参数:
+            request (obj:`GetModelListRequest`):模型列表查询请求体。
+            etag (str, 可选): 上一次返回的ETag, 作为If-None-Match发送。
+            last_modified (str, 可选): 上一次返回的Last-Modified, 作为If-Modified-Since发送。
+            timeout (float, 可选): 请求的超时时间。
+            retry (int, 可选): 请求的重试次数。
+
+        返回:
+            tuple: (GetModelListResponse, validators), 模型列表未变化时GetModelListResponse为None;
+                validators为本次返回的{"etag": ..., "last_modified": ...}, 用于下一次条件请求。
+        """
         url = self.http_client.service_url("/v1/bce/wenxinworkshop/service/list")
         if request is None:
             request = GetModelListRequest()
         data = GetModelListRequest.to_json(request)
         headers = self.http_client.auth_header()
         headers['content-type'] = 'application/json'
-        if retry != self.http_client.retry.total:
-            self.http_client.retry.total = retry
-        response = self.http_client.session.post(url, data=data, headers=headers, timeout=timeout)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = self.http_client.post(url, data=data, headers=headers, retry=retry, timeout=timeout)
+        validators = {"etag": response.headers.get("ETag") or etag,
+                      "last_modified": response.headers.get("Last-Modified") or last_modified}
+        if response.status_code == requests.codes.not_modified and (etag or last_modified):
+            return None, validators
         self.http_client.check_response_header(response)
         data = response.json()
         self.http_client.check_response_json(data)
@@ -328,7 +414,7 @@ class Models:
         self.__class__._check_service_error(request_id, data)
         response = GetModelListResponse.from_json(payload=json.dumps(data),  ignore_unknown_fields=True)
         response.request_id = request_id
-        return response
+        return response, validators
 
     @staticmethod
     def _check_service_error(request_id: str, data: dict):
@@ -14,6 +14,7 @@
 """
 SSE Client util
 """
+import re
 import logging
 import os
 import time
@@ -31,6 +32,109 @@ from tenacity import (
 )
 
 
+# 事件之间以空行分隔, 兼容\n、\r\n与\r三种换行
+_EVENT_BOUNDARY = re.compile(rb"\r\n\r\n|\n\n|\r\r")
+_KNOWN_FIELDS = (b"data", b"event", b"id", b"retry")
+
+
+class _EventSplitter(object):
+    """
+    按SSE分隔符（空的新行）切分事件块。
+    收到的数据追加到同一个bytearray中, 每个块只从上次未匹配的位置开始扫描一次分隔符,
+    已切出的事件块在处理完整个块后一次性从缓冲区删除。
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._scan_from = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """追加数据, 返回已完整的事件块"""
+        if not chunk:
+            return []
+        buf = self._buf
+        buf += chunk
+        blocks = []
+        start = 0
+        scan_from = self._scan_from
+        while True:
+            match = _EVENT_BOUNDARY.search(buf, scan_from)
+            if match is None:
+                break
+            blocks.append(bytes(buf[start:match.end()]))
+            start = scan_from = match.end()
+        if start:
+            del buf[:start]
+        # 分隔符可能被拆分到两个块中, 下次从末尾前3个字节开始扫描
+        self._scan_from = max(0, len(buf) - 3)
+        return blocks
+
+    def flush(self) -> bytes:
+        """返回流结束时剩余的数据"""
+        tail = bytes(self._buf)
+        self._buf = bytearray()
+        self._scan_from = 0
+        return tail
+
+
+def _parse_event(block: bytes, char_enc: str, debug: bool):
+    """
+    解析一个事件块, 按字节解析, 只对字段值解码; 没有data也没有其他内容的事件返回None。
+    """
+    lines = block.splitlines()
+    # 大模型流式响应的事件通常只有一行data, 直接解析
+    if len(lines) == 1 and lines[0].startswith(b'data:'):
+        value = lines[0][6:] if lines[0].startswith(b'data: ') else lines[0][5:]
+        event = Event(data=value.decode(char_enc))
+        event._raw_parts = [value, b'\n']
+        event._char_enc = char_enc
+        if debug:
+            logging.debug('Dispatching %s...', event.debug_str)
+        return event
+
+    event = Event()
+    data_lines = []
+    raw_parts = []
+    for line in lines:
+        # Lines starting with a separator are comments and are to be
+        # ignored.
+        if not line.strip() or line.startswith(b':'):
+            continue
+        field, sep, value = line.partition(b':')
+        # Ignore unknown fields.
+        if field not in _KNOWN_FIELDS:
+            raw_parts.append(line)
+            if debug:
+                logging.debug('Saw invalid field %s while parsing Server Side Event', field)
+            continue
+        # From the spec:
+        # "If value starts with a single U+0020 SPACE character,
+        # remove it from value."
+        if value.startswith(b' '):
+            value = value[1:]
+        # The data field may come over multiple lines and their values
+        # are concatenated with each other.
+        if field == b'data':
+            data_lines.append(value)
+            raw_parts.append(value + b'\n')
+        else:
+            setattr(event, field.decode(), value.decode(char_enc))
+            raw_parts.append(value)
+
+    if data_lines:
+        event.data = b'\n'.join(data_lines).decode(char_enc)
+    elif not raw_parts:
+        # Events with no data are not dispatched.
+        return None
+    event._raw_parts = raw_parts
+    event._char_enc = char_enc
+    # Empty event names default to 'message'
+    event.event = event.event or 'message'
+    if debug:
+        logging.debug('Dispatching %s...', event.debug_str)
+    return event
+
+
 class SSEClient:
     """
     一个简易的SSE Client，用于接收服务端发送的SSE事件。
@@ -42,25 +146,32 @@ class SSEClient:
         事件源应为二进制流，并具有 close() 方法。
         这通常是实现 io.BinaryIOBase 的东西，比如 httplib 或 urllib3HTTPResponse 对象。
         """
-        logging.info(f'Initialized SSE client from event source {event_source}')
+        logging.debug('Initialized SSE client from event source %s', event_source)
         self._event_source = event_source
         self._char_enc = char_enc
 
+    def _iter_source(self):
+        """
+        chunked编码的requests响应按服务端发送的HTTP块读取, 避免默认按128字节切分带来的大量小块;
+        其他事件源直接迭代。
+        """
+        raw = getattr(self._event_source, "raw", None)
+        if raw is not None and getattr(raw, "chunked", False) and hasattr(self._event_source, "iter_content"):
+            return self._event_source.iter_content(chunk_size=None)
+        return self._event_source
+
     def _read(self):
         """
         读取传入的事件源流并生成事件块。
         不幸的是，有些服务器可能会决定在响应中将事件分解为多个HTTP块。
         因此，有必要正确地将连续的响应块缝合在一起，并找到SSE分隔符（空的新行），以生成完整、正确的事件块。
         """
-        data = b''
-        for chunk in self._event_source:
-            for line in chunk.splitlines(True):
-                data += line
-                if data.endswith((b'\r\r', b'\n\n', b'\r\n\r\n')):
-                    yield data
-                    data = b''
-        if data:
-            yield data
+        splitter = _EventSplitter()
+        for chunk in self._iter_source():
+            yield from splitter.feed(chunk)
+        tail = splitter.flush()
+        if tail:
+            yield tail
 
     def events(self):
         """
@@ -72,65 +183,11 @@ class SSEClient:
         Returns:
             generator: 解析后的 Event 对象的生成器。
         """
-        for chunk in self._read():
-            event = Event()
-            # Split before decoding so splitlines() only uses \r and \n
-            for line in chunk.splitlines():
-                # Decode the line.
-                line = line.decode(self._char_enc)
-                # Lines starting with a separator are comments and are to be
-                # ignored.
-                if not line.strip() or line.startswith(':'):
-                    continue
-                logging.debug(f"raw line: {line}")
-                data = line.split(':', 1)
-                field = data[0]
-                # Ignore unknown fields.
-                if field not in event.__dict__:
-                    event.raw += line
-                    logging.info(f'Saw invalid field {field} while parsing Server Side Event')
-                    continue
-
-                if len(data) > 1:
-                    # From the spec:
-                    # "If value starts with a single U+0020 SPACE character,
-                    # remove it from value."
-                    if data[1].startswith(' '):
-                        value = data[1][1:]
-                    else:
-                        value = data[1]
-                else:
-                    # If no value is present after the separator,
-                    # assume an empty value.
-                    value = ''
-                # The data field may come over multiple lines and their values
-                # are concatenated with each other.
-                if field == 'data':
-                    event.__dict__[field] += value + '\n'
-                    event.raw += value + '\n'
-                else:
-                    event.__dict__[field] = value
-                    event.raw += value
-
-            # Events with no data are not dispatched.
-            if not event.data:
-                if event.raw:
-                    # unknown error
-                    pass
-                else:
-                    continue
-            else:
-                # If the data field ends with a newline, remove it.
-                if event.data.endswith('\n'):
-                    event.data = event.data[0:-1]
-            # Empty event names default to 'message'
-            event.event = event.event or 'message'
-            # Dispatch the event
-            if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
-                logging.debug(f'Dispatching {event.debug_str}...')
-            else:
-                logging.info(f'Dispatching {event}...')
-            yield event
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        for block in self._read():
+            event = _parse_event(block, self._char_enc, debug)
+            if event is not None:
+                yield event
 
     def close(self):
         """
@@ -139,6 +196,34 @@ class SSEClient:
         self._event_source.close()
 
 
+class AsyncSSEClient(SSEClient):
+    """
+    SSEClient的异步版本, 事件源为异步迭代的二进制数据块, 比如AsyncHTTPClient以stream=True返回的AsyncStreamResponse。
+    """
+
+    async def _read(self):
+        splitter = _EventSplitter()
+        async for chunk in self._event_source:
+            for block in splitter.feed(chunk):
+                yield block
+        tail = splitter.flush()
+        if tail:
+            yield tail
+
+    async def events(self):
+        """
+        从给定的输入流中异步读取 Server-Side-Event (SSE) 数据，并生成解析后的 Event 对象。
+
+        Returns:
+            async generator: 解析后的 Event 对象的异步生成器。
+        """
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        async for block in self._read():
+            event = _parse_event(block, self._char_enc, debug)
+            if event is not None:
+                yield event
+
+
 class Event(object):
     """
     事件流中的事件。
@@ -148,7 +233,20 @@ class Event(object):
         self.event = event
         self.data = data
         self.retry = retry
-        self.raw = ""
+        self._raw = None
+        self._raw_parts = []
+        self._char_enc = 'utf-8'
+
+    @property
+    def raw(self):
+        """事件中除注释外的原始内容, 首次访问时才解码拼接"""
+        if self._raw is None:
+            self._raw = b''.join(self._raw_parts).decode(self._char_enc)
+        return self._raw
+
+    @raw.setter
+    def raw(self, value):
+        self._raw = value
 
     def __str__(self):
         s = f'{self.event} event'
@@ -0,0 +1,122 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+r"""AgentRuntime流式接口SSE帧编码的微基准, 对比逐块deepcopy并多次序列化的旧实现与_SSEEncoder.
+
+在单线程中编码一个长回答的全部数据块, 按进程CPU时间输出每核每秒编码的帧数。
+
+    python benchmarks/agent_sse.py --chunks 20000
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appbuilder.core.agent import _SSEEncoder  # noqa: E402
+from appbuilder.core.message import Message  # noqa: E402
+
+
+class StreamContent(object):
+    r"""模拟大模型流式输出的content, 迭代时累积完整回答, deepcopy时共享数据块列表"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._concat = ""
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self._concat += chunk
+            yield chunk
+
+    def __deepcopy__(self, memo):
+        result = StreamContent(self._chunks)
+        result._concat = self._concat
+        return result
+
+
+def legacy_frames(session_id, stream_message):
+    r"""改写前的实现: 每个数据块deepcopy整个Message, 序列化后再解析、再序列化, 并打印INFO日志"""
+    content_iterator = iter(stream_message.content)
+    prev_content = next(content_iterator)
+    prev_result = copy.deepcopy(stream_message)
+    prev_result.content = prev_content
+    for sub_content in content_iterator:
+        logging.info(f"[session_id={session_id}] streaming_result={prev_result}")
+        yield "data: " + json.dumps({
+            "code": 0, "message": "",
+            "result": {
+                "session_id": session_id,
+                "is_completion": False,
+                "answer_message": json.loads(prev_result.json(exclude_none=True))
+            }
+        }, ensure_ascii=False) + "\n\n"
+        prev_result = copy.deepcopy(stream_message)
+        prev_result.content = sub_content
+    logging.info(f"[session_id={session_id}] streaming_result={prev_result}")
+    yield "data: " + json.dumps({
+        "code": 0, "message": "",
+        "result": {
+            "session_id": session_id,
+            "is_completion": True,
+            "answer_message": json.loads(prev_result.json(exclude_none=True))
+        }
+    }, ensure_ascii=False) + "\n\n"
+
+
+def current_frames(session_id, stream_message):
+    r"""AgentRuntime中的实现"""
+    encoder = _SSEEncoder(session_id, stream_message)
+    content_iterator = iter(stream_message.content)
+    prev_answer = encoder.answer_message(next(content_iterator))
+    for sub_content in content_iterator:
+        yield encoder.frame(prev_answer)
+        prev_answer = encoder.answer_message(sub_content)
+    yield encoder.frame(prev_answer, is_completion=True)
+
+
+def measure(frames_fn, chunks, repeat: int):
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        stream_message = Message(StreamContent(chunks), extra={}, token_usage={})
+        start = time.process_time()
+        output = list(frames_fn("benchmark-session", stream_message))
+        best = min(best, time.process_time() - start)
+    return len(chunks) / best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgentRuntime SSE encoding micro benchmark")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=8, help="每个数据块的字符数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    chunks = [("百度千帆大模型平台" * (args.chunk_size // 9 + 1))[:args.chunk_size]] * args.chunks
+    legacy, legacy_output = measure(legacy_frames, chunks, args.repeat)
+    current, current_output = measure(current_frames, chunks, args.repeat)
+    assert legacy_output == current_output
+    print("{:>20} {:>20} {:>8}".format("legacy frames/s", "current frames/s", "speedup"))
+    print("{:>20,.0f} {:>20,.0f} {:>7.1f}x".format(legacy, current, current / legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+r"""import appbuilder的冷启动耗时.
+
+每个场景在新的解释器进程中执行, 取多次运行的中位数。设置--max-ms后, import appbuilder超过阈值时
+以非零状态码退出, 可以在CI中防止启动耗时回退。
+
+    python benchmarks/import_time.py --runs 10 --max-ms 50
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import appbuilder": "import appbuilder",
+    "appbuilder.Message": "import appbuilder; appbuilder.Message",
+    "appbuilder.Playground": "import appbuilder; appbuilder.Playground",
+    "appbuilder.GeneralOCR": "import appbuilder; appbuilder.GeneralOCR",
+    "appbuilder.AgentRuntime": "import appbuilder; appbuilder.AgentRuntime",
+    "all public names": "import appbuilder; [getattr(appbuilder, n) for n in appbuilder.__all__]",
+}
+
+_TIMER = "import time; _t = time.perf_counter(); {}; print((time.perf_counter() - _t) * 1000)"
+
+
+def measure(code: str, runs: int) -> float:
+    r"""在新进程中执行code runs次, 返回耗时中位数(毫秒)"""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, "-c", _TIMER.format(code)], cwd=_ROOT)
+        samples.append(float(out.decode().strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="appbuilder import time benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="import appbuilder的耗时上限(毫秒)")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    results = {name: measure(code, args.runs) for name, code in SCENARIOS.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, ms in results.items():
+            print("{:<26} {:>9.1f} ms".format(name, ms))
+
+    if args.max_ms is not None and results["import appbuilder"] > args.max_ms:
+        print("import appbuilder took {:.1f} ms, exceeds {:.1f} ms".format(
+            results["import appbuilder"], args.max_ms), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+r"""端到端压测: 在本地模拟网关上逐个压测各组件的请求路径.
+
+统计每个场景的吞吐(req/s)、p50/p99延迟、单请求CPU耗时以及进程的峰值RSS。模拟网关默认在独立进程中运行,
+统计的CPU耗时只包含SDK本身。
+
+    python benchmarks/run_benchmarks.py --requests 500 --concurrency 16 --latency 0.01
+    python benchmarks/run_benchmarks.py --scenarios completion,completion_stream --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import appbuilder  # noqa: E402
+from appbuilder.utils.mock_gateway import MockGateway  # noqa: E402
+
+_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "appbuilder", "tests", "test.pdf")
+
+
+def _completion() -> Callable[[], None]:
+    play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+
+    def run():
+        play(appbuilder.Message({"query": "你好"}))
+    return run
+
+
+def _completion_stream() -> Callable[[], None]:
+    play = appbuilder.Playground(prompt_template="{query}", model="eb-4")
+
+    def run():
+        for _ in play(appbuilder.Message({"query": "介绍一下百度千帆"}), stream=True).content:
+            pass
+    return run
+
+
+def _embedding() -> Callable[[], None]:
+    embedding = appbuilder.Embedding()
+
+    def run():
+        embedding(appbuilder.Message("百度千帆"))
+    return run
+
+
+def _general_ocr() -> Callable[[], None]:
+    ocr = appbuilder.GeneralOCR()
+    image = os.urandom(256 * 1024)
+
+    def run():
+        ocr.run(appbuilder.Message({"raw_image": image}))
+    return run
+
+
+def _tts() -> Callable[[], None]:
+    tts = appbuilder.TTS()
+
+    def run():
+        tts.run(appbuilder.Message({"text": "欢迎使用百度千帆"}))
+    return run
+
+
+def _asr() -> Callable[[], None]:
+    asr = appbuilder.ASR()
+    audio = os.urandom(64 * 1024)
+
+    def run():
+        asr.run(appbuilder.Message({"raw_audio": audio}))
+    return run
+
+
+def _doc_parser() -> Callable[[], None]:
+    parser = appbuilder.DocParser()
+
+    def run():
+        parser.run(appbuilder.Message(_PDF))
+    return run
+
+
+def _agent_builder() -> Callable[[], None]:
+    builder = appbuilder.AgentBuilder("benchmark-app")
+    conversation_id = builder.create_conversation()
+
+    def run():
+        for _ in builder.run(conversation_id, "你好", stream=True).content:
+            pass
+    return run
+
+
+SCENARIOS = {
+    "completion": _completion,
+    "completion_stream": _completion_stream,
+    "embedding": _embedding,
+    "general_ocr": _general_ocr,
+    "tts": _tts,
+    "asr": _asr,
+    "doc_parser": _doc_parser,
+    "agent_builder": _agent_builder,
+}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_scenario(name: str, requests: int, concurrency: int) -> Dict[str, float]:
+    r"""压测单个场景, 返回统计结果"""
+    func = SCENARIOS[name]()
+    # 预热: 建立连接、加载模型列表
+    func()
+
+    latencies = []
+    errors = 0
+
+    def _timed(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_timed, i) for i in range(requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "throughput": requests / wall if wall else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "cpu_ms_per_request": cpu / requests * 1000,
+        # Linux下ru_maxrss单位为KB, macOS下为字节
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def _start_gateway(args) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "appbuilder.utils.mock_gateway", "--port", "0",
+         "--latency", str(args.latency), "--stream-interval", str(args.stream_interval)],
+        stdout=subprocess.PIPE, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ["GATEWAY_URL"] = proc.stdout.readline().strip()
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="appbuilder end to end benchmarks")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟网关的响应延迟(秒)")
+    parser.add_argument("--stream-interval", type=float, default=0.0, help="模拟网关SSE事件间隔(秒)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--in-process", action="store_true", help="在压测进程内启动模拟网关")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenarios: {}".format(", ".join(unknown)))
+
+    os.environ.setdefault("APPBUILDER_TOKEN", "benchmark-token")
+    if args.in_process:
+        gateway = MockGateway(latency=args.latency, stream_interval=args.stream_interval).start()
+        os.environ["GATEWAY_URL"] = gateway.url
+        stop = gateway.stop
+    else:
+        proc = _start_gateway(args)
+
+        def stop():
+            proc.terminate()
+            proc.wait()
+
+    try:
+        results = [run_scenario(name, args.requests, args.concurrency) for name in names]
+    finally:
+        stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = "{:<18} {:>8} {:>7} {:>10} {:>9} {:>9} {:>11} {:>9}".format(
+        "scenario", "requests", "errors", "req/s", "p50(ms)", "p99(ms)", "cpu/req(ms)", "rss(MB)")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print("{:<18} {:>8} {:>7} {:>10.1f} {:>9.2f} {:>9.2f} {:>11.3f} {:>9.1f}".format(
+            r["scenario"], r["requests"], r["errors"], r["throughput"], r["p50_ms"], r["p99_ms"],
+            r["cpu_ms_per_request"], r["max_rss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Copyright (c) 2023 Baidu, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+r"""SSEClient解析吞吐的微基准, 对比逐行拼接的旧实现与增量解析的新实现.
+
+录制的流与网关返回的大模型流式响应格式一致, 分别按requests默认的128字节与按事件切块重放, 输出每秒解析的token数。
+
+    python benchmarks/sse_parser.py --tokens 20000
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appbuilder.utils.sse_util import SSEClient, Event  # noqa: E402
+
+
+class LegacySSEClient(SSEClient):
+    r"""改写前的实现: 逐行拼接bytes, 逐行解码, 每个事件打印INFO日志"""
+
+    def _read(self):
+        data = b''
+        for chunk in self._event_source:
+            for line in chunk.splitlines(True):
+                data += line
+                if data.endswith((b'\r\r', b'\n\n', b'\r\n\r\n')):
+                    yield data
+                    data = b''
+        if data:
+            yield data
+
+    def events(self):
+        for chunk in self._read():
+            event = Event()
+            raw = ""
+            for line in chunk.splitlines():
+                line = line.decode(self._char_enc)
+                if not line.strip() or line.startswith(':'):
+                    continue
+                logging.debug(f"raw line: {line}")
+                data = line.split(':', 1)
+                field = data[0]
+                if field not in event.__dict__ and field != "raw":
+                    raw += line
+                    logging.info(f'Saw invalid field {field} while parsing Server Side Event')
+                    continue
+                if len(data) > 1:
+                    value = data[1][1:] if data[1].startswith(' ') else data[1]
+                else:
+                    value = ''
+                if field == 'data':
+                    event.data += value + '\n'
+                    raw += value + '\n'
+                else:
+                    event.__dict__[field] = value
+                    raw += value
+            event.raw = raw
+            if not event.data:
+                if not raw:
+                    continue
+            elif event.data.endswith('\n'):
+                event.data = event.data[0:-1]
+            event.event = event.event or 'message'
+            if logging.getLogger().getEffectiveLevel() == logging.DEBUG:
+                logging.debug(f'Dispatching {event.debug_str}...')
+            else:
+                logging.info(f'Dispatching {event}...')
+            yield event
+
+
+def record_stream(tokens: int) -> bytes:
+    r"""生成与网关大模型流式响应格式一致的SSE流"""
+    events = []
+    for i in range(tokens):
+        events.append("data: " + json.dumps({
+            "code": 0, "message": "", "answer": "百度",
+            "is_completion": i == tokens - 1,
+            "usage": {"prompt_tokens": 10, "completion_tokens": i + 1, "total_tokens": i + 11},
+        }, ensure_ascii=False) + "\n\n")
+    return "".join(events).encode("utf-8")
+
+
+def split(stream: bytes, size: int):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def measure(client_cls, chunks, tokens: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in client_cls(chunks).events())
+        best = min(best, time.perf_counter() - start)
+        assert count == tokens, count
+    return tokens / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE parser micro benchmark")
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    stream = record_stream(args.tokens)
+    event_size = len(stream) // args.tokens
+    cases = [("128B chunks", split(stream, 128)),
+             ("per-event chunks", split(stream, event_size)),
+             ("8KB chunks", split(stream, 8192))]
+    print("{:<18} {:>16} {:>16} {:>8}".format("source", "legacy tok/s", "current tok/s", "speedup"))
+    for name, chunks in cases:
+        legacy = measure(LegacySSEClient, chunks, args.tokens, args.repeat)
+        current = measure(SSEClient, chunks, args.tokens, args.repeat)
+        print("{:<18} {:>16,.0f} {:>16,.0f} {:>7.1f}x".format(name, legacy, current, current / legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,8 @@ setup(
     install_requires=requirements,
     python_requires='>=3.8',
     extras_require={
-        'serve': ['chainlit~=1.0.200', 'flask~=2.3.2', 'flask-restful==0.3.9']
+        'serve': ['chainlit~=1.0.200', 'flask~=2.3.2', 'flask-restful==0.3.9', 'starlette', 'uvicorn'],
+        'async': ['aiohttp>=3.8']
     }
 )
 